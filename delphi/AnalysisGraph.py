@@ -3,7 +3,8 @@ import pickle
 from datetime import datetime
 from functools import partial
 from itertools import permutations, cycle, chain
-from typing import Dict, List, Optional, Union, Callable, Tuple, List
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Union, Callable, Tuple
 from uuid import uuid4
 import networkx as nx
 import pandas as pd
@@ -12,12 +13,14 @@ import pandas as pd
 import numpy as np
 from indra.statements import Influence, Concept, Evidence
 from .random_variables import LatentVar, Indicator
+from .array_core import ArrayCore
 from .export import export_edge, _get_units, _get_dtype, _process_datetime
 from .utils.fp import flatMap, ltake, lmap, pairwise
 from .paths import db_path
 from .assembly import (
     constructConditionalPDF,
     get_respdevs,
+    get_respdevs_by_adjective,
     make_edges,
     construct_concept_to_indicator_mapping,
     get_indicators,
@@ -30,6 +33,17 @@ from sqlalchemy import create_engine
 class AnalysisGraph(nx.DiGraph):
     """ The primary data structure for Delphi """
 
+    # The number of changes to the nodes and edges of the graph, which tells
+    # whether its ArrayCore is up to date. These are class attributes because
+    # nx.DiGraph.__init__ adds the edges it is given before __init__ below
+    # sets the instance attributes.
+    _version: int = 0
+    _core: Optional[ArrayCore] = None
+
+    # The edges whose conditional probability density functions are out of
+    # date after merge_nodes_bulk.
+    _stale_edges: frozenset = frozenset()
+
     def __init__(self, *args, **kwargs):
         """ Default constructor, accepts a list of edge tuples. """
         super().__init__(*args, **kwargs)
@@ -42,6 +56,73 @@ class AnalysisGraph(nx.DiGraph):
         self.res: int = 100
         self.transition_matrix_collection: List[pd.DataFrame] = []
 
+    # ==========================================================================
+    # Array core
+    # ==========================================================================
+
+    @property
+    def core(self) -> ArrayCore:
+        """ The ArrayCore of the graph, i.e. its structure, betas, transition
+        matrices and latent state as contiguous arrays, which the numerical
+        methods below operate on. It is built on first access, and rebuilt
+        when the nodes or edges of the graph have changed since, in which
+        case the betas of the edges are carried over if every edge has them,
+        but the transition matrices and the latent state are not. """
+        if self._core is None or self._core.version != self._version:
+            core = ArrayCore(self)
+            betas = [self.edges[e].get("betas") for e in core.edges]
+            if betas and all(
+                b is not None and len(b) == len(betas[0]) for b in betas
+            ):
+                core.betas = np.array(betas, dtype=float)
+                for k, e in enumerate(core.edges):
+                    self.edges[e]["betas"] = core.betas[k]
+            self._core = core
+        return self._core
+
+    def _changed(self):
+        self._version += 1
+
+    def add_node(self, *args, **kwargs):
+        super().add_node(*args, **kwargs)
+        self._changed()
+
+    def add_nodes_from(self, *args, **kwargs):
+        super().add_nodes_from(*args, **kwargs)
+        self._changed()
+
+    def remove_node(self, *args, **kwargs):
+        super().remove_node(*args, **kwargs)
+        self._changed()
+
+    def remove_nodes_from(self, *args, **kwargs):
+        super().remove_nodes_from(*args, **kwargs)
+        self._changed()
+
+    def add_edge(self, *args, **kwargs):
+        super().add_edge(*args, **kwargs)
+        self._changed()
+
+    def add_edges_from(self, *args, **kwargs):
+        super().add_edges_from(*args, **kwargs)
+        self._changed()
+
+    def remove_edge(self, *args, **kwargs):
+        super().remove_edge(*args, **kwargs)
+        self._changed()
+
+    def remove_edges_from(self, *args, **kwargs):
+        super().remove_edges_from(*args, **kwargs)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def clear_edges(self):
+        super().clear_edges()
+        self._changed()
+
     # ==========================================================================
     # Constructors
     # ==========================================================================
@@ -92,6 +173,48 @@ class AnalysisGraph(nx.DiGraph):
         else:
             return G
 
+    @classmethod
+    def from_statements_iter(cls, sts: Iterable[Influence]):
+        """ Construct an AnalysisGraph object from an iterable of INDRA
+        statements (or InfluenceRecords) that are valid for modeling, edge by
+        edge, so that the statements can be streamed (see
+        from_json_serialized_statements_file).
+        The edges are those that from_statements would make, i.e. one per
+        ordered pair of distinct top groundings with statements. """
+        from .utils.indra import nameTuple
+
+        self = cls()
+        for s in sts:
+            subj, obj = nameTuple(s)
+            if subj == obj:
+                continue
+            if not self.has_edge(subj, obj):
+                self.add_edge(subj, obj, InfluenceStatements=[])
+            self[subj][obj]["InfluenceStatements"].append(s)
+        self.assign_uuids_to_nodes_and_edges()
+        return self
+
+    @classmethod
+    def from_statement_index(
+        cls, index, concepts: List[str], cutoff: float = 0.7
+    ):
+        """ Construct an AnalysisGraph object from the statements of a corpus
+        that contain one of the given concepts, looked up in a StatementIndex
+        of the corpus, and that are valid for modeling.
+
+        Args:
+            index: The StatementIndex.
+            concepts: The concepts of interest.
+            cutoff: The minimum grounding score of the concepts of interest.
+        """
+        from .utils.indra import get_valid_statements_for_modeling
+
+        return cls.from_statements_iter(
+            get_valid_statements_for_modeling(
+                index.get_statements(concepts, cutoff)
+            )
+        )
+
     @classmethod
     def from_json_serialized_statements_list(cls, json_serialized_list):
         from delphi.utils.indra import get_statements_from_json
@@ -101,22 +224,74 @@ class AnalysisGraph(nx.DiGraph):
         )
 
     @classmethod
-    def from_json_serialized_statements_file(cls, file):
-        with open(file, "r") as f:
-            return cls.from_json_serialized_statements_list(f.read())
+    def from_json_serialized_statements_file(
+        cls, file, minimum_evidence_pieces_required: int = 1
+    ):
+        """ Construct an AnalysisGraph object from a JSON (or newline-delimited
+        JSON, see iter_json_records) file of INDRA statements.
+
+        The file is read incrementally, and the statements are filtered by
+        grounding, polarity and number of pieces of evidence before they are
+        deserialized, so that only the statements that are kept are held in
+        memory. They are deserialized as InfluenceRecords (see
+        to_indra_statement for the INDRA statements). """
+        from delphi.utils.indra import (
+            iter_statements_from_json_file,
+            is_valid_statement_dict_for_modeling,
+        )
+
+        return cls.from_statements_iter(
+            iter_statements_from_json_file(
+                file,
+                partial(
+                    is_valid_statement_dict_for_modeling,
+                    minimum_evidence_pieces_required=(
+                        minimum_evidence_pieces_required
+                    ),
+                ),
+                records=True,
+            )
+        )
 
     @classmethod
-    def from_uncharted_json_file(cls, file):
-        with open(file, "r") as f:
-            _dict = json.load(f)
-        return cls.from_uncharted_json_serialized_dict(_dict)
+    def from_uncharted_json_file(
+        cls, file, minimum_evidence_pieces_required: int = 1
+    ):
+        """ Construct an AnalysisGraph object from an Uncharted JSON file,
+        which is read incrementally, in two passes: one over the statements
+        and one over the concept to indicator mapping. """
+        from delphi.utils.indra import iter_json_records, iter_json_key_values
+
+        return cls._from_uncharted_statements(
+            iter_json_records(file, "statements.item"),
+            iter_json_key_values(file, "concept_to_indicator_mapping"),
+            minimum_evidence_pieces_required,
+        )
 
     @classmethod
     def from_uncharted_json_serialized_dict(
         cls, _dict, minimum_evidence_pieces_required: int = 1
     ):
-        sts = _dict["statements"]
-        G = nx.DiGraph()
+        return cls._from_uncharted_statements(
+            _dict["statements"],
+            _dict["concept_to_indicator_mapping"].items(),
+            minimum_evidence_pieces_required,
+        )
+
+    @classmethod
+    def _from_uncharted_statements(
+        cls,
+        sts: Iterable[Dict],
+        concept_to_indicator_mapping: Iterable[Tuple[str, Optional[str]]],
+        minimum_evidence_pieces_required: int = 1,
+    ):
+        """ Construct an AnalysisGraph object from Uncharted JSON-serialized
+        statements and the (concept, indicator) pairs of a concept to
+        indicator mapping. The statements are checked before they are
+        deserialized, as InfluenceRecords. """
+        from .utils.indra import ConceptRecord, EvidenceRecord, InfluenceRecord
+
+        G = cls()
         for s in sts:
             if len(s["evidence"]) >= minimum_evidence_pieces_required:
                 subj, obj = s["subj"], s["obj"]
@@ -137,13 +312,13 @@ class AnalysisGraph(nx.DiGraph):
                         # Uncharted have unambiguous polarities.
                         if delta["polarity"] is None:
                             delta["polarity"] = 1
-                    influence_stmt = Influence(
-                        Concept(subj_name, db_refs=subj["db_refs"]),
-                        Concept(obj_name, db_refs=obj["db_refs"]),
+                    influence_stmt = InfluenceRecord(
+                        ConceptRecord(subj_name, db_refs=subj["db_refs"]),
+                        ConceptRecord(obj_name, db_refs=obj["db_refs"]),
                         subj_delta=s["subj_delta"],
                         obj_delta=s["obj_delta"],
                         evidence=[
-                            Evidence(
+                            EvidenceRecord(
                                 source_api=ev["source_api"],
                                 annotations=ev["annotations"],
                                 text=ev["text"],
@@ -160,9 +335,7 @@ class AnalysisGraph(nx.DiGraph):
                         "InfluenceStatements"
                     ] = influence_sts
 
-        for concept, indicator in _dict[
-            "concept_to_indicator_mapping"
-        ].items():
+        for concept, indicator in concept_to_indicator_mapping:
             if indicator is not None:
                 indicator_source, indicator_name = (
                     indicator.split("/")[0],
@@ -175,9 +348,8 @@ class AnalysisGraph(nx.DiGraph):
                         indicator_name, indicator_source
                     )
 
-        self = cls(G)
-        self.assign_uuids_to_nodes_and_edges()
-        return self
+        G.assign_uuids_to_nodes_and_edges()
+        return G
 
     def get_latent_state_components(self):
         return flatMap(lambda a: (a, f"∂({a})/∂t"), self.nodes())
@@ -206,40 +378,138 @@ class AnalysisGraph(nx.DiGraph):
             )
         ).resample(self.res)[0]
 
+        # Kept for the edges added later by add_statements, as plain arrays
+        # rather than the table, which would be pickled with the graph.
+        respdevs = get_respdevs_by_adjective(gb)
+        self.gradable_adjective_data = (respdevs, rs)
+
         for edge in self.edges(data=True):
             edge[2]["ConditionalProbability"] = constructConditionalPDF(
-                gb, rs, edge
+                respdevs, rs, edge
             )
 
-    def sample_from_prior(self):
+    def add_statements(
+        self, sts: Iterable[Influence]
+    ) -> List[Tuple[str, str]]:
+        """ Add a batch of statements to the graph incrementally, e.g. from a
+        continuous feed of reader output, instead of reconstructing the graph
+        from the whole corpus.
+
+        The statements that are valid for modeling are added to the edges
+        between their top groundings, which are created if needed. The new
+        nodes and edges get uuids, and the existing ones keep theirs. If the
+        transition model has been assembled, the conditional probability
+        density functions of the touched edges (and only of them) are
+        reconstructed, with the gradable adjective data of the assembly, and
+        if the betas have been sampled, those of the touched edges are
+        resampled and the transition matrices are reconstructed. After
+        nodes are added, the model must be initialized again.
 
-        n_samples = self.res
-        for edge in self.edges(data=True):
-            edge[2]["betas"] = np.tan(
-                edge[2]["ConditionalProbability"].resample(n_samples)[0]
-            )
+        Args:
+            sts: The statements (INDRA statements or InfluenceRecords).
 
-        elements = self.get_latent_state_components()
-        for i in range(n_samples):
-            A = pd.DataFrame(
-                np.identity(2 * len(self)), index=elements, columns=elements
-            )
+        Returns:
+            The edges that statements were added to.
+        """
+        from .utils.indra import get_valid_statements_for_modeling, nameTuple
+
+        assembled = any(
+            "ConditionalProbability" in e[2] for e in self.edges(data=True)
+        )
+        sampled = any("betas" in e[2] for e in self.edges(data=True))
+
+        touched = {}
+        for s in get_valid_statements_for_modeling(list(sts)):
+            subj, obj = nameTuple(s)
+            if subj == obj:
+                continue
+            for n in (subj, obj):
+                if n not in self:
+                    self.add_node(n, id=str(uuid4()))
+            if not self.has_edge(subj, obj):
+                self.add_edge(
+                    subj, obj, id=str(uuid4()), InfluenceStatements=[]
+                )
+            self[subj][obj]["InfluenceStatements"].append(s)
+            touched[subj, obj] = None
+        touched = list(touched)
 
-            for node in self.nodes:
-                A[f"∂({node})/∂t"][node] = self.Δt
+        if assembled and touched:
+            if getattr(self, "gradable_adjective_data", None) is None:
+                self.assemble_transition_model_from_gradable_adjectives()
+            else:
+                respdevs, rs = self.gradable_adjective_data
+                for e in touched:
+                    self.edges[e][
+                        "ConditionalProbability"
+                    ] = constructConditionalPDF(
+                        respdevs, rs, (*e, self.edges[e])
+                    )
 
-            for node_pair in permutations(self.nodes(), 2):
-                A[f"∂({node_pair[0]})/∂t"][node_pair[1]] = sum(
-                    np.prod(
-                        [
-                            self.edges[edge[0], edge[1]]["betas"][i]
-                            for edge in pairwise(simple_path)
-                        ]
+            if sampled:
+                betas = {
+                    e: np.tan(
+                        self.edges[e]["ConditionalProbability"].resample(
+                            self.res
+                        )[0]
                     )
-                    * self.Δt
-                    for simple_path in nx.all_simple_paths(self, *node_pair)
+                    for e in touched
+                }
+                for e, b in betas.items():
+                    self.edges[e]["betas"] = b
+                # If the structure has changed, the core is rebuilt with the
+                # betas of the edges. Otherwise the rows of the touched edges
+                # are overwritten.
+                core = self.core
+                for e, b in betas.items():
+                    core.betas[core.edge_index[e]] = b
+                    self.edges[e]["betas"] = core.betas[core.edge_index[e]]
+
+                core.transition_matrices = self.transition_tensor(
+                    core.betas.T
                 )
-            self.transition_matrix_collection.append(A)
+                self.transition_matrix_collection = [
+                    pd.DataFrame(
+                        A, index=core.components, columns=core.components
+                    )
+                    for A in core.transition_matrices
+                ]
+
+        return touched
+
+    def sample_from_prior(self):
+
+        self.refresh_conditional_probabilities()
+        n_samples = self.res
+        core = self.core
+        core.betas = np.tan(
+            np.reshape(
+                [
+                    self.edges[e]["ConditionalProbability"].resample(
+                        n_samples
+                    )[0]
+                    for e in core.edges
+                ],
+                (-1, n_samples),
+            )
+        )
+        # The betas of each edge are a view of its row of core.betas.
+        for k, e in enumerate(core.edges):
+            self.edges[e]["betas"] = core.betas[k]
+
+        elements = core.components
+        transition_matrices = self.transition_tensor(core.betas.T)
+        for A in transition_matrices:
+            self.transition_matrix_collection.append(
+                pd.DataFrame(A, index=elements, columns=elements)
+            )
+        # update uses the first res matrices of the collection, which are
+        # the ones just sampled unless the collection was not empty.
+        core.transition_matrices = (
+            transition_matrices
+            if len(self.transition_matrix_collection) == n_samples
+            else None
+        )
 
     def map_concepts_to_indicators(self, n: int = 1):
         """ Add indicators to the analysis graph.
@@ -269,6 +539,102 @@ class AnalysisGraph(nx.DiGraph):
         components = self.get_latent_state_components()
         return pd.Series(ltake(len(components), cycle([1.0, 0.0])), components)
 
+    # ==========================================================================
+    # Batched simulation
+    # ==========================================================================
+
+    def path_sums(self, betas: np.ndarray) -> np.ndarray:
+        """ Sum the products of the betas along the simple paths between
+        every pair of nodes, for a batch of samples of the betas.
+
+        Args:
+            betas: An array with one row per sample and one column per edge,
+                in the order of self.edges.
+
+        Returns:
+            An array M indexed by sample and pair of nodes (in the order of
+            self.nodes), where M[i, v, u] is the sum over the simple paths
+            from u to v (with u != v) of the product of their betas.
+        """
+        core = self.core
+        B = core.adjacency(betas)
+        node_index = core.node_index
+
+        # In a DAG, the simple paths are all the walks, whose sum is
+        # (I - B)^-1 - I.
+        if core.is_dag:
+            return np.linalg.inv(np.identity(len(self)) - B) - np.identity(
+                len(self)
+            )
+
+        M = np.zeros_like(B)
+        for u, v in permutations(self.nodes, 2):
+            for simple_path in nx.all_simple_paths(self, u, v):
+                M[:, node_index[v], node_index[u]] += np.prod(
+                    [
+                        B[:, node_index[edge[1]], node_index[edge[0]]]
+                        for edge in pairwise(simple_path)
+                    ],
+                    axis=0,
+                )
+        return M
+
+    def transition_tensor(self, betas: np.ndarray) -> np.ndarray:
+        """ Construct the transition matrices for a batch of samples of the
+        betas (one row per sample and one column per edge), as an array
+        indexed by sample and by pair of latent state components (in the
+        order of get_latent_state_components). """
+        M = self.path_sums(betas) * self.Δt
+        n = len(self)
+        A = np.tile(np.identity(2 * n), (len(M), 1, 1))
+        A[:, ::2, 1::2] = M + self.Δt * np.identity(n)
+        return A
+
+    def project(
+        self, betas: np.ndarray, s0: np.ndarray, n_steps: int
+    ) -> np.ndarray:
+        """ Project a batch of initial latent states forward in time.
+
+        Args:
+            betas: An array with one row per sample and one column per edge.
+            s0: The initial latent states, either one per sample or one
+                shared by all the samples, with components in the order of
+                get_latent_state_components.
+            n_steps: The number of time steps.
+
+        Returns:
+            An array of the latent states indexed by sample, time step (from
+            0 to n_steps) and component.
+        """
+        # The transition matrix A = [[I, Δt (I + M)], [0, I]] (grouping the
+        # values and the derivatives of the nodes) has A^t = [[I, tΔt (I +
+        # M)], [0, I]], so each step adds the same increment to the values.
+        betas = np.atleast_2d(betas)
+        s0 = np.broadcast_to(s0, (len(betas), 2 * len(self)))
+        increments = s0[:, 1::2] * self.Δt
+        core = self.core
+        if core.is_dag:
+            # (I + M) d, propagated along the edges in topological order.
+            increments = increments.copy()
+            for v in core.topological_order:
+                start, end = core.predecessor_indptr[v : v + 2]
+                if start < end:
+                    edges = core.predecessor_edges[start:end]
+                    increments[:, v] += np.einsum(
+                        "se,se->s",
+                        betas[:, edges],
+                        increments[:, core.sources[edges]],
+                    )
+        else:
+            increments = increments + np.einsum(
+                "sij,sj->si", self.path_sums(betas), increments
+            )
+        states = np.repeat(s0[:, None, :], n_steps + 1, axis=1)
+        states[:, :, ::2] += np.arange(n_steps + 1)[None, :, None] * (
+            increments[:, None, :]
+        )
+        return states
+
     # ==========================================================================
     # Basic Modeling Interface (BMI)
     # ==========================================================================
@@ -298,8 +664,34 @@ class AnalysisGraph(nx.DiGraph):
             rv.dataset = [1.0 for _ in range(self.res)]
             rv.partial_t = self.s0[0][f"∂({n[0]})/∂t"]
 
+        self.core.state = self._state_from_s0()
+
+    def _state_from_s0(self) -> np.ndarray:
+        """ The latent states in self.s0 as an array with one row per sample,
+        with components in the order of get_latent_state_components. """
+        components = self.core.components
+        return np.array(
+            [s.loc[components].values for s in self.s0], dtype=float
+        )
+
     def update(self):
-        """ Advance the model by one time step. """
+        """ Advance the model by one time step.
+
+        If every node has the default update function, the step is computed
+        on the ArrayCore, with a single batched product of the transition
+        matrices and the latent states, instead of a lookup of one row of a
+        transition matrix per node and sample. Either way, the latent states
+        are read from and written to self.s0, so that the two can be mixed
+        and self.s0 can be edited between steps; core.state holds a copy of
+        them after each step on the core. """
+
+        if all(
+            f == self.default_update_function
+            for _, f in self.nodes(data="update_function")
+        ):
+            self._update_core()
+            self.t += self.Δt
+            return
 
         for n in self.nodes(data=True):
             n[1]["next_state"] = n[1]["update_function"](n)
@@ -313,6 +705,30 @@ class AnalysisGraph(nx.DiGraph):
 
         self.t += self.Δt
 
+    def _update_core(self):
+        core = self.core
+        components = core.components
+        if core.transition_matrices is None:
+            core.transition_matrices = np.stack(
+                [
+                    df.loc[components, components].values
+                    for df in self.transition_matrix_collection[: self.res]
+                ]
+            )
+        core.state = self._state_from_s0()
+
+        # The rows of the transition matrices for the values of the nodes.
+        values = np.einsum(
+            "sij,sj->si", core.transition_matrices[:, ::2], core.state
+        )
+        core.state[:, ::2] = values
+
+        for i, n in enumerate(core.nodes):
+            self.nodes[n]["rv"].dataset = values[:, i].tolist()
+        positions = self.s0[0].index.get_indexer(core.nodes)
+        for s, row in zip(self.s0, values):
+            s.iloc[positions] = row
+
     def update_until(self, t_final: float):
         """ Updates the model to a particular time t_final """
         while self.t < t_final:
@@ -364,7 +780,10 @@ class AnalysisGraph(nx.DiGraph):
             "name": n[0],
             "units": _get_units(n[0]),
             "dtype": _get_dtype(n[0]),
-            "arguments": list(self.predecessors(n[0])),
+            "arguments": [
+                self.core.nodes[i]
+                for i in self.core.predecessors(self.core.node_index[n[0]])
+            ],
         }
 
         if not n[1].get("indicators") is None:
@@ -383,6 +802,7 @@ class AnalysisGraph(nx.DiGraph):
 
     def to_dict(self) -> Dict:
         """ Export the CAG to a dict. """
+        self.refresh_conditional_probabilities()
         return {
             "name": self.name,
             "dateCreated": str(self.dateCreated),
@@ -484,6 +904,171 @@ class AnalysisGraph(nx.DiGraph):
 
         self.remove_node(n1)
 
+    def merge_nodes_bulk(
+        self,
+        mapping: Dict[str, str],
+        same_polarity: Union[bool, Dict[str, bool]] = True,
+    ):
+        """ Merge many nodes at once, e.g. to collapse branches of the
+        ontology, in a single pass over the edges of the merged nodes.
+
+        The result is that of calling merge_nodes(n1, n2, same_polarity) for
+        each pair (n1, n2) of the mapping, with the following differences.
+        Mappings can be chained (if n1 is mapped to n2 and n2 to n3, n1 is
+        merged into n3). A statement that appears on several of the merged
+        edges is only kept once. Statements between nodes that are merged
+        together are dropped instead of forming self-loops. The renamed
+        groundings are computed once per distinct grounding, and the
+        structure of the graph is changed with a single removal of the
+        merged nodes and a single addition of the new edges.
+
+        The new edges keep the data (e.g. the id) of the first edge merged
+        into them, and those that only get renamed also keep their
+        conditional probability density functions and betas. The functions
+        of the edges whose statements change otherwise (by being combined or
+        by having their polarities flipped) are dropped, and reconstructed
+        once, when they are needed (by sample_from_prior or to_dict), or by
+        refresh_conditional_probabilities.
+
+        Args:
+            mapping: A dict mapping the nodes to merge to the nodes they are
+                merged into.
+            same_polarity: Whether the merged nodes have the same polarity as
+                the nodes they are merged into, either for all of them or as
+                a dict mapping nodes to merge to booleans (defaulting to
+                True).
+        """
+        # The nodes that the merged nodes end up in, and whether their
+        # polarities are flipped along the way.
+        targets, flipped = {}, {}
+
+        def resolve(n, visited):
+            if n in targets:
+                return
+            if n in visited:
+                raise ValueError(f"The mapping has a cycle through {n}")
+            flip = not (
+                same_polarity.get(n, True)
+                if isinstance(same_polarity, dict)
+                else same_polarity
+            )
+            m = mapping[n]
+            if m in mapping:
+                resolve(m, visited | {n})
+                targets[n], flipped[n] = targets[m], flipped[m] ^ flip
+            else:
+                targets[n], flipped[n] = m, flip
+
+        for n in mapping:
+            resolve(n, frozenset())
+
+        renamed = {}
+
+        def rename(concept, target):
+            grounding = concept.db_refs["UN"][0]
+            key = (grounding[0], target)
+            if key not in renamed:
+                renamed[key] = "/".join(
+                    grounding[0].split("/")[:-1] + [target]
+                )
+            concept.db_refs["UN"][0] = (renamed[key], grounding[1])
+
+        assembled = any(
+            "ConditionalProbability" in e[2] for e in self.edges(data=True)
+        )
+        # The edges incident to the merged nodes, grouped by the edge they
+        # are merged into.
+        sources = defaultdict(list)
+        processed = set()
+        incident = chain(
+            ((n, v) for n in targets for v in self._succ[n]),
+            (
+                (u, n)
+                for n in targets
+                for u in self._pred[n]
+                if u not in targets
+            ),
+        )
+        for u, v in incident:
+            for st in self._succ[u][v].get("InfluenceStatements", []):
+                # The statement lists of edges can be shared, but each
+                # statement is only changed once.
+                if id(st) in processed:
+                    continue
+                processed.add(id(st))
+                if u in targets:
+                    if flipped[u]:
+                        st.subj_delta["polarity"] = -st.subj_delta["polarity"]
+                    rename(st.subj, targets[u])
+                if v in targets:
+                    if flipped[v]:
+                        st.obj_delta["polarity"] = -st.obj_delta["polarity"]
+                    rename(st.obj, targets[v])
+            e = (targets.get(u, u), targets.get(v, v))
+            if e[0] != e[1]:
+                sources[e].append((u, v))
+
+        updated, added, stale = {}, [], set()
+        for e, es in sources.items():
+            exists = e[0] in self._succ and e[1] in self._succ[e[0]]
+            if exists:
+                es = [e] + es
+            u, v = es[0]
+            first = self._succ[u][v]
+            if len(es) == 1 and not (
+                flipped.get(u, False) or flipped.get(v, False)
+            ):
+                data = dict(first)
+            else:
+                data = {
+                    k: x
+                    for k, x in first.items()
+                    if k not in ("ConditionalProbability", "betas")
+                }
+                if assembled:
+                    stale.add(e)
+                statements, seen = [], set()
+                for u, v in es:
+                    for st in self._succ[u][v].get("InfluenceStatements", []):
+                        if id(st) not in seen:
+                            seen.add(id(st))
+                            statements.append(st)
+                data["InfluenceStatements"] = statements
+            if exists:
+                updated[e] = data
+            else:
+                added.append((*e, data))
+
+        for e, data in updated.items():
+            self.edges[e].clear()
+            self.edges[e].update(data)
+        self.remove_nodes_from(list(targets))
+        self.add_edges_from(added)
+        for e in stale:
+            self.edges[e].pop("ConditionalProbability", None)
+            self.edges[e].pop("betas", None)
+        self._stale_edges = frozenset(
+            e for e in self._stale_edges | stale if self.has_edge(*e)
+        )
+
+    def refresh_conditional_probabilities(self):
+        """ Reconstruct the conditional probability density functions of the
+        edges whose statements were changed by merge_nodes_bulk, with the
+        gradable adjective data of the assembly of the transition model (or
+        by assembling it again, if that data is not available). """
+        stale = [e for e in self._stale_edges if self.has_edge(*e)]
+        self._stale_edges = frozenset()
+        if not stale:
+            return
+        if getattr(self, "gradable_adjective_data", None) is None:
+            self.assemble_transition_model_from_gradable_adjectives()
+            return
+        respdevs, rs = self.gradable_adjective_data
+        for e in stale:
+            self.edges[e]["ConditionalProbability"] = constructConditionalPDF(
+                respdevs, rs, (*e, self.edges[e])
+            )
+
     # ==========================================================================
     # Subgraphs
     # ==========================================================================
@@ -503,33 +1088,139 @@ class AnalysisGraph(nx.DiGraph):
             self.subgraph(chain.from_iterable(dfs_edges)).copy()
         )
 
+    def _nodes_between(
+        self,
+        sources: List[str],
+        targets: List[str],
+        cutoff: Optional[int] = None,
+    ) -> set:
+        """ Get the nodes that lie on a simple path of length at most cutoff
+        from one of the sources to a different one of the targets.
+
+        The candidates are the nodes v with d(source, v) + d(v, target) <=
+        cutoff, found by one breadth-first search forward from each source
+        and one backward from each target, both bounded by cutoff. A
+        candidate is on a simple path if its shortest paths from the source
+        and to the target only meet at v, which is always the case in a DAG.
+        The paths between a pair of concepts are only enumerated (within
+        its candidates) if some of them are left undecided, as can happen in
+        a graph with cycles, where a candidate may only lie on walks that
+        revisit a node.
+        """
+        forward = {
+            s: nx.single_source_shortest_path(self, s, cutoff)
+            for s in sources
+        }
+        rev = self.reverse(copy=False)
+        backward = {
+            t: nx.single_source_shortest_path(rev, t, cutoff)
+            for t in targets
+        }
+
+        nodes = set()
+        undecided = {}
+        for s, from_source in forward.items():
+            for t, to_target in backward.items():
+                if s == t or t not in from_source:
+                    continue
+                smaller, larger = sorted((from_source, to_target), key=len)
+                for v in smaller:
+                    if v not in larger:
+                        continue
+                    p, q = from_source[v], to_target[v]
+                    if cutoff is not None and len(p) + len(q) - 2 > cutoff:
+                        continue
+                    if len(set(p).intersection(q)) == 1:
+                        nodes.update(p)
+                        nodes.update(q)
+                    else:
+                        undecided.setdefault((s, t), set()).add(v)
+
+        for (s, t), vs in undecided.items():
+            vs = vs - nodes
+            if not vs:
+                continue
+            candidates = set(forward[s]).intersection(backward[t])
+            for path in nx.all_simple_paths(
+                self.subgraph(candidates), s, t, cutoff=cutoff
+            ):
+                nodes.update(path)
+                vs.difference_update(path)
+                if not vs:
+                    break
+        return nodes
+
+    def _paths_between(
+        self, nodes: set, pairs: List[Tuple[str, str]], cutoff: Optional[int]
+    ) -> List[List[str]]:
+        """ Enumerate the simple paths between pairs of concepts, within the
+        subgraph of the nodes between them. """
+        subgraph = self.subgraph(nodes)
+        return [
+            path
+            for source, target in pairs
+            if source in subgraph and target in subgraph
+            for path in nx.all_simple_paths(
+                subgraph, source, target, cutoff=cutoff
+            )
+        ]
+
     def get_subgraph_for_concept_pair(
-        self, source: str, target: str, cutoff: Optional[int] = None
+        self,
+        source: str,
+        target: str,
+        cutoff: Optional[int] = None,
+        return_paths: bool = False,
     ):
         """ Get subgraph comprised of simple paths between the source and the
         target.
 
+        The nodes of the subgraph are found from the nodes reachable from the
+        source and those from which the target is reachable (see
+        _nodes_between), without enumerating the paths in a DAG.
+
         Args:
             source
             target
-            cutoff
+            cutoff: The maximum length of the paths.
+            return_paths: Whether to also enumerate the simple paths, which
+                can take exponential time on dense graphs.
+
+        Returns:
+            The subgraph, and if return_paths is True, the list of paths.
         """
-        paths = nx.all_simple_paths(self, source, target, cutoff=cutoff)
-        return AnalysisGraph(self.subgraph(set(chain.from_iterable(paths))))
+        nodes = self._nodes_between([source], [target], cutoff)
+        subgraph = AnalysisGraph(self.subgraph(nodes))
+        if return_paths:
+            return subgraph, self._paths_between(
+                nodes, [(source, target)], cutoff
+            )
+        return subgraph
 
     def get_subgraph_for_concept_pairs(
-        self, concepts: List[str], cutoff: Optional[int] = None
+        self,
+        concepts: List[str],
+        cutoff: Optional[int] = None,
+        return_paths: bool = False,
     ):
-        """ Get subgraph comprised of simple paths between the source and the
-        target.
+        """ Get subgraph comprised of simple paths between every ordered pair
+        of the concepts.
+
+        As in get_subgraph_for_concept_pair, the paths are only enumerated
+        if return_paths is True.
 
         Args:
             concepts
-            cutoff
+            cutoff: The maximum length of the paths.
+            return_paths: Whether to also enumerate the simple paths.
+
+        Returns:
+            The subgraph, and if return_paths is True, the list of paths.
         """
-        path_generator = (
-            nx.all_simple_paths(self, source, target, cutoff=cutoff)
-            for source, target in permutations(concepts, 2)
-        )
-        paths = chain.from_iterable(path_generator)
-        return AnalysisGraph(self.subgraph(set(chain.from_iterable(paths))))
+        nodes = self._nodes_between(concepts, concepts, cutoff)
+        subgraph = AnalysisGraph(self.subgraph(nodes))
+        if return_paths:
+            return subgraph, self._paths_between(
+                nodes, list(permutations(concepts, 2)), cutoff
+            )
+        return subgraph
@@ -1,7 +1,9 @@
 import json
 import importlib
+from multiprocessing import Pool
+import numpy as np
 import networkx as nx
-from typing import Dict
+from typing import Callable, Dict, FrozenSet, List, Optional, Union
 from pathlib import Path
 from inspect import signature
 from pprint import pprint
@@ -11,9 +13,52 @@ from IPython.core.display import Image
 from .scopes import Scope
 
 
+def _increment_index(**kwargs):
+    """ Update function for loop index nodes. """
+    return int(kwargs.pop(list(kwargs.keys())[0])) + 1
+
+
+def _decide(condition_fn, choice_fns, **kwargs):
+    """ Update function for decision nodes, which selects between the values
+    computed for the two branches of a conditional. """
+    cond = condition_fn(**kwargs)
+    if np.ndim(cond) == 0:
+        ind = 0 if cond else 1
+        return choice_fns[ind](**kwargs)
+
+    # Vectorized lambdas return an array of conditions, one per input
+    # sample, so we select elementwise.
+    return np.where(cond, choice_fns[0](**kwargs), choice_fns[1](**kwargs))
+
+
+# The graph evaluated by the worker processes in ProgramAnalysisGraph.call. It
+# is set by the pool initializer so that the graph is shipped to each worker
+# once, rather than with every chunk of input vectors.
+_worker_graph = None
+
+
+def _init_worker(G):
+    global _worker_graph
+    _worker_graph = G
+
+
+def _call_worker(args):
+    inputs, outputs = args
+    return _worker_graph._call_chunk(inputs, outputs)
+
+
 class ProgramAnalysisGraph(nx.DiGraph):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.vectorized = False
+        self._executors: Dict[FrozenSet[str], Callable] = {}
+
+    def __getstate__(self):
+        # Compiled executors are generated code, so we recompile them on
+        # demand rather than pickling them.
+        state = self.__dict__.copy()
+        state["_executors"] = {}
+        return state
 
     def add_action_node(self, A: AGraph, lambdas, n):
         """ Add an action node to the CAG. """
@@ -75,15 +120,14 @@ class ProgramAnalysisGraph(nx.DiGraph):
             self.nodes[name]["is_index"] = True
             self.nodes[name]["value"] = int(n.attr["start"])
             self.nodes[name]["visited"] = True
-            self.nodes[name]["update_fn"] = (
-                lambda **kwargs: int(kwargs.pop(list(kwargs.keys())[0])) + 1
-            )
+            self.nodes[name]["update_fn"] = _increment_index
             self.add_edge(name, name)
 
     @classmethod
     def from_agraph(cls, A: AGraph, lambdas):
         """ Construct a ProgramAnalysisGraph from an AGraph """
         self = cls(nx.DiGraph())
+        self.vectorized = getattr(lambdas, "VECTORIZED", False)
 
         for n in A.nodes():
             if n.attr["node_type"] in ("LoopVariableNode", "FuncVariableNode"):
@@ -101,14 +145,9 @@ class ProgramAnalysisGraph(nx.DiGraph):
                 n[1]["update_fn"], = n[1].pop("pred_fns")
             else:
                 n[1]["choice_fns"] = n[1].pop("pred_fns")
-
-                def update_fn(n, **kwargs):
-                    cond_fn = n[1]["condition_fn"]
-                    sig = signature(cond_fn)
-                    ind = 0 if cond_fn(**kwargs) else 1
-                    return n[1]["choice_fns"][ind](**kwargs)
-
-                n[1]["update_fn"] = partial(update_fn, n)
+                n[1]["update_fn"] = partial(
+                    _decide, n[1]["condition_fn"], n[1]["choice_fns"]
+                )
 
         isolated_nodes = [
             n
@@ -121,9 +160,11 @@ class ProgramAnalysisGraph(nx.DiGraph):
         for n in isolated_nodes:
             self.remove_node(n)
 
-        # Create lists of all input function and all input variables
+        # Create lists of all input function and all input variables, as well
+        # as the output variables, i.e. those that nothing else depends on.
         self.input_variables = list()
         self.input_functions = list()
+        self.output_variables = list()
         for n in self.nodes():
             if self.nodes[n].get("init_fn") is not None:
                 self.input_functions.append(n)
@@ -135,6 +176,9 @@ class ProgramAnalysisGraph(nx.DiGraph):
             ):
                 self.input_variables.append(n)
 
+            if set(self.successors(n)) <= {n}:
+                self.output_variables.append(n)
+
         return self
 
     @classmethod
@@ -144,15 +188,102 @@ class ProgramAnalysisGraph(nx.DiGraph):
         lambdas = importlib.__import__(stem + "_lambdas")
         return cls.from_agraph(A, lambdas)
 
-    def _update_node(self, n: str):
-        """ Update the value of node n, recursively visiting its ancestors. """
-        node = self.nodes[n]
-        if node.get("update_fn") is not None and not node["visited"]:
-            node["visited"] = True
-            for p in self.predecessors(n):
-                self._update_node(p)
-            ivals = {i: self.nodes[i]["value"] for i in self.predecessors(n)}
-            node["value"] = node["update_fn"](**ivals)
+    # ==========================================================================
+    # Compilation
+    # ==========================================================================
+
+    def schedule(self, visited: FrozenSet[str] = frozenset()) -> List[str]:
+        """ Return the nodes in the order in which a single update evaluates
+        them, i.e. every node after all of its predecessors, skipping nodes
+        that are already marked as visited. """
+        order = []
+        seen = set(visited)
+
+        def visit(n):
+            if self.nodes[n].get("update_fn") is not None and n not in seen:
+                seen.add(n)
+                for p in self.predecessors(n):
+                    visit(p)
+                order.append(n)
+
+        for n in self.nodes():
+            visit(n)
+
+        return order
+
+    def _bind_args(self, n: str, fn: Callable, slots: Dict[str, int]) -> str:
+        """ Return the source code for the arguments of a call to the lambda
+        function fn for node n, reading their values from the slots of the
+        value list. """
+        params = signature(fn).parameters.values()
+        if any(p.kind == p.VAR_KEYWORD for p in params):
+            return ", ".join(
+                f"{p}=v[{slots[p]}]" for p in self.predecessors(n)
+            )
+
+        missing = [p.name for p in params if p.name not in slots]
+        if missing:
+            raise ValueError(
+                f"Arguments {missing} of the lambda function {fn.__name__} "
+                f"for node {n} do not correspond to any variable node."
+            )
+        return ", ".join(f"v[{slots[p.name]}]" for p in params)
+
+    def compile_source(self, visited: FrozenSet[str] = frozenset()):
+        """ Generate straight-line Python source for a single update of the
+        graph.
+
+        The generated function `update(v)` takes a list v holding the value of
+        every node, in the order of self.nodes(), and updates it in place.
+        Argument positions are bound ahead of time, so that evaluating the
+        graph requires no traversal and no keyword argument dicts.
+
+        Returns:
+            A tuple of the source code and a dict mapping the names of the
+            functions it calls to the functions themselves.
+        """
+        slots = {n: i for i, n in enumerate(self.nodes())}
+        functions = {}
+
+        def call(n, fn):
+            name = f"f{len(functions)}"
+            functions[name] = fn
+            return f"{name}({self._bind_args(n, fn, slots)})"
+
+        lines = ["def update(v):"]
+        for n in self.schedule(visited):
+            node = self.nodes[n]
+            i = slots[n]
+            if node["update_fn"] is _increment_index:
+                lines.append(f"    v[{i}] = int(v[{i}]) + 1")
+            elif "choice_fns" in node:
+                cond = call(n, node["condition_fn"])
+                then_val, else_val = [call(n, f) for f in node["choice_fns"]]
+                if self.vectorized:
+                    lines.append(
+                        f"    v[{i}] = np.where({cond}, {then_val}, {else_val})"
+                    )
+                else:
+                    lines.append(
+                        f"    v[{i}] = {then_val} if {cond} else {else_val}"
+                    )
+            else:
+                lines.append(f"    v[{i}] = {call(n, node['update_fn'])}")
+        lines.append("    return v")
+
+        return "\n".join(lines) + "\n", functions
+
+    def compile(self, visited: FrozenSet[str] = frozenset()) -> Callable:
+        """ Compile a single update of the graph into a flat Python function
+        (see compile_source), caching it for subsequent updates that start
+        with the same set of visited nodes. """
+        if visited not in self._executors:
+            source, namespace = self.compile_source(visited)
+            namespace["np"] = np
+            exec(compile(source, "<ProgramAnalysisGraph>", "exec"), namespace)
+            self._executors[visited] = namespace["update"]
+
+        return self._executors[visited]
 
     # ==========================================================================
     # Basic Modeling Interface (BMI)
@@ -168,11 +299,129 @@ class ProgramAnalysisGraph(nx.DiGraph):
         self.update()
 
     def update(self):
-        for n in self.nodes():
-            self._update_node(n)
+        visited = frozenset(
+            n for n in self.nodes() if self.nodes[n].get("visited")
+        )
+        values = self.compile(visited)(
+            [self.nodes[n]["value"] for n in self.nodes()]
+        )
 
-        for n in self.nodes(data=True):
-            n[1]["visited"] = False
+        for n, value in zip(self.nodes(), values):
+            self.nodes[n]["value"] = value
+            self.nodes[n]["visited"] = False
+
+    def _call_chunk(
+        self, inputs: Dict[str, np.ndarray], outputs: List[str]
+    ) -> Dict[str, np.ndarray]:
+        """ Evaluate the graph for a chunk of input vectors (see call). """
+        nodes = list(self.nodes())
+        slots = {n: i for i, n in enumerate(nodes)}
+        n_rows = len(next(iter(inputs.values())))
+
+        # The starting values, as they are set by initialize() on a freshly
+        # constructed graph.
+        values = [None for n in nodes]
+        for n in self.input_functions:
+            values[slots[n]] = self.nodes[n]["init_fn"]()
+        for n in nodes:
+            if self.nodes[n].get("is_index"):
+                values[slots[n]] = int(self.nodes[n]["start"])
+
+        update = self.compile(
+            frozenset(n for n in nodes if self.nodes[n].get("is_index"))
+        )
+
+        if self.vectorized:
+            for n, column in inputs.items():
+                values[slots[n]] = column
+            values = update(values)
+            return {
+                n: np.broadcast_to(values[slots[n]], (n_rows,)).copy()
+                for n in outputs
+            }
+
+        results = {n: np.empty(n_rows) for n in outputs}
+        input_slots = [(slots[n], column) for n, column in inputs.items()]
+        for row in range(n_rows):
+            v = values.copy()
+            for i, column in input_slots:
+                v[i] = column[row]
+            v = update(v)
+            for n in outputs:
+                results[n][row] = v[slots[n]]
+        return results
+
+    def call(
+        self,
+        inputs: Union[Dict[str, np.ndarray], np.ndarray],
+        outputs: Optional[List[str]] = None,
+        n_processes: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        """ Evaluate the GrFN for a batch of input vectors.
+
+        If the graph was constructed from vectorized lambdas (see
+        genPGM.create_pgm_dict), all the input vectors of a chunk are pushed
+        through the compiled graph in a single call. Otherwise, the compiled
+        graph is evaluated once per input vector.
+
+        Args:
+            inputs: Either a dict mapping names of input variables to 1-D
+                arrays of their values, or a 2-D array with one row per input
+                vector and one column per variable in self.input_variables.
+                Input variables that are not given take the values of their
+                initialization functions.
+            outputs: The variables whose values are returned. Defaults to
+                self.output_variables.
+            n_processes: If given, the input vectors are split into chunks
+                that are evaluated across a pool of this many processes.
+            chunk_size: The number of input vectors per chunk when using a
+                process pool. Defaults to an even split across the processes.
+
+        Returns:
+            A dict mapping the names of the output variables to arrays of their
+            values, one per input vector.
+        """
+        if not isinstance(inputs, dict):
+            inputs = np.atleast_2d(inputs)
+            if inputs.shape[1] != len(self.input_variables):
+                raise ValueError(
+                    f"Expected {len(self.input_variables)} columns, one for "
+                    f"each of {self.input_variables}, but got "
+                    f"{inputs.shape[1]}."
+                )
+            inputs = dict(zip(self.input_variables, inputs.T))
+
+        inputs = {n: np.asarray(column) for n, column in inputs.items()}
+        unknown = [n for n in inputs if n not in self.input_variables]
+        missing = [
+            n
+            for n in self.input_variables
+            if n not in inputs and n not in self.input_functions
+        ]
+        if not inputs or unknown or missing:
+            raise ValueError(
+                f"Unknown input variables {unknown}, and input variables "
+                f"without values or initialization functions {missing}."
+            )
+
+        outputs = self.output_variables if outputs is None else outputs
+        n_rows = len(next(iter(inputs.values())))
+
+        if n_processes is None:
+            return self._call_chunk(inputs, outputs)
+
+        if chunk_size is None:
+            chunk_size = -(-n_rows // n_processes)
+        chunks = [
+            (
+                {n: column[i : i + chunk_size] for n, column in inputs.items()},
+                outputs,
+            )
+            for i in range(0, n_rows, chunk_size)
+        ]
+
+        with Pool(n_processes, _init_worker, (self,)) as pool:
+            results = pool.map(_call_worker, chunks)
 
-    def call(self, inputs):
-        pass
+        return {n: np.concatenate([r[n] for r in results]) for n in outputs}
@@ -1,9 +1,112 @@
+from typing import FrozenSet, Hashable, Iterable, List, Set, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
 
 
 class CausalMarkovBlanket():
     """
-    Stub for class that will create a markov blanket around components of two
-    congruent subnetworks that are not shared between the two networks.
+    Markov blankets of sets of nodes of a graph: the parents, children and
+    co-parents (the other parents of the children) of the nodes of a set,
+    other than the nodes of the set themselves.
+
+    The graph is indexed once, as a sparse adjacency matrix in CSR format
+    over integer node ids, so that the blankets of a whole batch of node sets
+    are computed with a few sparse matrix products instead of repeated scans
+    of the parents and children of each node.
+
+    Args:
+        G: The graph.
     """
-    def __init__(self):
-        pass
+
+    def __init__(self, G: nx.DiGraph):
+        self.nodes = list(G.nodes)
+        self._names = np.empty(len(self.nodes), dtype=object)
+        self._names[:] = self.nodes
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+        n = len(self.nodes)
+        sources = np.fromiter(
+            (self.index[u] for u, _ in G.edges), dtype=np.int64,
+            count=G.number_of_edges(),
+        )
+        targets = np.fromiter(
+            (self.index[v] for _, v in G.edges), dtype=np.int64,
+            count=G.number_of_edges(),
+        )
+        ones = np.ones(len(sources), dtype=bool)
+
+        # successors[u, v] and predecessors[v, u] are True for each edge
+        # u -> v. Products and sums of boolean sparse matrices are computed
+        # with OR in place of +, so that they stay boolean.
+        self.successors = csr_matrix((ones, (sources, targets)), shape=(n, n))
+        self.predecessors = csr_matrix(
+            (ones, (targets, sources)), shape=(n, n)
+        )
+
+    def _indicators(self, node_sets: List[Iterable[Hashable]]) -> csr_matrix:
+        rows, columns = [], []
+        for i, nodes in enumerate(node_sets):
+            ids = [self.index[n] for n in nodes]
+            rows.extend([i] * len(ids))
+            columns.extend(ids)
+        return csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, columns)),
+            shape=(len(node_sets), len(self.nodes)),
+        )
+
+    def blanket_ids(self, node_sets: List[Iterable[Hashable]]) -> csr_matrix:
+        """ The Markov blankets of a batch of node sets, as a boolean sparse
+        matrix with one row per node set, whose nonzero columns are the node
+        ids (indices into self.nodes) of its blanket. This avoids building
+        Python sets of nodes, for callers that can work with the ids. """
+        S = self._indicators(node_sets)
+        children = S @ self.successors
+        blankets = (
+            S @ self.predecessors + children + children @ self.predecessors
+        )
+        return blankets > S
+
+    def blankets(
+        self, node_sets: List[Iterable[Hashable]]
+    ) -> List[Set[Hashable]]:
+        """ The Markov blankets of a batch of node sets. """
+        B = self.blanket_ids(node_sets)
+        B.sort_indices()
+        names = self._names[B.indices].tolist()
+        bounds = B.indptr.tolist()
+        return [
+            set(names[bounds[i] : bounds[i + 1]]) for i in range(B.shape[0])
+        ]
+
+    def blanket(self, nodes: Iterable[Hashable]) -> Set[Hashable]:
+        """ The Markov blanket of a set of nodes. """
+        return self.blankets([nodes])[0]
+
+    @classmethod
+    def non_shared_blankets(
+        cls, csn
+    ) -> Tuple[
+        List[Tuple[FrozenSet[Hashable], Set[Hashable]]],
+        List[Tuple[FrozenSet[Hashable], Set[Hashable]]],
+    ]:
+        """ The Markov blankets, within each of the two congruent subnetworks
+        of a CongruentSubNetwork, of the weakly connected components of the
+        nodes that are not shared between them, as lists of (component,
+        blanket) pairs. """
+        shared = (
+            set(csn.correspondence),
+            set(csn.correspondence.values()),
+        )
+        results = []
+        for G, nodes in zip((csn.subnetwork1, csn.subnetwork2), shared):
+            components = [
+                frozenset(c)
+                for c in nx.weakly_connected_components(
+                    G.subgraph(n for n in G if n not in nodes)
+                )
+            ]
+            results.append(
+                list(zip(components, cls(G).blankets(components)))
+            )
+        return tuple(results)
@@ -1,9 +1,184 @@
+import re
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import networkx as nx
+
+
+def default_label(n: Hashable) -> str:
+    """ The label by which a node is matched by default: the last component
+    of its name (e.g. of a concept like UN/entities/natural/crop_technology),
+    lowercased and stripped of non-alphanumeric characters. """
+    return re.sub(r"[^0-9a-z]", "", str(n).split("/")[-1].lower())
+
+
+class Reachability(object):
+    """
+    Ancestor and descendant sets of the nodes of a graph, restricted to a set
+    of indexed nodes and stored as bitsets (Python ints whose k-th bit is set
+    if the node with index k is an ancestor or a descendant).
+
+    The bitsets are propagated over the condensation of the graph, so that
+    cyclic graphs (e.g. ProgramAnalysisGraphs with loop indices) are handled,
+    and a node counts as its own ancestor and descendant.
+
+    Args:
+        G: The graph.
+        indices: A dict mapping the indexed nodes to their indices.
+    """
+
+    def __init__(self, G: nx.DiGraph, indices: Dict[Hashable, int]):
+        self.C = nx.condensation(G)
+        self.component = self.C.graph["mapping"]
+        self.order = list(nx.topological_sort(self.C))
+
+        self.own = [0] * len(self.C)
+        for n, k in indices.items():
+            self.own[self.component[n]] |= 1 << k
+
+        self.ancestors = self.propagate(self.own)
+        self.descendants = self.propagate(self.own, reverse=True)
+
+    def propagate(self, bits: List[int], reverse: bool = False) -> List[int]:
+        """ OR bitsets given for each component of the condensation over its
+        ancestors (or, with reverse=True, its descendants). """
+        result = list(bits)
+        if reverse:
+            for c in reversed(self.order):
+                for s in self.C.successors(c):
+                    result[c] |= result[s]
+        else:
+            for c in self.order:
+                for p in self.C.predecessors(c):
+                    result[c] |= result[p]
+        return result
+
+    def ancestors_of(self, n: Hashable) -> int:
+        return self.ancestors[self.component[n]]
+
+    def descendants_of(self, n: Hashable) -> int:
+        return self.descendants[self.component[n]]
 
 
 class CongruentSubNetwork():
     """
-    Stub for constructor class that will create equivalent subnetworks for two
-    models based upon there sahred inputs and outputs.
+    The congruent subnetworks of two models (e.g. a CAG and a
+    ProgramAnalysisGraph, or two versions of a CAG), based upon their shared
+    inputs and outputs.
+
+    The nodes of the two graphs are first matched: through the explicit
+    mapping if one is given, and otherwise by looking up the label of each
+    node of the first graph in an index of the labels of the second graph.
+    Labels shared by several nodes of either graph are ambiguous and are not
+    matched.
+
+    A pair of matched nodes (a, b) is congruent if b is reachable from a in
+    both graphs. Matches that are not part of any congruent pair are pruned,
+    repeatedly, and the congruent subnetwork of each graph is made of the
+    nodes that lie on a path between the two nodes of a congruent pair of
+    the remaining matches. Reachability between the matched nodes is
+    precomputed as ancestor and descendant bitsets, so that all of this
+    takes time linear in the size of the graphs (times the number of matches
+    over the word size).
+
+    Args:
+        G1: The first graph.
+        G2: The second graph.
+        mapping: An optional dict mapping nodes of G1 to nodes of G2, used
+            in place of label matching.
+        label: The function giving the label by which a node is matched.
+
+    Attributes:
+        correspondence: A dict mapping the nodes of G1 that remain matched to
+            their counterparts in G2.
+        subnetwork1, subnetwork2: The congruent subnetworks of G1 and G2.
+        inputs, outputs: The pairs of matched nodes that have no matched
+            ancestors (respectively descendants) in the subnetworks, other
+            than themselves.
     """
-    def __init__(self):
-        pass
+
+    def __init__(
+        self,
+        G1: nx.DiGraph,
+        G2: nx.DiGraph,
+        mapping: Optional[Dict[Hashable, Hashable]] = None,
+        label: Callable[[Hashable], str] = default_label,
+    ):
+        if mapping is None:
+            mapping = self.match_labels(G1, G2, label)
+        pairs = [(n1, n2) for n1, n2 in mapping.items() if n1 in G1 and n2 in G2]
+
+        R1 = Reachability(G1, {n1: k for k, (n1, _) in enumerate(pairs)})
+        R2 = Reachability(G2, {n2: k for k, (_, n2) in enumerate(pairs)})
+
+        # The matches that are strictly downstream/upstream of each match in
+        # both graphs.
+        downstream, upstream = [], []
+        for k, (n1, n2) in enumerate(pairs):
+            not_k = ~(1 << k)
+            downstream.append(
+                R1.descendants_of(n1) & R2.descendants_of(n2) & not_k
+            )
+            upstream.append(R1.ancestors_of(n1) & R2.ancestors_of(n2) & not_k)
+
+        kept = (1 << len(pairs)) - 1
+        while True:
+            pruned = kept
+            for k in range(len(pairs)):
+                if (pruned >> k) & 1 and not (
+                    (downstream[k] | upstream[k]) & pruned
+                ):
+                    pruned &= ~(1 << k)
+            if pruned == kept:
+                break
+            kept = pruned
+
+        self.correspondence = {
+            n1: n2 for k, (n1, n2) in enumerate(pairs) if (kept >> k) & 1
+        }
+        self.subnetwork1 = self._subnetwork(G1, R1, pairs, 0, downstream, kept)
+        self.subnetwork2 = self._subnetwork(G2, R2, pairs, 1, downstream, kept)
+
+        self.inputs: List[Tuple[Hashable, Hashable]] = []
+        self.outputs: List[Tuple[Hashable, Hashable]] = []
+        for k, (n1, n2) in enumerate(pairs):
+            if (kept >> k) & 1:
+                if not upstream[k] & kept:
+                    self.inputs.append((n1, n2))
+                if not downstream[k] & kept:
+                    self.outputs.append((n1, n2))
+
+    @staticmethod
+    def match_labels(
+        G1: nx.DiGraph,
+        G2: nx.DiGraph,
+        label: Callable[[Hashable], str] = default_label,
+    ) -> Dict[Hashable, Hashable]:
+        """ Match the nodes of G1 to the nodes of G2 with the same label,
+        leaving out the labels that are shared by several nodes of either
+        graph. """
+        index = defaultdict(list)
+        for n2 in G2:
+            index[label(n2)].append(n2)
+        candidates = defaultdict(list)
+        for n1 in G1:
+            candidates[label(n1)].append(n1)
+        return {
+            n1s[0]: index[l][0]
+            for l, n1s in candidates.items()
+            if len(n1s) == 1 and len(index.get(l, ())) == 1
+        }
+
+    @staticmethod
+    def _subnetwork(G, R, pairs, side, downstream, kept):
+        # The congruent partners of the matches upstream of each node, which
+        # it lies between if it also has one of them downstream.
+        partners = [0] * len(R.C)
+        for k, pair in enumerate(pairs):
+            if (kept >> k) & 1:
+                partners[R.component[pair[side]]] |= downstream[k] & kept
+        partners = R.propagate(partners)
+        return G.subgraph(
+            n for n in G
+            if partners[R.component[n]] & R.descendants_of(n)
+        ).copy()
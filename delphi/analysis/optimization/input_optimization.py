@@ -1,10 +1,247 @@
-from abc import ABCMeta
+from abc import ABCMeta, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+from scipy.stats import truncnorm
 
 
 class InputOptimizer(metaclass=ABCMeta):
     """
-    Meta-class for all model input optimization methods
+    Meta-class for all model input optimization methods.
+
+    An input optimizer searches for the input vector that maximizes (or
+    minimizes) an objective subject to constraints, with the cross-entropy
+    method: at each iteration, a population of candidate inputs is drawn
+    from a truncated normal distribution within the bounds and evaluated in
+    a single batch, and the distribution is refitted to the best of them.
+    Candidates are ranked first by their constraint violation and then by
+    their objective, so that the search is driven towards the feasible
+    region before optimizing within it. Subclasses implement evaluate.
+
+    Args:
+        input_names: The names of the inputs.
+        bounds: The (lower, upper) bounds of each input.
+    """
+
+    def __init__(
+        self, input_names: List[str], bounds: Sequence[Tuple[float, float]]
+    ):
+        self.input_names = list(input_names)
+        self.bounds = np.array(bounds, dtype=float).reshape(-1, 2)
+        if len(self.bounds) != len(self.input_names):
+            raise ValueError(
+                f"Got {len(self.bounds)} bounds for {len(self.input_names)} "
+                "inputs"
+            )
+
+    def project(self, inputs: np.ndarray) -> np.ndarray:
+        """ Map a batch of candidate inputs, which are within the bounds,
+        onto the set of inputs that satisfy any constraints which can be
+        enforced directly. Defaults to the identity. """
+        return inputs
+
+    @abstractmethod
+    def evaluate(self, inputs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Evaluate a batch of input vectors (one row per vector), returning
+        the objective and the (non-negative) constraint violation of each of
+        them. """
+
+    def _rank(self, objective, violation, maximize):
+        return np.lexsort((-objective if maximize else objective, violation))
+
+    def optimize(
+        self,
+        maximize: bool = True,
+        n_candidates: int = 4096,
+        n_elite: int = 64,
+        n_iterations: int = 50,
+        smoothing: float = 0.7,
+        tol: float = 1e-6,
+        seed: Optional[int] = None,
+    ) -> OptimizeResult:
+        """
+        Search for the optimal inputs with the cross-entropy method.
+
+        Args:
+            maximize: Whether to maximize the objective (or minimize it).
+            n_candidates: The number of candidate inputs per iteration.
+            n_elite: The number of best candidates to which the sampling
+                distribution is refitted.
+            n_iterations: The maximum number of iterations.
+            smoothing: The weight of the refitted distribution against the
+                previous one.
+            tol: The search stops when the standard deviations of the
+                sampling distribution are all below tol times the widths of
+                the bounds.
+            seed: The seed of the candidates.
+
+        Returns:
+            The best candidate found, with its objective ("fun"), constraint
+            violation ("maxcv"), whether it is feasible ("success") and the
+            number of iterations ("nit"). The best inputs are also stored as
+            self.best_inputs.
+        """
+        rng = np.random.RandomState(seed)
+        lower, upper = self.bounds[:, 0], self.bounds[:, 1]
+        widths = np.where(upper > lower, upper - lower, 1.0)
+        mean, std = (lower + upper) / 2, widths / 2
+
+        best_x, best_objective, best_violation = None, None, np.inf
+        for nit in range(1, n_iterations + 1):
+            scale = np.maximum(std, 1e-12 * widths)
+            candidates = truncnorm.rvs(
+                (lower - mean) / scale,
+                (upper - mean) / scale,
+                loc=mean,
+                scale=scale,
+                size=(n_candidates, len(mean)),
+                random_state=rng,
+            )
+            candidates = self.project(candidates)
+            if best_x is not None:
+                candidates[0] = best_x
+            objective, violation = self.evaluate(candidates)
+            elite = self._rank(objective, violation, maximize)[:n_elite]
+
+            best_x = candidates[elite[0]]
+            best_objective = objective[elite[0]]
+            best_violation = violation[elite[0]]
+
+            mean = smoothing * candidates[elite].mean(axis=0) + (
+                1 - smoothing
+            ) * mean
+            std = smoothing * candidates[elite].std(axis=0) + (
+                1 - smoothing
+            ) * std
+            if np.all(std < tol * widths):
+                break
+
+        self.best_inputs = dict(zip(self.input_names, best_x))
+        return OptimizeResult(
+            x=best_x,
+            fun=best_objective,
+            maxcv=best_violation,
+            success=best_violation == 0,
+            nit=nit,
+        )
+
+
+class CAGInputOptimizer(InputOptimizer):
+    """
+    Search for the intervention on an AnalysisGraph, i.e. the partial_t
+    values (the initial derivatives ∂(n)/∂t) of some of its nodes, that
+    maximizes or minimizes the projected mean of a target node after n_steps
+    time steps, as computed by the ICM API's createExperiment.
+
+    The projected means are averaged over the transition matrices in
+    G.transition_matrix_collection (see AnalysisGraph.sample_from_prior).
+    Since they are linear in the initial latent state, the mean of the
+    n_steps-th powers of the transition matrices is computed once, and the
+    projections of a whole batch of candidate interventions then take a
+    single matrix product, instead of an initialize/update cycle each.
+
+    Args:
+        G: The AnalysisGraph, with its transition matrices sampled.
+        target: The node whose projected mean is optimized.
+        n_steps: The number of time steps of the projection.
+        bounds: A dict mapping the intervened nodes to the bounds of their
+            partial_t values. The partial_t values of the other nodes are
+            0, as in createExperiment.
+        constraints: A dict mapping nodes to (lower, upper) bounds on their
+            projected means, either of which can be None.
+        budget: An optional bound on the sum of the absolute values of the
+            partial_t values. Candidates over budget are scaled down onto
+            it.
+        s0: The initial latent state, with components in the order of
+            get_latent_state_components. Defaults to the default initial
+            state.
     """
 
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        G,
+        target: str,
+        n_steps: int,
+        bounds: Dict[str, Tuple[float, float]],
+        constraints: Optional[
+            Dict[str, Tuple[Optional[float], Optional[float]]]
+        ] = None,
+        budget: Optional[float] = None,
+        s0: Optional[np.ndarray] = None,
+    ):
+        if not G.transition_matrix_collection:
+            raise ValueError(
+                "The transition matrices of the graph have not been sampled"
+            )
+        constraints = constraints or {}
+        unknown = [n for n in [target, *bounds, *constraints] if n not in G]
+        if unknown:
+            raise ValueError(f"Unknown nodes: {unknown}")
+
+        super().__init__(
+            [f"∂({n})/∂t" for n in bounds], list(bounds.values())
+        )
+        self.G = G
+        self.target = target
+        self.n_steps = n_steps
+        self.budget = budget
+
+        components = list(G.get_latent_state_components())
+        self.components = components
+        if s0 is None:
+            s0 = G.construct_default_initial_state()[components].values
+        self.s0 = np.asarray(s0, dtype=float)
+        self._input_indices = [components.index(n) for n in self.input_names]
+
+        A = np.stack(
+            [
+                df.loc[components, components].values
+                for df in G.transition_matrix_collection
+            ]
+        )
+        self.mean_transition_power = np.linalg.matrix_power(
+            A, n_steps
+        ).mean(axis=0)
+
+        self._target_index = components.index(target)
+        self._constraint_indices = [components.index(n) for n in constraints]
+        self._constraint_bounds = np.array(
+            [
+                [-np.inf if lo is None else lo, np.inf if hi is None else hi]
+                for lo, hi in constraints.values()
+            ]
+        ).reshape(-1, 2)
+
+    def initial_states(self, inputs: np.ndarray) -> np.ndarray:
+        """ The initial latent states for a batch of interventions. """
+        inputs = np.atleast_2d(inputs)
+        s0 = np.tile(self.s0, (len(inputs), 1))
+        s0[:, 1::2] = 0.0
+        s0[:, self._input_indices] = inputs
+        return s0
+
+    def projected_means(self, inputs: np.ndarray) -> np.ndarray:
+        """ The projected means of the latent state components after n_steps
+        time steps, for a batch of interventions. """
+        return self.initial_states(inputs) @ self.mean_transition_power.T
+
+    def project(self, inputs: np.ndarray) -> np.ndarray:
+        if self.budget is None:
+            return inputs
+        spent = np.abs(inputs).sum(axis=1, keepdims=True)
+        return inputs * np.minimum(1.0, self.budget / np.maximum(spent, 1e-300))
+
+    def evaluate(self, inputs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        inputs = np.atleast_2d(inputs)
+        means = self.projected_means(inputs)
+        constrained = means[:, self._constraint_indices]
+        violation = (
+            np.maximum(self._constraint_bounds[:, 0] - constrained, 0)
+            + np.maximum(constrained - self._constraint_bounds[:, 1], 0)
+        ).sum(axis=1)
+        if self.budget is not None:
+            violation += np.maximum(
+                np.abs(inputs).sum(axis=1) - self.budget * (1 + 1e-12), 0
+            )
+        return means[:, self._target_index], violation
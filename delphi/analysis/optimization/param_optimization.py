@@ -1,10 +1,370 @@
-from abc import ABCMeta
+from abc import ABCMeta, abstractmethod
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import OptimizeResult, minimize
+from scipy.stats import qmc
+
+# The optimizer whose loss is minimized by the worker processes of a pool, set
+# by _init_worker so that it does not have to be sent along with every start.
+_worker_optimizer = None
+
+
+def _init_worker(optimizer):
+    global _worker_optimizer
+    _worker_optimizer = optimizer
+
+
+def _minimize_worker(args):
+    x0, options = args
+    return _worker_optimizer.minimize(x0, options)
 
 
 class ParameterOptimizer(metaclass=ABCMeta):
     """
-    Meta-class for all model parameter optimization methods
+    Meta-class for all model parameter optimization methods.
+
+    A parameter optimizer fits the parameters of a model to observed time
+    series by minimizing the mean squared error of its predictions (with each
+    series scaled by its standard deviation), ignoring missing observations.
+    Subclasses implement simulate, which predicts the observations for a
+    whole batch of parameter vectors at once, so that the loss and its
+    finite difference gradient are computed with a single batched
+    simulation.
+
+    Args:
+        parameter_names: The names of the parameters.
+        bounds: The (lower, upper) bounds of each parameter.
+        observations: A DataFrame with one row per time step and one column
+            per observed series, with NaN for missing observations.
+    """
+
+    def __init__(
+        self,
+        parameter_names: List[str],
+        bounds: Sequence[Tuple[float, float]],
+        observations: pd.DataFrame,
+    ):
+        self.parameter_names = list(parameter_names)
+        self.bounds = np.array(bounds, dtype=float).reshape(-1, 2)
+        if len(self.bounds) != len(self.parameter_names):
+            raise ValueError(
+                f"Got {len(self.bounds)} bounds for "
+                f"{len(self.parameter_names)} parameters"
+            )
+        self.observations = observations
+        self._observed = observations.values.astype(float)
+        self._mask = ~np.isnan(self._observed)
+        if not self._mask.any():
+            raise ValueError("There are no observations to fit")
+        scales = np.nanstd(self._observed, axis=0)
+        self._scales = np.where(scales > 0, scales, 1.0)
+        self.results: List[OptimizeResult] = []
+
+    @abstractmethod
+    def simulate(self, params: np.ndarray) -> np.ndarray:
+        """ Predict the observations for a batch of parameter vectors (one
+        row per vector), as an array indexed by parameter vector, time step
+        and observed series. """
+
+    def loss(self, params: np.ndarray) -> np.ndarray:
+        """ Compute the loss of each row of a batch of parameter vectors. """
+        params = np.atleast_2d(params)
+        residuals = (self.simulate(params) - self._observed) / self._scales
+        residuals = np.where(self._mask, residuals, 0.0)
+        return (residuals ** 2).sum(axis=(1, 2)) / self._mask.sum()
+
+    def loss_and_gradient(
+        self, x: np.ndarray, step: float = 1e-6
+    ) -> Tuple[float, np.ndarray]:
+        """ Compute the loss at x and its central finite difference gradient
+        with respect to the parameters, from a single batched simulation of
+        the 2P + 1 parameter vectors involved. """
+        x = np.asarray(x, dtype=float)
+        h = step * np.maximum(1.0, np.abs(x))
+        offsets = np.diag(h)
+        losses = self.loss(np.vstack([x, x + offsets, x - offsets]))
+        P = len(x)
+        gradient = (losses[1 : P + 1] - losses[P + 1 :]) / (2 * h)
+        return losses[0], gradient
+
+    def minimize(
+        self, x0: np.ndarray, options: Optional[Dict] = None
+    ) -> OptimizeResult:
+        """ Minimize the loss with L-BFGS-B from a single starting point. """
+        return minimize(
+            self.loss_and_gradient,
+            np.clip(x0, self.bounds[:, 0], self.bounds[:, 1]),
+            jac=True,
+            method="L-BFGS-B",
+            bounds=self.bounds,
+            options=options,
+        )
+
+    def fit(
+        self,
+        n_starts: int = 8,
+        x0: Optional[np.ndarray] = None,
+        n_processes: Optional[int] = None,
+        seed: Optional[int] = None,
+        maxiter: int = 500,
+    ) -> OptimizeResult:
+        """
+        Fit the parameters by multi-start optimization.
+
+        Args:
+            n_starts: The number of starting points, drawn by Latin
+                hypercube sampling within the bounds.
+            x0: An optional starting point that replaces the first of them.
+            n_processes: If given, the number of worker processes across
+                which the starting points are optimized.
+            seed: The seed of the starting points.
+            maxiter: The maximum number of iterations from each start.
+
+        Returns:
+            The result of the best start, whose parameters are also stored as
+            self.best_params. The results of all the starts are stored in
+            self.results.
+        """
+        starts = qmc.scale(
+            qmc.LatinHypercube(len(self.bounds), seed=seed).random(n_starts),
+            self.bounds[:, 0],
+            self.bounds[:, 1],
+        )
+        if x0 is not None:
+            starts[0] = x0
+        args = [(start, {"maxiter": maxiter}) for start in starts]
+
+        if n_processes is None:
+            self.results = [self.minimize(*a) for a in args]
+        else:
+            with Pool(n_processes, _init_worker, (self,)) as pool:
+                self.results = pool.map(_minimize_worker, args)
+
+        best = min(self.results, key=lambda result: result.fun)
+        self.best_params = dict(zip(self.parameter_names, best.x))
+        return best
+
+
+class CAGParameterOptimizer(ParameterOptimizer):
+    """
+    Fit the betas of the edges of an AnalysisGraph, and optionally the
+    initial derivatives of its nodes, to observed indicator time series.
+
+    The latent state starts at the default initial state, in which the value
+    of every node is 1, and is projected with AnalysisGraph.project. As in
+    AnalysisGraph.emission_function, the value of an indicator is predicted
+    as the value of its node times the indicator's mean, which is taken to be
+    its first observation (or its mean if that is missing), so that the
+    observations of each indicator are relative to their starting value.
+
+    Args:
+        G: The AnalysisGraph.
+        observations: A DataFrame with one row per time step (starting at
+            time step 0) and one column per observed node.
+        beta_bounds: The bounds of the betas.
+        derivative_bounds: The bounds of the initial derivatives, or None to
+            keep them at their default value of 0 (in which case the nodes
+            never change).
+    """
+
+    def __init__(
+        self,
+        G,
+        observations: pd.DataFrame,
+        beta_bounds: Tuple[float, float] = (-1.0, 1.0),
+        derivative_bounds: Optional[Tuple[float, float]] = (-0.1, 0.1),
+    ):
+        unknown = [n for n in observations.columns if n not in G]
+        if unknown:
+            raise ValueError(f"Unknown nodes: {unknown}")
+
+        self.G = G
+        self.edges = list(G.edges)
+        self.fit_derivatives = derivative_bounds is not None
+        names = [f"β({u}, {v})" for u, v in self.edges]
+        bounds = [beta_bounds] * len(self.edges)
+        if self.fit_derivatives:
+            names += [f"∂({n})/∂t" for n in G.nodes]
+            bounds += [derivative_bounds] * len(G)
+        super().__init__(names, bounds, observations)
+
+        components = list(G.get_latent_state_components())
+        self.s0 = G.construct_default_initial_state()[components].values
+        self._node_indices = [
+            components.index(n) for n in observations.columns
+        ]
+        first = observations.bfill().iloc[0].values.astype(float)
+        means = np.nanmean(self._observed, axis=0)
+        self._indicator_means = np.where(np.isnan(first), means, first)
+
+    @classmethod
+    def from_indicator_table(
+        cls, G, start: datetime, end: datetime, **kwargs
+    ):
+        """ Construct an optimizer from the monthly series of the first
+        indicator of each node of G that has indicators (see
+        map_concepts_to_indicators), between start and end, in the indicator
+        table of the Delphi database. Any keyword arguments are passed to the
+        constructor. """
+        return cls(G, get_indicator_time_series(G, start, end), **kwargs)
+
+    def simulate(self, params: np.ndarray) -> np.ndarray:
+        params = np.atleast_2d(params)
+        E = len(self.edges)
+        s0 = np.tile(self.s0, (len(params), 1))
+        if self.fit_derivatives:
+            s0[:, 1::2] = params[:, E:]
+        states = self.G.project(
+            params[:, :E], s0, len(self.observations) - 1
+        )
+        return states[:, :, self._node_indices] * self._indicator_means
+
+    def fit(self, *args, **kwargs) -> OptimizeResult:
+        """ Fit the parameters as in ParameterOptimizer.fit, and set the
+        model up to run with them: the "betas" of each edge of the graph are
+        set to its fitted beta (repeated for each of the G.res samples), the
+        transition matrices are reconstructed from them, and if the initial
+        derivatives were fitted, the initial states G.s0 are set to the
+        default initial state with the fitted derivatives. """
+        result = super().fit(*args, **kwargs)
+        G = self.G
+        E = len(self.edges)
+
+        core = G.core
+        betas = np.zeros(len(core.edges))
+        betas[[core.edge_index[e] for e in self.edges]] = result.x[:E]
+        core.betas = np.repeat(betas[:, None], G.res, axis=1)
+        for k, e in enumerate(core.edges):
+            G.edges[e]["betas"] = core.betas[k]
+        core.transition_matrices = np.repeat(
+            G.transition_tensor(betas), G.res, axis=0
+        )
+        G.transition_matrix_collection = [
+            pd.DataFrame(A, index=core.components, columns=core.components)
+            for A in core.transition_matrices
+        ]
+
+        if self.fit_derivatives:
+            s0 = G.construct_default_initial_state()
+            for n, derivative in zip(G.nodes, result.x[E:]):
+                s0[f"∂({n})/∂t"] = derivative
+                if "rv" in G.nodes[n]:
+                    G.nodes[n]["rv"].partial_t = derivative
+            G.s0 = [s0.copy() for _ in range(G.res)]
+        return result
+
+
+class GrFNParameterOptimizer(ParameterOptimizer):
+    """
+    Fit input variables of a ProgramAnalysisGraph that act as parameters to
+    observed values of its output variables.
+
+    Each time step is a run of the GrFN with the values of its driving input
+    variables at that time step. The runs for all the parameter vectors of a
+    batch are evaluated together with ProgramAnalysisGraph.call, in a single
+    call if the GrFN was constructed from vectorized lambdas.
+
+    Args:
+        G: The ProgramAnalysisGraph.
+        parameters: A dict mapping the names of the fitted input variables to
+            their bounds.
+        observations: A DataFrame with one row per time step and one column
+            per observed output variable.
+        inputs: A dict mapping the names of the other input variables to
+            arrays of their values at each time step. Input variables that
+            are not given take the values of their initialization functions.
+        n_processes: The number of processes used by
+            ProgramAnalysisGraph.call.
+    """
+
+    def __init__(
+        self,
+        G,
+        parameters: Dict[str, Tuple[float, float]],
+        observations: pd.DataFrame,
+        inputs: Optional[Dict[str, np.ndarray]] = None,
+        n_processes: Optional[int] = None,
+    ):
+        super().__init__(list(parameters), list(parameters.values()),
+                         observations)
+        self.G = G
+        self.inputs = {
+            n: np.broadcast_to(np.asarray(v, dtype=float),
+                               (len(observations),))
+            for n, v in (inputs or {}).items()
+        }
+        self.n_processes = n_processes
+
+    def simulate(self, params: np.ndarray) -> np.ndarray:
+        params = np.atleast_2d(params)
+        S, T = len(params), len(self.observations)
+        inputs = {n: np.tile(v, S) for n, v in self.inputs.items()}
+        for name, column in zip(self.parameter_names, params.T):
+            inputs[name] = np.repeat(column, T)
+        outputs = self.G.call(
+            inputs,
+            outputs=list(self.observations.columns),
+            n_processes=self.n_processes,
+        )
+        return np.stack(
+            [outputs[n].reshape(S, T) for n in self.observations.columns],
+            axis=2,
+        )
+
+
+def get_indicator_time_series(
+    G, start: datetime, end: datetime
+) -> pd.DataFrame:
+    """ Get the monthly time series of the first indicator of each node of an
+    AnalysisGraph that has indicators, between the months of start and end,
+    from the indicator table of the Delphi database.
+
+    The table is read with a single query. Values without a year are
+    skipped, values without a month are assigned to January of their year,
+    and values falling on the same month are averaged.
+
+    Returns:
+        A DataFrame with one row per month (indexed by month, as a
+        pandas.Period) and one column per node with indicators.
     """
+    from sqlalchemy import create_engine
+    from delphi.assembly import get_best_match
+    from delphi.paths import db_path
+
+    engine = create_engine(f"sqlite:///{str(db_path)}", echo=False)
+    variable_names = pd.read_sql_query(
+        "select distinct `Variable` from indicator", con=engine
+    )["Variable"].tolist()
+
+    variables = {}
+    for n, data in G.nodes(data=True):
+        if data.get("indicators"):
+            indicator = next(iter(data["indicators"].values()))
+            variables[n] = get_best_match(indicator, variable_names)
+
+    months = pd.period_range(start, end, freq="M")
+    series = pd.DataFrame(index=months, columns=list(variables), dtype=float)
+    if not variables:
+        return series
 
-    def __init__(self):
-        pass
+    df = pd.read_sql_query(
+        "select * from indicator where `Value` is not null and `Variable` in "
+        f"({', '.join('?' * len(set(variables.values())))})",
+        con=engine,
+        params=tuple(set(variables.values())),
+    )
+    df = df.dropna(subset=["Year"])
+    month = df["Month"] if "Month" in df else pd.Series(1, index=df.index)
+    df["Period"] = [
+        pd.Period(year=int(y), month=1 if pd.isnull(m) else int(m), freq="M")
+        for y, m in zip(df["Year"], month)
+    ]
+    means = df.groupby(["Variable", "Period"])["Value"].mean()
+    for n, variable in variables.items():
+        if variable in means.index.levels[0]:
+            series[n] = means[variable].reindex(months).values
+    return series
@@ -1,10 +1,305 @@
-from abc import ABCMeta
+from abc import ABCMeta, abstractmethod
+from multiprocessing import Pool
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+# The optimizer whose local scores are computed by the worker processes of a
+# pool, set by _init_worker so that its data is shipped to each worker once.
+_worker_optimizer = None
+
+
+def _init_worker(optimizer):
+    global _worker_optimizer
+    _worker_optimizer = optimizer
+
+
+def _score_worker(families):
+    return [_worker_optimizer.local_score(n, ps) for n, ps in families]
+
+
+Family = Tuple[Hashable, FrozenSet[Hashable]]
+Move = Tuple[str, Hashable, Hashable]
 
 
 class StructureOptimizer(metaclass=ABCMeta):
     """
-    Meta-class for all model structure optimization methods
+    Meta-class for all model structure optimization methods.
+
+    A structure optimizer searches over the edges of a DAG for the structure
+    that maximizes a decomposable score, i.e. a sum over the nodes of a local
+    score of each node given its parents (its family). The search moves from
+    structure to structure by adding, removing or reversing an edge. Since an
+    addition or a removal changes the family of a single node, and a
+    reversal those of two, the change in score of a move is computed from the
+    local scores of the changed families only, which are cached so that each
+    family is scored once over the whole search. The families that the
+    candidate moves of an iteration need and that are not cached yet can be
+    scored in parallel.
+
+    The search is a tabu search: at each iteration it applies the best move
+    that does not undo one of the last tabu_length moves, even if it lowers
+    the score, and returns the best structure found. With tabu_length=0 it is
+    a plain hill-climbing search.
+
+    Subclasses implement local_score.
+
+    Args:
+        nodes: The nodes whose families are scored (those of them that are in
+            the searched graph). Edges into other nodes are left alone.
+        candidate_edges: The edges that may be added, defaulting to all the
+            ordered pairs of scored nodes.
+        max_parents: An optional bound on the number of parents of a node.
+    """
+
+    def __init__(
+        self,
+        nodes: Iterable[Hashable],
+        candidate_edges: Optional[Iterable[Tuple[Hashable, Hashable]]] = None,
+        max_parents: Optional[int] = None,
+    ):
+        self.nodes = list(nodes)
+        scored = set(self.nodes)
+        if candidate_edges is None:
+            self.candidate_edges = {
+                (u, v) for u in self.nodes for v in self.nodes if u != v
+            }
+        else:
+            self.candidate_edges = {
+                (u, v) for u, v in candidate_edges if u != v and v in scored
+            }
+        self.max_parents = max_parents
+        self.cache: Dict[Family, float] = {}
+
+    @abstractmethod
+    def local_score(self, node: Hashable, parents: FrozenSet[Hashable]) -> float:
+        """ The local score of a node given its parents. """
+
+    def _score_families(
+        self, families: Iterable[Family], pool=None, n_processes: int = 1
+    ):
+        """ Add the local scores of the families that are not cached yet to
+        the cache, across the n_processes worker processes of pool if
+        given. """
+        missing = list({f for f in families if f not in self.cache})
+        if pool is None or len(missing) < 2:
+            scores = [self.local_score(n, ps) for n, ps in missing]
+        else:
+            chunk_size = -(-len(missing) // (4 * n_processes))
+            chunks = [
+                missing[i : i + chunk_size]
+                for i in range(0, len(missing), chunk_size)
+            ]
+            scores = [s for chunk in pool.map(_score_worker, chunks)
+                      for s in chunk]
+        self.cache.update(zip(missing, scores))
+
+    def score(
+        self, G: nx.DiGraph, pool=None, n_processes: int = 1
+    ) -> float:
+        """ The score of the structure of a graph. """
+        families = [
+            (n, frozenset(G.predecessors(n))) for n in self.nodes if n in G
+        ]
+        self._score_families(families, pool, n_processes)
+        return sum(self.cache[f] for f in families)
+
+    def _moves(
+        self, G: nx.DiGraph
+    ) -> List[Tuple[Move, List[Tuple[Family, Family]]]]:
+        """ The legal moves from a structure, each with the (old, new)
+        families that it changes. """
+        scored = set(self.nodes)
+        parents = {n: frozenset(G.predecessors(n)) for n in G}
+        descendants = {n: nx.descendants(G, n) for n in G}
+
+        def full(n):
+            return (
+                self.max_parents is not None
+                and len(parents[n]) >= self.max_parents
+            )
+
+        moves = []
+        for u, v in self.candidate_edges:
+            if (
+                u in G and v in G and not G.has_edge(u, v)
+                and u not in descendants[v] and not full(v)
+            ):
+                moves.append(
+                    (("add", u, v),
+                     [((v, parents[v]), (v, parents[v] | {u}))])
+                )
+        for u, v in G.edges:
+            if v not in scored:
+                continue
+            removal = ((v, parents[v]), (v, parents[v] - {u}))
+            moves.append((("remove", u, v), [removal]))
+
+            # Reversing u -> v creates a cycle if there is another path
+            # from u to v.
+            if u in scored and not full(u) and not any(
+                w == v or v in descendants[w]
+                for w in G.successors(u) if w != v
+            ):
+                moves.append(
+                    (("reverse", u, v),
+                     [removal, ((u, parents[u]), (u, parents[u] | {v}))])
+                )
+        return moves
+
+    def _apply(self, G: nx.DiGraph, move: Move):
+        kind, u, v = move
+        if kind == "add":
+            G.add_edge(u, v)
+        elif kind == "remove":
+            G.remove_edge(u, v)
+        else:
+            data = G.edges[u, v]
+            G.remove_edge(u, v)
+            G.add_edge(v, u, **data)
+
+    @staticmethod
+    def _inverse(move: Move) -> Move:
+        kind, u, v = move
+        if kind == "add":
+            return ("remove", u, v)
+        if kind == "remove":
+            return ("add", u, v)
+        return ("reverse", v, u)
+
+    def search(
+        self,
+        G: nx.DiGraph,
+        max_iter: int = 1000,
+        tabu_length: int = 10,
+        patience: int = 10,
+        n_processes: Optional[int] = None,
+    ) -> nx.DiGraph:
+        """
+        Search for the best structure, starting from that of G.
+
+        Args:
+            G: The starting graph, which must be acyclic. It is not modified.
+            max_iter: The maximum number of moves.
+            tabu_length: The number of iterations during which the inverse
+                of a move is not allowed.
+            patience: The number of moves without improvement of the best
+                score after which the search stops.
+            n_processes: If given, the number of worker processes across
+                which the uncached families are scored.
+
+        Returns:
+            A copy of G with the best structure found. Removed edges lose
+            their data, reversed edges keep it, and added edges have none.
+            The scores after each move are stored in self.history.
+        """
+        if not nx.is_directed_acyclic_graph(G):
+            raise ValueError("The starting graph must be acyclic")
+
+        pool = None
+        if n_processes is not None:
+            pool = Pool(n_processes, _init_worker, (self,))
+        try:
+            current = G.copy()
+            score = self.score(current, pool, n_processes)
+            best, best_score = current.copy(), score
+            self.history = [score]
+            tabu: List[Move] = []
+            n_stale = 0
+
+            for _ in range(max_iter):
+                moves = [
+                    m for m in self._moves(current) if m[0] not in tabu
+                ]
+                self._score_families(
+                    (f for _, changes in moves for change in changes
+                     for f in change),
+                    pool,
+                    n_processes,
+                )
+                if not moves:
+                    break
+
+                deltas = [
+                    sum(self.cache[new] - self.cache[old]
+                        for old, new in changes)
+                    for _, changes in moves
+                ]
+                i = int(np.argmax(deltas))
+                if deltas[i] <= 0 and tabu_length == 0:
+                    break
+
+                move = moves[i][0]
+                self._apply(current, move)
+                score += deltas[i]
+                self.history.append(score)
+                if tabu_length:
+                    tabu = (tabu + [self._inverse(move)])[-tabu_length:]
+
+                if score > best_score + 1e-12:
+                    best, best_score, n_stale = current.copy(), score, 0
+                else:
+                    n_stale += 1
+                    if n_stale >= patience:
+                        break
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        self.best_score = best_score
+        return best
+
+
+class CAGStructureOptimizer(StructureOptimizer):
+    """
+    Search for the structure of an AnalysisGraph that best explains observed
+    indicator time series of its nodes.
+
+    In the linear dynamical system of an AnalysisGraph, the change of a node
+    over a time step is a linear combination of the changes of its parents,
+    so the local score of a node is the BIC of the linear Gaussian regression
+    of its first differences on those of its parents (with an intercept).
+    Only the nodes with observations are scored, and the time steps with a
+    missing observation of any of them are dropped.
+
+    Args:
+        observations: A DataFrame with one row per time step and one column
+            per observed node (e.g. from get_indicator_time_series).
+        candidate_edges: The edges that may be added, defaulting to all the
+            ordered pairs of observed nodes.
+        max_parents: An optional bound on the number of parents of a node.
     """
 
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        observations: pd.DataFrame,
+        candidate_edges: Optional[Iterable[Tuple[Hashable, Hashable]]] = None,
+        max_parents: Optional[int] = None,
+    ):
+        super().__init__(observations.columns, candidate_edges, max_parents)
+        differences = observations.diff().iloc[1:].dropna()
+        if len(differences) < 3:
+            raise ValueError(
+                "At least 3 time steps with observations of every node are "
+                "needed"
+            )
+        values = differences.values.astype(float)
+        scales = values.std(axis=0)
+        self._data = (values - values.mean(axis=0)) / np.where(
+            scales > 0, scales, 1.0
+        )
+        self._columns = {n: i for i, n in enumerate(observations.columns)}
+
+    def local_score(self, node, parents) -> float:
+        n = len(self._data)
+        y = self._data[:, self._columns[node]]
+        X = np.column_stack(
+            [np.ones(n)]
+            + [self._data[:, self._columns[p]]
+               for p in parents if p in self._columns]
+        )
+        residuals = y - X @ np.linalg.lstsq(X, y, rcond=None)[0]
+        rss = max(residuals @ residuals, 1e-12 * n)
+        return -0.5 * n * np.log(rss / n) - 0.5 * (X.shape[1] + 1) * np.log(n)
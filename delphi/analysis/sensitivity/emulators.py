@@ -1,10 +1,333 @@
-from abc import ABCMeta
+from abc import ABCMeta, abstractmethod
+from itertools import combinations
+import inspect
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+from scipy.special import eval_legendre
+from scipy.stats import qmc
+
+from delphi.analysis.sensitivity.evaluation import evaluate
+from delphi.analysis.sensitivity.streaming import (saltelli_chunks,
+                                                   SobolAccumulator)
 
 
 class EmulationAnalyzer(metaclass=ABCMeta):
     """
-    Meta-class for all emulation based sensitivity analysis methods
+    Meta-class for all emulation based sensitivity analysis methods.
+
+    An emulation analyzer evaluates the model on a small design over the
+    parameter bounds, fits a cheap surrogate of the model to it, and computes
+    the Sobol indices of the surrogate. It is used like SobolAnalyzer:
+
+        analyzer = GPAnalyzer(model, prob_def=problem)
+        analyzer.sample(num_samples=200)
+        analyzer.evaluate()
+        Si = analyzer.analyze()
+
+    Besides the keys returned by SobolAnalyzer.analyze, the indices include
+    the normalized leave-one-out error of the surrogate, "surrogate_error".
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, model, prob_def=None):
+        self.has_samples = False
+        self.has_outputs = False
+        self.is_fitted = False
+        self.model = model
+
+        if prob_def is None:
+            sig = inspect.signature(self.model)
+            args = list(sig.parameters)
+
+            self.problem_definition = {
+                'num_vars': len(args),
+                'names': args,
+                'bounds': [[-100, 100] for arg in args]
+            }
+        else:
+            self.problem_definition = prob_def
+
+        bounds = np.array(self.problem_definition['bounds'], dtype=float)
+        self.lower_bounds, self.upper_bounds = bounds[:, 0], bounds[:, 1]
+
+    def sample(self, num_samples=100, seed=None):
+        """ Draw a Latin hypercube design of num_samples points over the
+        parameter bounds. """
+        D = self.problem_definition['num_vars']
+        design = qmc.LatinHypercube(D, seed=seed).random(num_samples)
+        self.samples = qmc.scale(design, self.lower_bounds, self.upper_bounds)
+        self.has_samples = True
+        self.has_outputs = False
+        self.is_fitted = False
+
+    def evaluate(self, vectorized=False, n_processes=None, chunk_size=None,
+                 progress=None):
+        """ Evaluate the model at each point of the design, with the same
+        options as VarianceAnalyzer.evaluate. """
+        if not self.has_samples:
+            raise RuntimeError("Attempted to evaluate model without samples")
+
+        self.outputs = evaluate(self.model, self.samples,
+                                vectorized=vectorized,
+                                n_processes=n_processes,
+                                chunk_size=chunk_size,
+                                progress=progress)
+        self.has_outputs = True
+        self.is_fitted = False
+
+    def normalize(self, X):
+        """ Map points within the parameter bounds to the unit hypercube. """
+        return (np.asarray(X, dtype=float) - self.lower_bounds) / (
+            self.upper_bounds - self.lower_bounds
+        )
+
+    @abstractmethod
+    def fit(self):
+        """ Fit the surrogate to the evaluated design. """
+        if not self.has_outputs:
+            raise RuntimeError("Attempting to fit surrogate without outputs")
+
+    @abstractmethod
+    def predict(self, X):
+        """ Return the predictions of the surrogate at the rows of X. """
+
+    @abstractmethod
+    def surrogate_error(self):
+        """ Return the leave-one-out error of the surrogate on the design,
+        normalized by the variance of the outputs. """
+
+    def analyze(self, num_samples=2 ** 14, second_order=True,
+                conf_level=0.95, chunk_size=1024):
+        """
+        Compute the Sobol indices of the surrogate by Saltelli sampling, with
+        num_samples base rows, evaluating the surrogate chunk by chunk.
+        """
+        if not self.is_fitted:
+            self.fit()
+
+        accumulator = SobolAccumulator(self.problem_definition['num_vars'],
+                                       second_order)
+        for chunk in saltelli_chunks(self.problem_definition, num_samples,
+                                     calc_second_order=second_order,
+                                     chunk_size=chunk_size):
+            accumulator.update(self.predict(chunk))
+
+        Si = accumulator.indices(conf_level)
+        Si['surrogate_error'] = self.surrogate_error()
+        return Si
+
+
+class GPAnalyzer(EmulationAnalyzer):
+    """
+    Emulation analyzer with a Gaussian process surrogate, using a squared
+    exponential kernel with one length scale per parameter, whose
+    hyperparameters maximize the marginal likelihood of the design.
+    """
+
+    def __init__(self, model, prob_def=None, n_restarts=3):
+        super().__init__(model, prob_def=prob_def)
+        self.n_restarts = n_restarts
+
+    def _kernel(self, X1, X2, length_scales, signal_var):
+        sq_dists = (
+            ((X1[:, None, :] - X2[None, :, :]) / length_scales) ** 2
+        ).sum(axis=2)
+        return signal_var * np.exp(-0.5 * sq_dists)
+
+    def _neg_log_likelihood(self, params, X, y):
+        D = X.shape[1]
+        length_scales = np.exp(params[:D])
+        signal_var, noise_var = np.exp(2 * params[D:])
+
+        sq_diffs = ((X[:, None, :] - X[None, :, :]) / length_scales) ** 2
+        K_f = signal_var * np.exp(-0.5 * sq_diffs.sum(axis=2))
+        K = K_f + noise_var * np.eye(len(X))
+        try:
+            factor = cho_factor(K, lower=True)
+        except np.linalg.LinAlgError:
+            return np.inf, np.zeros_like(params)
+
+        alpha = cho_solve(factor, y)
+        nll = (
+            0.5 * y @ alpha
+            + np.log(np.diag(factor[0])).sum()
+            + 0.5 * len(X) * np.log(2 * np.pi)
+        )
+
+        # d(nll)/d(theta) = -0.5 tr((alpha alpha^T - K^-1) dK/d(theta))
+        W = np.outer(alpha, alpha) - cho_solve(factor, np.eye(len(X)))
+        grad = np.empty_like(params)
+        for d in range(D):
+            grad[d] = -0.5 * (W * K_f * sq_diffs[:, :, d]).sum()
+        grad[D] = -(W * K_f).sum()
+        grad[D + 1] = -noise_var * np.trace(W)
+        return nll, grad
+
+    def fit(self):
+        super().fit()
+        X = self.normalize(self.samples)
+        self.y_mean = self.outputs.mean()
+        self.y_std = self.outputs.std() or 1.0
+        y = (self.outputs - self.y_mean) / self.y_std
+        D = X.shape[1]
+
+        bounds = [(np.log(1e-2), np.log(1e2))] * D + [
+            (np.log(1e-2), np.log(1e2)),
+            (np.log(1e-5), np.log(1.0)),
+        ]
+        rng = np.random.RandomState(0)
+        best = None
+        for i in range(self.n_restarts):
+            x0 = np.r_[
+                np.log(0.5) + (rng.uniform(-1, 1, D) if i else np.zeros(D)),
+                0.0,
+                np.log(1e-2),
+            ]
+            result = minimize(self._neg_log_likelihood, x0, args=(X, y),
+                              jac=True, method='L-BFGS-B', bounds=bounds)
+            if best is None or result.fun < best.fun:
+                best = result
+
+        self.length_scales = np.exp(best.x[:D])
+        self.signal_var, self.noise_var = np.exp(2 * best.x[D:])
+        self.X_train = X
+        K = self._kernel(X, X, self.length_scales, self.signal_var)
+        self._factor = cho_factor(K + self.noise_var * np.eye(len(X)),
+                                  lower=True)
+        self._alpha = cho_solve(self._factor, y)
+        self.is_fitted = True
+
+    def predict(self, X):
+        K_star = self._kernel(self.normalize(X), self.X_train,
+                              self.length_scales, self.signal_var)
+        return K_star @ self._alpha * self.y_std + self.y_mean
+
+    def surrogate_error(self):
+        # Closed form leave-one-out residuals: alpha_i / [K^-1]_ii
+        K_inv_diag = np.diag(cho_solve(self._factor,
+                                       np.eye(len(self.X_train))))
+        residuals = self._alpha / K_inv_diag
+        return np.mean(residuals ** 2)
+
+
+class PCEAnalyzer(EmulationAnalyzer):
+    """
+    Emulation analyzer with a sparse polynomial chaos surrogate: a least
+    squares expansion in orthonormal Legendre polynomials (the parameters
+    being uniform over their bounds), truncated to the multi-indices of
+    total degree at most degree whose q-norm is at most degree (a hyperbolic
+    truncation, which drops high order interactions when q < 1).
+
+    The Sobol indices of the expansion follow analytically from its
+    coefficients.
+    """
+
+    def __init__(self, model, prob_def=None, degree=4, q_norm=1.0):
+        super().__init__(model, prob_def=prob_def)
+        self.degree = degree
+        self.q_norm = q_norm
+        D = self.problem_definition['num_vars']
+        self.multi_indices = np.array(
+            list(_multi_indices(D, degree, q_norm))
+        ).reshape(-1, D)
+
+    def _basis(self, X):
+        U = 2 * self.normalize(X) - 1
+        Psi = np.ones((len(U), len(self.multi_indices)))
+        for d in range(U.shape[1]):
+            for n in range(1, self.degree + 1):
+                columns = self.multi_indices[:, d] == n
+                if columns.any():
+                    Psi[:, columns] *= (
+                        np.sqrt(2 * n + 1) * eval_legendre(n, U[:, d])
+                    )[:, None]
+        return Psi
+
+    def fit(self):
+        super().fit()
+        Psi = self._basis(self.samples)
+        if len(Psi) < Psi.shape[1]:
+            raise RuntimeError(
+                f"{len(Psi)} samples are too few to fit a polynomial chaos "
+                f"expansion with {Psi.shape[1]} terms"
+            )
+        self.coefficients = np.linalg.lstsq(Psi, self.outputs, rcond=None)[0]
+
+        # Leverages of the least squares fit, for the leave-one-out error.
+        Q = np.linalg.qr(Psi)[0]
+        self._leverages = (Q ** 2).sum(axis=1)
+        self._residuals = self.outputs - Psi @ self.coefficients
+        self.is_fitted = True
+
+    def predict(self, X):
+        return self._basis(X) @ self.coefficients
+
+    def surrogate_error(self):
+        loo = self._residuals / (1 - np.minimum(self._leverages, 1 - 1e-12))
+        return np.mean(loo ** 2) / (np.var(self.outputs) or 1.0)
+
+    def analyze(self, num_samples=2 ** 14, second_order=True,
+                conf_level=0.95, chunk_size=1024):
+        """
+        Compute the Sobol indices of the expansion from its coefficients.
+        The indices are analytic, so the sampling arguments of
+        EmulationAnalyzer.analyze (num_samples, conf_level and chunk_size)
+        are accepted but ignored, and the confidence intervals are reported
+        as zero.
+        """
+        if not self.is_fitted:
+            self.fit()
+
+        D = self.problem_definition['num_vars']
+        active = self.multi_indices > 0
+        n_active = active.sum(axis=1)
+        variances = self.coefficients ** 2
+        variances[~active.any(axis=1)] = 0.0
+        total_var = variances.sum()
+
+        Si = {
+            'S1': np.zeros(D),
+            'S1_conf': np.zeros(D),
+            'ST': np.zeros(D),
+            'ST_conf': np.zeros(D),
+        }
+        if total_var > np.finfo(float).eps:
+            for d in range(D):
+                Si['S1'][d] = variances[active[:, d] & (n_active == 1)].sum()
+                Si['ST'][d] = variances[active[:, d]].sum()
+            Si['S1'] /= total_var
+            Si['ST'] /= total_var
+
+        if second_order:
+            Si['S2'] = np.full((D, D), np.nan)
+            Si['S2_conf'] = np.full((D, D), np.nan)
+            for j, k in combinations(range(D), 2):
+                terms = active[:, j] & active[:, k] & (n_active == 2)
+                Si['S2'][j, k] = (
+                    variances[terms].sum() / total_var if total_var else 0.0
+                )
+                Si['S2_conf'][j, k] = 0.0
+
+        Si['surrogate_error'] = self.surrogate_error()
+        return Si
+
+
+def _multi_indices(D, degree, q_norm, budget=None):
+    """
+    Generate the multi-indices of length D whose q-norm is at most degree,
+    in lexicographic order, without enumerating the full grid of
+    (degree + 1) ** D candidates: each entry is only extended while the
+    remaining budget of sum(a ** q_norm) allows it.
+    """
+    if budget is None:
+        budget = degree ** q_norm + 1e-9
+    if D == 0:
+        yield ()
+        return
+    for a in range(degree + 1):
+        cost = a ** q_norm
+        if cost > budget:
+            break
+        for rest in _multi_indices(D - 1, degree, q_norm, budget - cost):
+            yield (a,) + rest
@@ -0,0 +1,222 @@
+from collections import OrderedDict
+import hashlib
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence, Union
+from weakref import WeakKeyDictionary
+
+import numpy as np
+
+# The model evaluated by the worker processes of a pool, set by
+# _init_worker so that it does not have to be sent along with every chunk.
+_worker_model = None
+
+# The grids evaluated by evaluate_grid in this process, keyed weakly by
+# model (so that they are dropped along with it) and then by a digest of the
+# grid axes and presets, keeping the _GRID_CACHE_SIZE most recently used
+# grids of each model.
+_grid_cache = WeakKeyDictionary()
+_GRID_CACHE_SIZE = 16
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _evaluate_worker(samples):
+    return evaluate_scalar(_worker_model, samples)
+
+
+def evaluate_scalar(model, samples: np.ndarray) -> np.ndarray:
+    """ Evaluate a model translated by for2py, which takes each of its
+    arguments wrapped in a one-element list, once per row of samples. """
+    return np.array(
+        [model(*tuple([[a] for a in args])) for args in samples], dtype=float
+    )
+
+
+def evaluate_vectorized(model, samples: np.ndarray) -> np.ndarray:
+    """ Evaluate a model that supports NumPy arrays in place of scalars (e.g.
+    one whose lambdas were generated with genPGM's vectorized mode) in a
+    single call, passing each column of samples wrapped in a one-element
+    list. """
+    outputs = np.asarray(
+        model(*tuple([[column] for column in samples.T])), dtype=float
+    )
+    if outputs.size == 1:
+        return np.full(len(samples), outputs.item())
+    return outputs.reshape(len(samples))
+
+
+def evaluate(
+    model,
+    samples: np.ndarray,
+    vectorized: bool = False,
+    n_processes: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """ Evaluate a model at every row of a matrix of samples.
+
+    Args:
+        model: The model, following the for2py calling convention.
+        samples: A matrix with one row per sample and one column per argument
+            of the model.
+        vectorized: Whether the model can be called once with whole columns
+            of samples.
+        n_processes: If given, the number of worker processes across which
+            the chunks of samples of a scalar model are evaluated.
+        chunk_size: The number of samples evaluated at a time. Defaults to
+            all of them for vectorized models, and to splitting the samples
+            into ten chunks per process otherwise.
+        progress: A function called as progress(n_evaluated, n_samples) after
+            each chunk of samples is evaluated.
+        out: An array into which the outputs are written as each chunk of
+            samples is evaluated, e.g. so that progress can save them.
+
+    Returns:
+        An array with the output of the model for each sample.
+    """
+    samples = np.asarray(samples, dtype=float)
+    n_samples = len(samples)
+    if chunk_size is None:
+        if vectorized:
+            chunk_size = max(n_samples, 1)
+        else:
+            chunk_size = max(-(-n_samples // (10 * (n_processes or 1))), 1)
+
+    chunks = [
+        samples[i : i + chunk_size] for i in range(0, n_samples, chunk_size)
+    ]
+    evaluate_chunk = evaluate_vectorized if vectorized else evaluate_scalar
+
+    if n_processes is None or vectorized:
+        results = (evaluate_chunk(model, chunk) for chunk in chunks)
+        pool = None
+    else:
+        pool = Pool(n_processes, _init_worker, (model,))
+        results = pool.imap(_evaluate_worker, chunks)
+
+    if out is None:
+        out = np.empty(n_samples)
+    n_evaluated = 0
+    try:
+        for result in results:
+            out[n_evaluated : n_evaluated + len(result)] = result
+            n_evaluated += len(result)
+            if progress is not None:
+                progress(n_evaluated, n_samples)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    return out
+
+
+def _grid_digest(axes: Dict[int, np.ndarray], presets: np.ndarray) -> str:
+    digest = hashlib.sha1(presets.tobytes())
+    for idx, values in axes.items():
+        digest.update(str(idx).encode())
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def _cached_grid(model, digest: str) -> Optional[np.ndarray]:
+    try:
+        grids = _grid_cache.get(model)
+    except TypeError:  # The model cannot be weakly referenced.
+        return None
+    if grids is None or digest not in grids:
+        return None
+    grids.move_to_end(digest)
+    return grids[digest]
+
+
+def _cache_grid(model, digest: str, Z: np.ndarray):
+    try:
+        grids = _grid_cache.setdefault(model, OrderedDict())
+    except TypeError:
+        return
+    grids[digest] = Z
+    grids.move_to_end(digest)
+    while len(grids) > _GRID_CACHE_SIZE:
+        grids.popitem(last=False)
+
+
+def evaluate_grid(
+    model,
+    axes: Dict[int, Sequence[float]],
+    presets: Sequence,
+    vectorized: bool = False,
+    n_processes: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> np.ndarray:
+    """ Evaluate a model over an N-D grid slice of its input space, e.g. to
+    plot its response surface with respect to two of its arguments.
+
+    The grid is evaluated with evaluate, so that vectorized models are called
+    once per chunk of grid points and scalar ones can be spread across a
+    process pool. The result is cached in memory, and in cache_dir if given,
+    so that evaluating the same slice again (e.g. to replot it) does not call
+    the model. Models are identified in cache_dir by their qualified name, so
+    the cached files need to be removed when the model changes.
+
+    Args:
+        model: The model, following the for2py calling convention.
+        axes: A dict mapping the positions of the arguments varied over the
+            grid to their values.
+        presets: The values of all the arguments of the model (either
+            scalars or one-element lists), those of the arguments in axes
+            being ignored.
+        vectorized, n_processes, chunk_size, progress: As for evaluate.
+        cache_dir: A directory in which to cache the evaluated grids.
+
+    Returns:
+        An array of outputs with one axis per entry of axes, in the order of
+        axes, e.g. of shape (len(y), len(x)) for axes={y_idx: y, x_idx: x},
+        as for numpy.meshgrid(x, y).
+    """
+    axes = {
+        idx: np.asarray(values, dtype=float).ravel()
+        for idx, values in axes.items()
+    }
+    presets = np.array([np.ravel(p)[0] for p in presets], dtype=float)
+    presets[list(axes)] = 0.0
+    digest = _grid_digest(axes, presets)
+
+    cache_file = None
+    if cache_dir is not None:
+        name = f"{model.__module__}.{model.__qualname__}"
+        cache_file = Path(cache_dir) / f"{name}-{digest}.npy"
+    Z = _cached_grid(model, digest)
+    if Z is not None:
+        return Z.copy()
+    if cache_file is not None and cache_file.exists():
+        Z = np.load(cache_file)
+        _cache_grid(model, digest, Z)
+        return Z.copy()
+
+    shape = tuple(len(values) for values in axes.values())
+    samples = np.tile(presets, (int(np.prod(shape)), 1))
+    grids = np.meshgrid(*axes.values(), indexing="ij")
+    for idx, grid in zip(axes, grids):
+        samples[:, idx] = grid.ravel()
+
+    Z = evaluate(
+        model,
+        samples,
+        vectorized=vectorized,
+        n_processes=n_processes,
+        chunk_size=chunk_size,
+        progress=progress,
+    ).reshape(shape)
+
+    _cache_grid(model, digest, Z)
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        np.save(cache_file, Z)
+    return Z.copy()
@@ -0,0 +1,267 @@
+import math
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+from scipy.stats import norm, qmc
+from SALib.util import scale_samples
+
+
+def saltelli_chunks(
+    problem: Dict,
+    num_samples: int,
+    calc_second_order: bool = True,
+    chunk_size: int = 1024,
+    skip_values: Optional[int] = None,
+    start: int = 0,
+) -> Iterator[np.ndarray]:
+    """ Lazily generate the Saltelli sample matrix of SALib's
+    saltelli.sample, chunk_size rows of the base Sobol' sequence at a time.
+
+    Each chunk holds the (2D + 2) rows (or (D + 2) rows without second order
+    indices) built from each of its base rows, in the same order as SALib, so
+    that concatenating the chunks gives the full sample matrix.
+
+    Args:
+        problem: The SALib problem definition. Groups are not supported.
+        num_samples: The number of rows of the base sequence (N).
+        calc_second_order: Whether to generate the rows needed for second
+            order indices.
+        chunk_size: The number of base rows per chunk.
+        skip_values: The number of points of the Sobol' sequence to skip,
+            defaulting to SALib's choice.
+        start: The base row to start from, e.g. to resume sampling after the
+            chunks already evaluated.
+    """
+    if problem.get("groups") is not None:
+        raise ValueError("Streaming Saltelli sampling does not support groups")
+
+    if skip_values is None:
+        skip_values = max(
+            int(2 ** math.ceil(math.log(num_samples) / math.log(2))), 16
+        )
+
+    D = problem["num_vars"]
+    sequence = qmc.Sobol(2 * D, scramble=False)
+    sequence.fast_forward(skip_values + start)
+
+    n_generated = start
+    while n_generated < num_samples:
+        n = min(chunk_size, num_samples - n_generated)
+        base = sequence.random(n)
+        A, B = base[:, :D], base[:, D:]
+
+        blocks = [A]
+        for j in range(D):
+            AB = A.copy()
+            AB[:, j] = B[:, j]
+            blocks.append(AB)
+        if calc_second_order:
+            for j in range(D):
+                BA = B.copy()
+                BA[:, j] = A[:, j]
+                blocks.append(BA)
+        blocks.append(B)
+
+        chunk = np.stack(blocks, axis=1).reshape(-1, D)
+        yield scale_samples(chunk, problem)
+        n_generated += n
+
+
+class SobolAccumulator(object):
+    """ Incremental estimator of first, second and total order Sobol indices.
+
+    The estimators are those of SALib's sobol.analyze: the point estimates
+    are accumulated from running sums over chunks of model outputs (laid out
+    as by saltelli_chunks), so that the outputs never need to be held in
+    memory together. As bootstrapping requires all the outputs, confidence
+    intervals are estimated with the normal approximation instead. """
+
+    def __init__(self, num_vars: int, calc_second_order: bool = True):
+        self.num_vars = num_vars
+        self.calc_second_order = calc_second_order
+        self.step = (2 if calc_second_order else 1) * num_vars + 2
+        self.shift = None
+        D = num_vars
+
+        self.n = 0
+        self.n_outputs = 0
+        self.sum_outputs = 0.0
+        self.sum_AB_outputs = 0.0
+        self.sum_sq_AB_outputs = 0.0
+        self.sum_A = 0.0
+        self.sum_B = 0.0
+        self.sum_diff = np.zeros(D)
+        self.sum_B_diff = np.zeros(D)
+        self.sum_sq_B_diff = np.zeros(D)
+        self.sum_B_sq_diff = np.zeros(D)
+        self.sum_sq_diff = np.zeros(D)
+        self.sum_quad_diff = np.zeros(D)
+        if calc_second_order:
+            self.sum_AB = np.zeros(D)
+            self.sum_BA = np.zeros(D)
+            self.sum_cross = np.zeros((D, D))
+            self.sum_sq_cross = np.zeros((D, D))
+            self.sum_cross_lin = np.zeros((D, D))
+            self.sum_sq_lin = np.zeros((D, D))
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """ Return the running sums as a dict of arrays, e.g. to save them
+        with numpy.savez. """
+        return {
+            k: np.asarray(v) for k, v in vars(self).items() if v is not None
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray]):
+        """ Construct an accumulator from the dict returned by get_state. """
+        accumulator = cls(
+            int(state["num_vars"]), bool(state["calc_second_order"])
+        )
+        for k in vars(accumulator):
+            if k in state:
+                v = np.asarray(state[k])
+                setattr(accumulator, k, v.item() if v.ndim == 0 else v.copy())
+        return accumulator
+
+    def update(self, outputs: np.ndarray):
+        """ Add a chunk of model outputs, made of whole blocks of step rows,
+        to the running sums. """
+        D = self.num_vars
+        outputs = np.asarray(outputs, dtype=float)
+        if outputs.size % self.step != 0:
+            raise ValueError(
+                f"Chunk of {outputs.size} outputs is not made of whole blocks "
+                f"of {self.step} outputs"
+            )
+        if outputs.size == 0:
+            return
+
+        # Sums are taken over outputs shifted by the mean of the first chunk,
+        # to limit cancellation in the variance.
+        if self.shift is None:
+            self.shift = outputs.mean()
+        Y = outputs.reshape(-1, self.step) - self.shift
+        A, B, AB = Y[:, 0], Y[:, -1], Y[:, 1 : D + 1]
+
+        self.n += len(Y)
+        self.n_outputs += Y.size
+        self.sum_outputs += Y.sum()
+        self.sum_AB_outputs += A.sum() + B.sum()
+        self.sum_sq_AB_outputs += (A ** 2).sum() + (B ** 2).sum()
+        self.sum_A += A.sum()
+        self.sum_B += B.sum()
+
+        diff = AB - A[:, None]
+        B_diff = B[:, None] * diff
+        self.sum_diff += diff.sum(axis=0)
+        self.sum_B_diff += B_diff.sum(axis=0)
+        self.sum_sq_B_diff += (B_diff ** 2).sum(axis=0)
+        self.sum_B_sq_diff += (B_diff * diff).sum(axis=0)
+        self.sum_sq_diff += (diff ** 2).sum(axis=0)
+        self.sum_quad_diff += (diff ** 4).sum(axis=0)
+
+        if self.calc_second_order:
+            BA = Y[:, D + 1 : 2 * D + 1]
+            AB_B = A * B
+            self.sum_AB += AB.sum(axis=0)
+            self.sum_BA += BA.sum(axis=0)
+            self.sum_cross += BA.T @ AB - AB_B.sum()
+            self.sum_sq_cross += (
+                (BA ** 2).T @ (AB ** 2)
+                - 2 * (AB_B[:, None] * BA).T @ AB
+                + (AB_B ** 2).sum()
+            )
+
+            # Sums needed to center the cross terms BA_j * AB_k - A * B on
+            # the mean of all the outputs, which is only known at the end:
+            # the products of the cross terms with the linear terms
+            # BA_j + AB_k - A - B, and the squares of the linear terms.
+            A_B = A + B
+            self.sum_cross_lin += (
+                (BA ** 2).T @ AB
+                + BA.T @ AB ** 2
+                - (A_B[:, None] * BA).T @ AB
+                - (AB_B @ BA)[:, None]
+                - (AB_B @ AB)[None, :]
+                + (AB_B * A_B).sum()
+            )
+            self.sum_sq_lin += (
+                (BA ** 2).sum(axis=0)[:, None]
+                + (AB ** 2).sum(axis=0)[None, :]
+                + (A_B ** 2).sum()
+                + 2 * BA.T @ AB
+                - 2 * (A_B @ BA)[:, None]
+                - 2 * (A_B @ AB)[None, :]
+            )
+
+    def indices(self, conf_level: float = 0.95) -> Dict[str, np.ndarray]:
+        """ Return the Sobol indices estimated from the outputs added so far,
+        as a dict with the same keys as SALib's sobol.analyze. """
+        D, n = self.num_vars, self.n
+        if n == 0:
+            raise RuntimeError("Attempting analysis without outputs")
+
+        Z = norm.ppf(0.5 + conf_level / 2)
+        mean_AB = self.sum_AB_outputs / (2 * n)
+        var = self.sum_sq_AB_outputs / (2 * n) - mean_AB ** 2
+
+        Si = {
+            "S1": np.zeros(D),
+            "S1_conf": np.zeros(D),
+            "ST": np.zeros(D),
+            "ST_conf": np.zeros(D),
+        }
+        if self.calc_second_order:
+            Si["S2"] = np.full((D, D), np.nan)
+            Si["S2_conf"] = np.full((D, D), np.nan)
+        if var <= np.finfo(float).eps:
+            return Si
+
+        # Offset of the mean of all the outputs from the shift. The terms of
+        # the estimators are centered on this mean, as in SALib, by expanding
+        # their sums (and the sums of their squares) in d.
+        d = self.sum_outputs / self.n_outputs
+
+        sum_S1 = self.sum_B_diff - d * self.sum_diff
+        sum_sq_S1 = (
+            self.sum_sq_B_diff
+            - 2 * d * self.sum_B_sq_diff
+            + d ** 2 * self.sum_sq_diff
+        )
+        S1 = sum_S1 / n / var
+        Si["S1"] = S1
+        Si["S1_conf"] = Z * _std(sum_S1, sum_sq_S1, n) / var
+        Si["ST"] = 0.5 * self.sum_sq_diff / n / var
+        Si["ST_conf"] = (
+            Z * _std(0.5 * self.sum_sq_diff, 0.25 * self.sum_quad_diff, n) / var
+        )
+
+        if self.calc_second_order:
+            sum_S2 = self.sum_cross - d * (
+                self.sum_BA[:, None]
+                + self.sum_AB[None, :]
+                - self.sum_A
+                - self.sum_B
+            )
+            sum_sq_S2 = (
+                self.sum_sq_cross
+                - 2 * d * self.sum_cross_lin
+                + d ** 2 * self.sum_sq_lin
+            )
+            V = sum_S2 / n / var
+            conf = Z * _std(sum_S2, sum_sq_S2, n) / var
+            for j in range(D):
+                for k in range(j + 1, D):
+                    Si["S2"][j, k] = V[j, k] - S1[j] - S1[k]
+                    Si["S2_conf"][j, k] = conf[j, k]
+
+        return Si
+
+
+def _std(total, total_sq, n):
+    """ Standard error of the mean of a term, given its sum and the sum of
+    its squares over n samples. """
+    if n < 2:
+        return np.full_like(total, np.nan)
+    var = np.maximum(total_sq - total ** 2 / n, 0) / (n - 1)
+    return np.sqrt(var / n)
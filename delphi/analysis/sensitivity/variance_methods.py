@@ -1,10 +1,17 @@
 from abc import ABCMeta, abstractmethod
 import inspect
+import json
+import os
+import tempfile
 
 from SALib.sample import saltelli
 from SALib.analyze import sobol
 import numpy as np
 
+from delphi.analysis.sensitivity.evaluation import evaluate
+from delphi.analysis.sensitivity.streaming import (saltelli_chunks,
+                                                   SobolAccumulator)
+
 
 class VarianceAnalyzer(metaclass=ABCMeta):
     """
@@ -15,6 +22,9 @@ class VarianceAnalyzer(metaclass=ABCMeta):
         self.has_samples = False
         self.has_outputs = False
         self.model = model
+        self.accumulator = None
+        self.n_evaluated = 0
+        self.outputs_file = None
 
         if prob_def is None:
             sig = inspect.signature(self.model)
@@ -30,20 +40,251 @@ class VarianceAnalyzer(metaclass=ABCMeta):
 
     def sample(self, num_samples=1000, second_order=True):
         print("Sampling over parameter bounds")
+        self.accumulator = None
+        self.n_evaluated = 0
+        self.outputs_file = None
         self.samples = saltelli.sample(self.problem_definition,
                                        num_samples,
                                        calc_second_order=second_order)
         self.has_samples = True
 
-    def evaluate(self):
+    def evaluate(self, vectorized=False, n_processes=None, chunk_size=None,
+                 progress=None, checkpoint_file=None):
+        """
+        Evaluate the model at each of the samples, from the first one (an
+        interrupted evaluation is continued with resume() instead).
+
+        Args:
+            vectorized: Pass whole columns of samples to the model in one
+                call, for models that support NumPy arrays in place of
+                scalars.
+            n_processes: Evaluate a scalar model over a pool of this many
+                processes.
+            chunk_size: Number of samples evaluated at a time.
+            progress: Function called as progress(n_evaluated, n_samples)
+                after each chunk of samples is evaluated.
+            checkpoint_file: If given, the number of samples evaluated so
+                far and the NumPy RNG state are saved to this file after each
+                chunk of samples, so that an interrupted evaluation can be
+                continued with resume(). The samples are saved once, and the
+                outputs are written to a memory-mapped .npy file, next to it.
+        """
         if not self.has_samples:
             raise RuntimeError("Attempted to evaluate model without samples")
 
-        print("Evaluating samples")
-        res = [self.model(*tuple([[a] for a in args])) for args in self.samples]
-        self.outputs = np.array(res)
+        self.n_evaluated = 0
+        self.outputs = np.full(len(self.samples), np.nan)
+        self.outputs_file = None
+        self._continue_evaluation(vectorized, n_processes, chunk_size,
+                                  progress, checkpoint_file)
+
+    def _continue_evaluation(self, vectorized, n_processes, chunk_size,
+                             progress, checkpoint_file):
+        if checkpoint_file is not None:
+            self._save_checkpoint_arrays(checkpoint_file)
+        start = self.n_evaluated
+
+        def evaluated(n, n_samples):
+            self.n_evaluated = start + n
+            if checkpoint_file is not None:
+                self.save_checkpoint(checkpoint_file)
+            if progress is not None:
+                progress(start + n, start + n_samples)
+
+        evaluate(self.model, self.samples[start:], vectorized=vectorized,
+                 n_processes=n_processes, chunk_size=chunk_size,
+                 progress=evaluated, out=self.outputs[start:])
+        self.has_outputs = True
+
+    def stream(self, num_samples=1000, second_order=True, chunk_size=1024,
+               outputs_file=None, vectorized=False, n_processes=None,
+               progress=None, checkpoint_file=None):
+        """
+        Sample and evaluate the model chunk by chunk, without holding the
+        Saltelli sample matrix or the outputs in memory.
+
+        The outputs are written to a memory-mapped .npy file, and the Sobol
+        indices are accumulated as the chunks are evaluated, so that analyze()
+        can then return them directly.
+
+        Args:
+            num_samples: Number of rows of the base Sobol' sequence.
+            second_order: Whether to sample for second order indices.
+            chunk_size: Number of base rows sampled and evaluated at a time.
+            outputs_file: Path of the .npy file for the outputs. By default
+                they go to a temporary file, which is removed when the run
+                ends, once the outputs are copied into memory; a
+                checkpointed run needs an outputs_file to resume from.
+            vectorized, n_processes, progress: As in evaluate(), with
+                progress called after each chunk.
+            checkpoint_file: If given, the accumulated sums, the position in
+                the Sobol' sequence and the NumPy RNG state are saved to this
+                file after each chunk, so that an interrupted run can be
+                continued with resume().
+        """
+        if outputs_file is None and checkpoint_file is not None:
+            raise ValueError("Checkpointing a stream requires outputs_file")
+
+        D = self.problem_definition['num_vars']
+        self.accumulator = SobolAccumulator(D, second_order)
+        self.stream_params = {
+            'num_samples': num_samples,
+            'second_order': second_order,
+            'chunk_size': chunk_size,
+        }
+        self.n_evaluated = 0
+
+        temporary = outputs_file is None
+        if temporary:
+            fd, outputs_file = tempfile.mkstemp(suffix=".npy")
+            os.close(fd)
+        self.outputs_file = str(outputs_file)
+        try:
+            self.outputs = np.lib.format.open_memmap(
+                self.outputs_file, mode="w+", dtype=np.float64,
+                shape=(num_samples * self.accumulator.step,)
+            )
+            self._continue_stream(vectorized, n_processes, progress,
+                                  checkpoint_file)
+        finally:
+            if temporary:
+                # The file is mapped until the last reference to the memmap
+                # is dropped, and cannot be removed before on some systems.
+                if isinstance(self.outputs, np.memmap):
+                    self.outputs = np.array(self.outputs)
+                os.remove(self.outputs_file)
+                self.outputs_file = None
+
+    def _continue_stream(self, vectorized, n_processes, progress,
+                         checkpoint_file):
+        params = self.stream_params
+        n_outputs = len(self.outputs)
+        chunks = saltelli_chunks(self.problem_definition,
+                                 params['num_samples'],
+                                 calc_second_order=params['second_order'],
+                                 chunk_size=params['chunk_size'],
+                                 start=self.accumulator.n)
+        for chunk in chunks:
+            start = self.n_evaluated
+            outputs = self.outputs[start:start + len(chunk)]
+            evaluate(self.model, chunk, vectorized=vectorized,
+                     n_processes=n_processes, out=outputs)
+            self.accumulator.update(outputs)
+            self.n_evaluated += len(chunk)
+            if checkpoint_file is not None:
+                self.outputs.flush()
+                self.save_checkpoint(checkpoint_file)
+            if progress is not None:
+                progress(self.n_evaluated, n_outputs)
+
+        self.outputs.flush()
+        self.samples = None
+        self.has_samples = False
         self.has_outputs = True
 
+    def _save_checkpoint_arrays(self, checkpoint_file):
+        """
+        Save the samples of an evaluation next to checkpoint_file, and move
+        its outputs to a memory-mapped .npy file beside them, unless this was
+        already done for this checkpoint_file.
+        """
+        samples_file = str(checkpoint_file) + '.samples.npy'
+        outputs_file = str(checkpoint_file) + '.outputs.npy'
+        if self.outputs_file != outputs_file:
+            np.save(samples_file, self.samples)
+            outputs = np.lib.format.open_memmap(
+                outputs_file, mode="w+", dtype=np.float64,
+                shape=self.outputs.shape
+            )
+            outputs[:] = self.outputs
+            self.outputs = outputs
+            self.outputs_file = outputs_file
+        return samples_file, outputs_file
+
+    def save_checkpoint(self, checkpoint_file):
+        """
+        Save the state of an evaluation (after sample()) or of a streaming run
+        (after stream()) to a .npz file, replacing it atomically. The samples
+        and outputs of an evaluation are kept in .npy files next to it.
+        """
+        rng_state = np.random.get_state()
+        data = {
+            'problem': json.dumps(self.problem_definition,
+                                  default=lambda x: np.asarray(x).tolist()),
+            'n_evaluated': self.n_evaluated,
+            'rng_keys': rng_state[1],
+            'rng_pos': rng_state[2],
+            'rng_has_gauss': rng_state[3],
+            'rng_cached_gaussian': rng_state[4],
+        }
+        if self.accumulator is None:
+            samples_file, outputs_file = self._save_checkpoint_arrays(
+                checkpoint_file
+            )
+            self.outputs.flush()
+            data.update(mode='evaluate', samples_file=samples_file,
+                        outputs_file=outputs_file)
+        else:
+            if self.outputs_file is None:
+                raise ValueError(
+                    "Checkpointing a stream requires outputs_file"
+                )
+            data.update(mode='stream', outputs_file=self.outputs_file,
+                        **self.stream_params)
+            for k, v in self.accumulator.get_state().items():
+                data['accumulator_' + k] = v
+
+        tmp_file = str(checkpoint_file) + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, **data)
+        os.replace(tmp_file, checkpoint_file)
+
+    def resume(self, checkpoint_file, vectorized=False, n_processes=None,
+               chunk_size=None, progress=None):
+        """
+        Continue an evaluation or streaming run from the last chunk saved to
+        checkpoint_file, restoring the samples (or the position in the
+        Sobol' sequence), the outputs and the NumPy RNG state, and keep
+        checkpointing to the same file.
+
+        Args:
+            vectorized, n_processes, progress: As in evaluate().
+            chunk_size: As in evaluate(); streaming runs keep the chunk size
+                they were started with.
+        """
+        with np.load(checkpoint_file) as data:
+            data = dict(data)
+
+        self.problem_definition = json.loads(str(data['problem']))
+        self.n_evaluated = int(data['n_evaluated'])
+        np.random.set_state(('MT19937', data['rng_keys'],
+                             int(data['rng_pos']), int(data['rng_has_gauss']),
+                             float(data['rng_cached_gaussian'])))
+
+        if str(data['mode']) == 'evaluate':
+            self.accumulator = None
+            self.samples = np.load(str(data['samples_file']), mmap_mode="r")
+            self.outputs_file = str(data['outputs_file'])
+            self.outputs = np.lib.format.open_memmap(self.outputs_file,
+                                                     mode="r+")
+            self.has_samples = True
+            self._continue_evaluation(vectorized, n_processes, chunk_size,
+                                      progress, checkpoint_file)
+        else:
+            self.stream_params = {
+                k: data[k].item()
+                for k in ('num_samples', 'second_order', 'chunk_size')
+            }
+            self.accumulator = SobolAccumulator.from_state({
+                k[len('accumulator_'):]: v for k, v in data.items()
+                if k.startswith('accumulator_')
+            })
+            self.outputs_file = str(data['outputs_file'])
+            self.outputs = np.lib.format.open_memmap(self.outputs_file,
+                                                     mode="r+")
+            self._continue_stream(vectorized, n_processes, progress,
+                                  checkpoint_file)
+
     @abstractmethod
     def analyze(self):
         if not self.has_outputs:
@@ -57,5 +298,14 @@ class SobolAnalyzer(VarianceAnalyzer):
         super().__init__(model, prob_def=prob_def)
 
     def analyze(self, **kwargs):
+        """
+        Compute the Sobol indices of the model. After stream(), these are the
+        accumulated indices, with confidence intervals at the conf_level
+        keyword argument (default 0.95) from the normal approximation;
+        otherwise the keyword arguments are passed on to SALib's
+        sobol.analyze.
+        """
         super().analyze()
+        if self.accumulator is not None:
+            return self.accumulator.indices(kwargs.get("conf_level", 0.95))
         return sobol.analyze(self.problem_definition, self.outputs, **kwargs)
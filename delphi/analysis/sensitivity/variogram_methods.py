@@ -1,4 +1,11 @@
-from abc import ABCMeta
+from abc import ABCMeta, abstractmethod
+import inspect
+
+import numpy as np
+from scipy.integrate import trapezoid
+from scipy.stats import norm, qmc
+
+from delphi.analysis.sensitivity.evaluation import evaluate
 
 
 class VariogramAnalyzer(metaclass=ABCMeta):
@@ -6,5 +13,174 @@ class VariogramAnalyzer(metaclass=ABCMeta):
     Meta-class for all Variogram methods of sensitivity analysis
     """
 
-    def __init__(self):
+    def __init__(self, model, prob_def=None):
+        self.has_samples = False
+        self.has_outputs = False
+        self.model = model
+
+        if prob_def is None:
+            sig = inspect.signature(self.model)
+            args = list(sig.parameters)
+
+            self.problem_definition = {
+                'num_vars': len(args),
+                'names': args,
+                'bounds': [[-100, 100] for arg in args]
+            }
+        else:
+            self.problem_definition = prob_def
+
+    @abstractmethod
+    def sample(self):
         pass
+
+    def evaluate(self, vectorized=False, n_processes=None, chunk_size=None,
+                 progress=None):
+        """ Evaluate the model at each of the samples, with the same options
+        as VarianceAnalyzer.evaluate. """
+        if not self.has_samples:
+            raise RuntimeError("Attempted to evaluate model without samples")
+
+        self.outputs = evaluate(self.model, self.samples,
+                                vectorized=vectorized,
+                                n_processes=n_processes,
+                                chunk_size=chunk_size,
+                                progress=progress)
+        self.has_outputs = True
+
+    @abstractmethod
+    def analyze(self):
+        if not self.has_outputs:
+            raise RuntimeError("Attempting analysis without outputs")
+
+
+class VARSAnalyzer(VariogramAnalyzer):
+    """
+    STAR-VARS (Razavi and Gupta, 2016): variogram analysis of response
+    surfaces from star-based samples.
+
+    Each star is made of a center, drawn by Latin hypercube sampling over the
+    (normalized) parameter space, and of one cross section through it per
+    parameter, in which that parameter takes the values on a grid of spacing
+    resolution aligned with the center. Since the cross sections of a star
+    share its center, a star costs 1 + D * (1 / resolution - 1) model runs.
+    """
+
+    def sample(self, num_stars=10, resolution=0.1, seed=None):
+        """
+        Generate the points of num_stars stars with cross sections on a grid
+        of spacing resolution (in units of the parameter ranges, with
+        1 / resolution an integer).
+        """
+        m = int(round(1 / resolution))
+        if not np.isclose(m * resolution, 1.0) or m < 2:
+            raise ValueError("1 / resolution must be an integer of at least 2")
+        D = self.problem_definition['num_vars']
+        self.num_stars, self.resolution = num_stars, 1.0 / m
+
+        centers = qmc.LatinHypercube(D, seed=seed).random(num_stars)
+
+        # Grid positions of the centers, and the grid of each cross section.
+        self.center_positions = np.minimum(
+            np.floor(centers / self.resolution).astype(int), m - 1
+        )
+        offsets = centers - self.center_positions * self.resolution
+        grids = offsets[:, :, None] + self.resolution * np.arange(m)
+
+        # For each star: the center, then for each parameter the points of
+        # its cross section other than the center.
+        others = np.ones((num_stars, D, m), dtype=bool)
+        others[np.arange(num_stars)[:, None], np.arange(D),
+               self.center_positions] = False
+        points = np.repeat(centers[:, None, None, :], m, axis=2)
+        points = np.repeat(points, D, axis=1)
+        for d in range(D):
+            points[:, d, :, d] = grids[:, d, :]
+        star_points = np.concatenate(
+            [centers[:, None, :],
+             points[others].reshape(num_stars, D * (m - 1), D)],
+            axis=1,
+        )
+
+        bounds = np.array(self.problem_definition['bounds'], dtype=float)
+        self.samples = qmc.scale(star_points.reshape(-1, D), bounds[:, 0],
+                                 bounds[:, 1])
+        self._others = others
+        self.has_samples = True
+        self.has_outputs = False
+
+    def cross_sections(self):
+        """ Return the outputs along each cross section, as an array indexed
+        by star, parameter and grid position. """
+        D = self.problem_definition['num_vars']
+        m = int(round(1 / self.resolution))
+        Y = self.outputs.reshape(self.num_stars, -1)
+        sections = np.repeat(Y[:, :1, None], D, axis=1).repeat(m, axis=2)
+        sections[self._others] = Y[:, 1:].reshape(-1)
+        return sections
+
+    def _indices(self, sections, total_var, H):
+        m = sections.shape[2]
+        lags = np.arange(1, m)
+        variogram = np.array([
+            0.5 * np.mean((sections[:, :, j:] - sections[:, :, :-j]) ** 2,
+                          axis=(0, 2))
+            for j in lags
+        ]).T
+        h = np.r_[0.0, lags * self.resolution]
+        gamma = np.c_[np.zeros(len(variogram)), variogram]
+
+        IVARS = {}
+        for H_value in H:
+            n = int(round(H_value / self.resolution)) + 1
+            IVARS[H_value] = trapezoid(gamma[:, :n], h[:n], axis=1)
+
+        ST = np.mean(np.var(sections, axis=2), axis=0) / total_var
+        return variogram, IVARS, ST
+
+    def analyze(self, H=(0.1, 0.3, 0.5), num_resamples=100, conf_level=0.95,
+                seed=None):
+        """
+        Compute the STAR-VARS sensitivity measures.
+
+        Args:
+            H: The ranges of the integrated variograms IVARS-H to compute, as
+                fractions of the parameter ranges (multiples of resolution).
+            num_resamples: The number of bootstrap resamples of the stars
+                used for the confidence intervals.
+            conf_level: The confidence level of the intervals.
+            seed: The seed of the bootstrap.
+
+        Returns:
+            A dict with the directional variograms ("variogram", indexed by
+            parameter and lag, with lags h = resolution, 2 * resolution, ...),
+            the integrated variograms ("IVARS10", "IVARS30", ... for each
+            value of H), the VARS-TO total order indices ("ST"), and the
+            confidence intervals of the latter two ("IVARS10_conf", ...,
+            "ST_conf").
+        """
+        super().analyze()
+        H = [h for h in H if h <= 1 - self.resolution + 1e-9]
+        sections = self.cross_sections()
+        total_var = np.var(self.outputs)
+        variogram, IVARS, ST = self._indices(sections, total_var, H)
+
+        rng = np.random.RandomState(seed)
+        resamples = [
+            self._indices(
+                sections[rng.randint(self.num_stars, size=self.num_stars)],
+                total_var, H
+            )
+            for _ in range(num_resamples)
+        ]
+        Z = norm.ppf(0.5 + conf_level / 2)
+
+        Si = {'variogram': variogram,
+              'ST': ST,
+              'ST_conf': Z * np.std([r[2] for r in resamples], axis=0)}
+        for H_value in H:
+            key = 'IVARS{}'.format(int(round(100 * H_value)))
+            Si[key] = IVARS[H_value]
+            Si[key + '_conf'] = Z * np.std([r[1][H_value] for r in resamples],
+                                           axis=0)
+        return Si
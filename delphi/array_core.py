@@ -0,0 +1,92 @@
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+
+class ArrayCore(object):
+    """ A compact numeric representation of the structure and parameters of
+    an AnalysisGraph, for the numerical code paths that would otherwise walk
+    the per-node and per-edge dicts of the networkx graph.
+
+    Nodes and edges get integer ids, in the order of G.nodes and G.edges.
+    The adjacency is stored in CSR form, with the successors (and the
+    predecessors) of each node in the same order as in the networkx graph.
+    The core also holds the parameters and state of the model as contiguous
+    arrays: the sampled betas (one row per edge), the transition matrices
+    (one per sample) and the latent state (one row per sample).
+
+    A core is a snapshot of the structure of the graph. AnalysisGraph.core
+    rebuilds it when the nodes or edges of the graph have changed.
+
+    Args:
+        G: The AnalysisGraph.
+    """
+
+    def __init__(self, G: nx.DiGraph):
+        self.version = G._version
+        self.nodes: List[Hashable] = list(G.nodes)
+        self.node_index: Dict[Hashable, int] = {
+            n: i for i, n in enumerate(self.nodes)
+        }
+        self.edges: List[Tuple[Hashable, Hashable]] = list(G.edges)
+        self.edge_index: Dict[Tuple[Hashable, Hashable], int] = {
+            e: k for k, e in enumerate(self.edges)
+        }
+        self.components: List[str] = list(G.get_latent_state_components())
+
+        n_edges = len(self.edges)
+        self.sources = np.fromiter(
+            (self.node_index[u] for u, _ in self.edges), int, n_edges
+        )
+        self.targets = np.fromiter(
+            (self.node_index[v] for _, v in self.edges), int, n_edges
+        )
+
+        # G.edges lists the edges by source, so that the successor CSR arrays
+        # follow from the edge ids directly.
+        self.successor_indptr = np.searchsorted(
+            self.sources, np.arange(len(self.nodes) + 1)
+        )
+        self.successor_indices = self.targets
+        self.predecessor_edges = np.fromiter(
+            (self.edge_index[u, v] for v in self.nodes for u in G._pred[v]),
+            int,
+            n_edges,
+        )
+        self.predecessor_indptr = np.r_[
+            0, np.cumsum([len(G._pred[v]) for v in self.nodes])
+        ].astype(int)
+        self.predecessor_indices = self.sources[self.predecessor_edges]
+
+        self.is_dag = nx.is_directed_acyclic_graph(G)
+        self.topological_order: Optional[np.ndarray] = (
+            np.array([self.node_index[n] for n in nx.topological_sort(G)])
+            if self.is_dag
+            else None
+        )
+
+        self.betas: Optional[np.ndarray] = None
+        self.transition_matrices: Optional[np.ndarray] = None
+        self.state: Optional[np.ndarray] = None
+
+    def successors(self, i: int) -> np.ndarray:
+        """ The ids of the successors of the node with id i. """
+        return self.successor_indices[
+            self.successor_indptr[i] : self.successor_indptr[i + 1]
+        ]
+
+    def predecessors(self, i: int) -> np.ndarray:
+        """ The ids of the predecessors of the node with id i. """
+        return self.predecessor_indices[
+            self.predecessor_indptr[i] : self.predecessor_indptr[i + 1]
+        ]
+
+    def adjacency(self, betas: np.ndarray) -> np.ndarray:
+        """ The weighted adjacency matrices B for a batch of samples of the
+        betas (one row per sample and one column per edge), with B[s, v, u]
+        the beta of the edge u -> v in sample s. """
+        betas = np.atleast_2d(betas)
+        B = np.zeros((len(betas), len(self.nodes), len(self.nodes)))
+        B[:, self.targets, self.sources] = betas
+        return B
@@ -28,15 +28,28 @@ def get_respdevs(gb):
     return gb["respdev"]
 
 
+def get_respdevs_by_adjective(gb) -> Dict[str, np.ndarray]:
+    """ The response deviations of each adjective in the gradable adjective
+    data grouped by adjective, as plain arrays. """
+    return {adjective: get_respdevs(g).values for adjective, g in gb}
+
+
 def filter_statements(sts: List[Influence]) -> List[Influence]:
-    return [s for s in sts if is_well_grounded(s) and is_simulable(s)]
+    return select_statements(sts, cutoff=0.7)
 
 
 def constructConditionalPDF(
     gb, rs: np.ndarray, e: Tuple[str, str, Dict]
 ) -> gaussian_kde:
     """ Construct a conditional probability density function for a particular
-    AnalysisGraph edge. """
+    AnalysisGraph edge, given the gradable adjective data grouped by
+    adjective, or the dict returned for it by get_respdevs_by_adjective. """
+
+    if isinstance(gb, dict):
+        groups, respdevs = gb, gb.__getitem__
+    else:
+        groups = gb.groups
+        respdevs = lambda adjective: get_respdevs(gb.get_group(adjective))
 
     adjective_response_dict = {}
     all_thetas = []
@@ -54,11 +67,11 @@ def constructConditionalPDF(
             if ev.annotations.get("subj_adjectives") is not None:
                 for subj_adjective in ev.annotations["subj_adjectives"]:
                     if (
-                        subj_adjective in gb.groups
+                        subj_adjective in groups
                         and subj_adjective not in adjective_response_dict
                     ):
-                        adjective_response_dict[subj_adjective] = get_respdevs(
-                            gb.get_group(subj_adjective)
+                        adjective_response_dict[subj_adjective] = respdevs(
+                            subj_adjective
                         )
                     rs_subj = stmt.subj_delta[
                         "polarity"
@@ -66,12 +79,12 @@ def constructConditionalPDF(
 
                     for obj_adjective in ev.annotations["obj_adjectives"]:
                         if (
-                            obj_adjective in gb.groups
+                            obj_adjective in groups
                             and obj_adjective not in adjective_response_dict
                         ):
-                            adjective_response_dict[
+                            adjective_response_dict[obj_adjective] = respdevs(
                                 obj_adjective
-                            ] = get_respdevs(gb.get_group(obj_adjective))
+                            )
 
                         rs_obj = stmt.obj_delta[
                             "polarity"
@@ -31,6 +31,20 @@ Usage:
 
                 out_string = my_fmt_obj.write_line([val1, ..., valN])
 
+        (3) BULK I/O: To read a whole file (or any iterable of lines) into
+            NumPy arrays, one per value in the format:
+
+                columns = my_fmt_obj.read_lines(inp_file)
+
+            and to construct the lines for a sequence of rows of values:
+
+                out_strings = my_fmt_obj.write_lines(rows)
+
+        The plans for reading and writing lines (the field positions and
+        conversion functions derived from a format list) are cached across
+        Format objects, so creating a Format for every READ or WRITE
+        statement is cheap.
+
         II. LIST_DIRECTED I/O
 
         At this time only list-directed output has been implemented.
@@ -49,7 +63,12 @@ Usage:
         There are some examples towards the end of this file.
 """
 
-import re, sys
+import ast, mmap, os, re, sys
+import numpy as np
+
+# Plans for reading and writing lines, keyed by format list.
+_READ_PLANS = {}
+_WRITE_PLANS = {}
 
 
 class Format:
@@ -64,77 +83,144 @@ class Format:
         self._match_exps = None
         self._divisors = None
         self._in_cvt_fns = None
+        self._fields = None
+        self._record_len = None
 
         self._output_fmt = None
         self._out_gen_fmt = None
         self._out_widths = None
+        self._out_template = None
 
     def init_read_line(self):
         """init_read_line() initializes fields relevant to input matching"""
-        format_list = self._format_list
-        self._re_cvt = self.match_input_fmt(format_list)
-        regexp0_str = "".join([subs[0] for subs in self._re_cvt])
-        self._regexp_str = regexp0_str
-        self._re = re.compile(regexp0_str)
-        self._match_exps = [
-            subs[1] for subs in self._re_cvt if subs[1] is not None
-        ]
-        self._divisors = [subs[2] for subs in self._re_cvt if subs[2] is not None]
-        self._in_cvt_fns = [
-            subs[3] for subs in self._re_cvt if subs[3] is not None
-        ]
+        key = tuple(self._format_list)
+        if key not in _READ_PLANS:
+            _READ_PLANS[key] = self.make_read_plan(self._format_list)
+
+        (
+            self._re_cvt,
+            self._regexp_str,
+            self._re,
+            self._match_exps,
+            self._divisors,
+            self._in_cvt_fns,
+            self._fields,
+            self._record_len,
+        ) = _READ_PLANS[key]
         self._read_line_init = True
 
+    def make_read_plan(self, format_list):
+        """make_read_plan() constructs the fields relevant to input matching.
+        Since all the supported input formats have fixed widths, besides the
+        regular expressions it computes the (start, end, divisor, cvt_fn)
+        tuples of the fields holding values, so that they can be extracted
+        from a line by slicing."""
+        re_cvt = self.match_input_fmt(format_list)
+        regexp0_str = "".join([subs[0] for subs in re_cvt])
+
+        fields = []
+        pos = 0
+        for xtract_re, cvt_re, divisor, cvt_fn in re_cvt:
+            match = re.match(r"\(\.\{(\d+)\}\)", xtract_re)
+            width = 1 if match is None else int(match.group(1))
+            if cvt_fn is not None:
+                fields.append((pos, pos + width, divisor, cvt_fn))
+            pos += width
+
+        return (
+            re_cvt,
+            regexp0_str,
+            re.compile(regexp0_str),
+            [subs[1] for subs in re_cvt if subs[1] is not None],
+            [subs[2] for subs in re_cvt if subs[2] is not None],
+            [subs[3] for subs in re_cvt if subs[3] is not None],
+            fields,
+            pos,
+        )
+
     def init_write_line(self):
         """init_write_line() initializes fields relevant to output generation"""
-        format_list = self._format_list
-        output_info = self.gen_output_fmt(format_list)
-        self._output_fmt = "".join([sub[0] for sub in output_info])
-        self._out_gen_fmt = [sub[1] for sub in output_info if sub[1] is not None]
-        self._out_widths = [sub[2] for sub in output_info if sub[2] is not None]
+        key = tuple(self._format_list)
+        if key not in _WRITE_PLANS:
+            output_info = self.gen_output_fmt(self._format_list)
+            output_fmt = "".join([sub[0] for sub in output_info])
+            _WRITE_PLANS[key] = (
+                output_fmt,
+                [sub[1] for sub in output_info if sub[1] is not None],
+                [sub[2] for sub in output_info if sub[2] is not None],
+                ast.literal_eval('"' + output_fmt + '"'),
+            )
+
+        (
+            self._output_fmt,
+            self._out_gen_fmt,
+            self._out_widths,
+            self._out_template,
+        ) = _WRITE_PLANS[key]
         self._write_line_init = True
 
     def read_line(self, line):
         """
         Match a line of input according to the format specified and return a
-        tuple of the resulting values
+        tuple of the resulting values. A field that cannot be converted raises
+        a ValueError, as in read_lines() and read_rows().
         """
 
         if not self._read_line_init:
             self.init_read_line()
 
-        match = self._re.match(line)
-        assert match is not None, f"Format mismatch (line = {line})"
+        end = line.find("\n")
+        assert (
+            end if end != -1 else len(line)
+        ) >= self._record_len, f"Format mismatch (line = {line})"
 
         matched_values = []
-        for i in range(self._re.groups):
-            cvt_re = self._match_exps[i]
-            cvt_div = self._divisors[i]
-            cvt_fn = self._in_cvt_fns[i]
-            match_str = match.group(i + 1)
-
-            match0 = re.match(cvt_re, match_str)
-            if match0 is not None:
+        for start, end, cvt_div, cvt_fn in self._fields:
+            match_str = line[start:end]
+            try:
                 if cvt_fn == "float":
                     if "." in match_str:
                         val = float(match_str)
                     else:
                         val = int(match_str) / cvt_div
-                elif cvt_fn == "int":
-                    val = int(match_str)
                 else:
-                    sys.stderr.write(
-                        "Unrecognized conversion function: {}\n".format(cvt_fn)
-                    )
-            else:
-                sys.stderr.write(
-                    "Format conversion failed: {}\n".format(match_str)
-                )
+                    val = int(match_str)
+            except ValueError:
+                raise ValueError(f"Format conversion failed: {match_str}")
 
             matched_values.append(val)
 
         return tuple(matched_values)
 
+    def read_lines(self, lines):
+        """
+        Match an iterable of lines of input (e.g. an open file) according to
+        the format specified and return a tuple of NumPy arrays, one for each
+        value in the format, holding the values read from every line.
+        """
+
+        if not self._read_line_init:
+            self.init_read_line()
+
+        lines = [line.rstrip("\n") for line in lines]
+        for line in lines:
+            assert (
+                len(line) >= self._record_len
+            ), f"Format mismatch (line = {line})"
+
+        columns = []
+        for start, end, cvt_div, cvt_fn in self._fields:
+            match_strs = np.array([line[start:end] for line in lines])
+            if cvt_fn == "float":
+                column = match_strs.astype(np.float64)
+                implied_decimal = np.char.find(match_strs, ".") == -1
+                column[implied_decimal] /= cvt_div
+            else:
+                column = match_strs.astype(np.int64)
+            columns.append(column)
+
+        return tuple(columns)
+
     def write_line(self, values):
         """
         Process a list of values according to the format specified to generate
@@ -145,21 +231,33 @@ class Format:
             self.init_write_line()
 
         out_strs = []
-        for i in range(len(self._out_widths)):
-            out_fmt = self._out_gen_fmt[i]
-            out_width = self._out_widths[i]
-
-            out_val = out_fmt.format(values[i])
+        for out_fmt, out_width, value in zip(
+            self._out_gen_fmt, self._out_widths, values
+        ):
+            out_val = out_fmt.format(value)
             if len(out_val) > out_width:  # value too big for field
                 out_val = "*" * out_width
 
             out_strs.append(out_val)
 
-        out_str_exp = (
-            '"' + self._output_fmt + '".format' + str(tuple(out_strs))
-        )
-        out_str = eval(out_str_exp)
-        return out_str + "\n"
+        return self._out_template.format(*out_strs) + "\n"
+
+    def write_lines(self, rows):
+        """
+        Process an iterable of lists of values according to the format
+        specified to generate a list of lines of output.
+        """
+
+        return [self.write_line(values) for values in rows]
+
+    def read_rows(self, lines):
+        """
+        Match a list of lines of input according to the format specified and
+        return an iterator over the tuples of the resulting values, i.e., the
+        tuples that read_line() would return for each of the lines.
+        """
+
+        return zip(*[column.tolist() for column in self.read_lines(lines)])
 
     def __str__(self):
         return str(self._format_list)
@@ -355,6 +453,42 @@ class Format:
         return rexp
 
 
+################################################################################
+#                                                                              #
+#                                 BULK INPUT                                   #
+#                                                                              #
+################################################################################
+
+
+def read_records(in_file, n_records):
+    """read_records() reads the next n_records lines of the file in_file
+    through a memory map of the file, leaving in_file positioned just after
+    them, and returns the list of these lines. Together with
+    Format.read_lines() (or Format.read_rows()), this replaces n_records calls
+    to Format.read_line(in_file.readline()) with a single pass over the
+    input."""
+
+    if n_records <= 0:
+        return []
+
+    start = end = in_file.tell()
+    records = []
+    if os.fstat(in_file.fileno()).st_size > start:
+        with mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for _ in range(n_records):
+                end = buf.find(b"\n", end) + 1
+                if end == 0:
+                    end = len(buf)
+                    break
+            records = buf[start:end].decode().splitlines()
+        in_file.seek(end)
+
+    assert (
+        len(records) == n_records
+    ), f"End of file reached after {len(records)} of {n_records} records"
+    return records
+
+
 ################################################################################
 #                                                                              #
 #                     DEFAULT FORMATS FOR LIST-DIRECTED I/O                    #
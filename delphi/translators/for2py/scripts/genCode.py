@@ -2,14 +2,40 @@ import ast
 import sys
 
 
+# Replacements for scalar math functions when generating NumPy-vectorized
+# lambdas, so that whole arrays of input samples can be passed through them.
+VECTORIZED_FUNCTIONS = {
+    "math.exp": "np.exp",
+    "math.log": "np.log",
+    "math.log10": "np.log10",
+    "math.sqrt": "np.sqrt",
+    "math.sin": "np.sin",
+    "math.cos": "np.cos",
+    "math.tan": "np.tan",
+    "math.atan": "np.arctan",
+    "math.pow": "np.power",
+    "exp": "np.exp",
+    "log": "np.log",
+    "sqrt": "np.sqrt",
+    "atan": "np.arctan",
+    "mod": "np.mod",
+    "abs": "np.abs",
+    "max": "np.maximum",
+    "min": "np.minimum",
+}
+
+
 class PrintState:
-    def __init__(self, sep=None, add=None):
+    def __init__(self, sep=None, add=None, vectorized=None):
         self.sep = sep if sep != None else "\n"
         self.add = add if add != None else "    "
+        self.vectorized = vectorized if vectorized != None else False
 
-    def copy(self, sep=None, add=None):
+    def copy(self, sep=None, add=None, vectorized=None):
         return PrintState(
-            self.sep if sep == None else sep, self.add if add == None else add
+            self.sep if sep == None else sep,
+            self.add if add == None else add,
+            self.vectorized if vectorized == None else vectorized,
         )
 
 
@@ -187,12 +213,18 @@ def genCode(node, state):
             fnName = module + "." + fnName
         else:
             fnName = node.func.id
-        codeStr = f"{fnName}("
-
-        if len(node.args) > 0:
-            codeStr += ", ".join([genCode(arg, state) for arg in node.args])
-
-        codeStr += ")"
+        if state.vectorized:
+            fnName = VECTORIZED_FUNCTIONS.get(fnName, fnName)
+        args = [genCode(arg, state) for arg in node.args]
+
+        # The NumPy ufuncs np.maximum and np.minimum are binary, unlike the
+        # variadic Fortran MAX and MIN intrinsics, so we nest them.
+        if fnName in ("np.maximum", "np.minimum") and len(args) > 2:
+            codeStr = args[0]
+            for arg in args[1:]:
+                codeStr = f"{fnName}({codeStr}, {arg})"
+        else:
+            codeStr = f"{fnName}({', '.join(args)})"
 
     elif isinstance(node, ast.Import):
         codeStr = "import {0}{1}".format(
@@ -23,6 +23,7 @@ class PGMState:
         lastDefDefault=0,
         fnName=None,
         varTypes: Optional[Dict] = {},
+        vectorized: bool = False,
     ):
         self.lastDefs = lastDefs
         self.nextDefs = nextDefs
@@ -30,6 +31,7 @@ class PGMState:
         self.fnName = fnName
         self.varTypes = varTypes
         self.lambdaFile = lambdaFile
+        self.vectorized = vectorized
 
     def copy(
         self,
@@ -47,6 +49,7 @@ class PGMState:
             self.lastDefDefault if lastDefDefault == None else lastDefDefault,
             self.fnName if fnName == None else fnName,
             self.varTypes if varTypes == None else varTypes,
+            self.vectorized,
         )
 
 
@@ -106,9 +109,9 @@ def printPgm(pgmFile, pgm):
     pgmFile.write(json.dumps(pgm, indent=2))
 
 
-def genFn(fnFile, node, fnName, returnVal, inputs):
+def genFn(fnFile, node, fnName, returnVal, inputs, vectorized=False):
     fnFile.write(f"def {fnName}({', '.join(inputs)}):\n    ")
-    code = genCode(node, PrintState("\n    "))
+    code = genCode(node, PrintState("\n    ", vectorized=vectorized))
     if returnVal:
         fnFile.write(f"return {code}")
     else:
@@ -559,6 +562,7 @@ def genPgm(node, state, fnNames):
             lambdaName,
             None,
             [src["var"]["variable"] for src in condSrcs if "var" in src],
+            state.vectorized,
         )
 
         startDefs = state.lastDefs.copy()
@@ -783,6 +787,7 @@ def genPgm(node, state, fnNames):
                 lambdaName,
                 target["var"]["variable"],
                 [src["var"]["variable"] for src in sources if "var" in src],
+                state.vectorized,
             )
 
             if not fn["sources"] and len(sources) == 1:
@@ -842,6 +847,7 @@ def genPgm(node, state, fnNames):
                 lambdaName,
                 target["var"]["variable"],
                 source_list,
+                state.vectorized,
             )
             if not fn["sources"] and len(sources) == 1:
                 if sources[0].get("list"):
@@ -915,12 +921,24 @@ def importAst(filename: str):
     return ast.parse(tokenize.open(filename).read())
 
 
-def create_pgm_dict(lambdaFile: str, asts: List, pgm_file="pgm.json") -> Dict:
+def create_pgm_dict(
+    lambdaFile: str, asts: List, pgm_file="pgm.json", vectorized: bool = False
+) -> Dict:
     """ Create a Python dict representing the PGM, with additional metadata for
-    JSON output. """
+    JSON output.
+
+    If vectorized is True, the lambdas are written using NumPy ufuncs (e.g.
+    np.exp instead of math.exp), so that arrays of input samples can be
+    evaluated in a single call. The decision nodes have no lambdas;
+    ProgramAnalysisGraph selects between the branches with np.where. """
     with open(lambdaFile, "w") as f:
-        f.write("import math\n\n")
-        state = PGMState(f)
+        if vectorized:
+            f.write(
+                "import math\nimport numpy as np\n\nVECTORIZED = True\n\n"
+            )
+        else:
+            f.write("import math\n\n")
+        state = PGMState(f, vectorized=vectorized)
         pgm = genPgm(asts, state, {})[0]
         if pgm.get("start"):
             pgm["start"] = pgm["start"][0]
@@ -972,9 +990,18 @@ if __name__ == "__main__":
         required=False,
         help="Print ASTs",
     )
+    parser.add_argument(
+        "-v",
+        "--vectorized",
+        action="store_true",
+        required=False,
+        help="Generate NumPy-vectorized lambda functions",
+    )
     args = parser.parse_args(sys.argv[1:])
     asts = get_asts_from_files(args.files, args.printAst)
-    pgm_dict = create_pgm_dict(args.lambdaFile[0], asts, args.PGMFile[0])
+    pgm_dict = create_pgm_dict(
+        args.lambdaFile[0], asts, args.PGMFile[0], args.vectorized
+    )
 
     with open(args.PGMFile[0], "w") as f:
         printPgm(f, pgm_dict)
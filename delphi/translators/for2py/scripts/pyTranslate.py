@@ -17,6 +17,13 @@ pickle_file: Pickled file containing the ast represenatation of the Fortran file
 along with other non-source code information.
 
 python_file: The Python file on which to write the resulting python script.
+
+With the -b/--bulk-read flag, simple sequential READ loops (DO loops whose
+READ statements are all at the top level of the loop body, read from a
+single file, and cannot be cut short by an EXIT, RETURN or STOP) read all
+the records they consume in one pass before the loop, using
+fortran_format.read_records and Format.read_rows, instead of one
+Format.read_line call per record.
 """
 
 import sys
@@ -116,6 +123,9 @@ class PythonCodeGenerator(object):
             ".le.": " <= ",
         }
         self.readFormat = []
+        self.bulkRead = False
+        self.bulkReadRows = {}
+        self.bulkReadCount = 0
 
     def printSubroutine(self, node: Dict[str, str], printState: PrintState):
         self.pyStrings.append(f"\ndef {node['name']}(")
@@ -266,6 +276,8 @@ class PythonCodeGenerator(object):
             printState.printFirst = False
 
     def printDo(self, node, printState):
+        if self.bulkRead:
+            self.printBulkRead(node, printState)
         self.pyStrings.append("for ")
         self.printAst(
             node["header"],
@@ -281,6 +293,68 @@ class PythonCodeGenerator(object):
             ),
         )
 
+    def bulkReadNodes(self, node):
+        """Return the READ statements of a DO loop if it is a simple
+        sequential READ loop that can read its input in bulk, otherwise
+        return an empty list."""
+        if len(node["header"]) != 1 or node["header"][0]["tag"] != "index":
+            return []
+
+        reads = [item for item in node["body"] if item.get("tag") == "read"]
+        if not reads or any(
+            len(item["args"]) < 2
+            or item["args"][0]["type"] != "int"
+            or item["args"][1]["type"] != "int"
+            or item["args"][0]["value"] != reads[0]["args"][0]["value"]
+            or item["args"][1]["value"] not in self.format_dict
+            for item in reads
+        ):
+            return []
+
+        tags = list(find_tags(node["body"]))
+        if tags.count("read") != len(reads) or any(
+            tag in ("exit", "return", "stop", "open", "close") for tag in tags
+        ):
+            return []
+
+        return reads
+
+    def printBulkRead(self, node, printState):
+        """Read all the records consumed by a simple sequential READ loop
+        before the loop, and have each of its READ statements take the next
+        row of values read."""
+        reads = self.bulkReadNodes(node)
+        if not reads:
+            return
+
+        index = node["header"][0]
+        self.pyStrings.append("file_records = read_records(")
+        self.pyStrings.append(f"file_{reads[0]['args'][0]['value']}, ")
+        self.pyStrings.append(f"{len(reads)} * len(range(")
+        self.printAst(
+            index["low"],
+            printState.copy(sep="", add="", printFirst=True, indexRef=True),
+        )
+        self.pyStrings.append(", ")
+        self.printAst(
+            index["high"],
+            printState.copy(sep="", add="", printFirst=True, indexRef=True),
+        )
+        self.pyStrings.append("+1)))")
+
+        for offset, item in enumerate(reads):
+            rows = f"read_rows_{self.bulkReadCount}"
+            self.bulkReadCount += 1
+            self.bulkReadRows[id(item)] = rows
+            self.pyStrings.extend(
+                [
+                    printState.sep,
+                    f"{rows} = format_{item['args'][1]['value']}_obj."
+                    f"read_rows(file_records[{offset}::{len(reads)}])",
+                ]
+            )
+        self.pyStrings.append(printState.sep)
+
     def printIndex(self, node, printState):
         self.pyStrings.append(f"{node['name']}[0] in range(")
         self.printAst(
@@ -425,9 +499,12 @@ class PythonCodeGenerator(object):
             if item["tag"] == "ref":
                 var = item["name"]
                 self.pyStrings.append(f"{var},")
-        self.pyStrings.append(
-            f") = format_{format_label}_obj.read_line({file_handle}.readline())"
-        )
+        if id(node) in self.bulkReadRows:
+            self.pyStrings.append(f") = next({self.bulkReadRows[id(node)]})")
+        else:
+            self.pyStrings.append(
+                f") = format_{format_label}_obj.read_line({file_handle}.readline())"
+            )
 
     def printWrite(self, node, printState):
         write_list = []
@@ -486,8 +563,22 @@ class PythonCodeGenerator(object):
         return "".join(self.pyStrings)
 
 
-def create_python_string(outputDict):
+def find_tags(nodes):
+    """Yield the tags of all the nodes in a list of AST nodes, including the
+    nodes nested in them."""
+    for node in nodes:
+        if not isinstance(node, dict):
+            continue
+        if node.get("tag"):
+            yield node["tag"]
+        for value in node.values():
+            if isinstance(value, list):
+                yield from find_tags(value)
+
+
+def create_python_string(outputDict, bulk_read=False):
     code_generator = PythonCodeGenerator()
+    code_generator.bulkRead = bulk_read
     code_generator.pyStrings.extend(
         [
             "from typing import List\n",
@@ -514,9 +605,15 @@ if __name__ == "__main__":
         required=True,
         help="Pickled version of the asts together with non-source code information",
     )
+    parser.add_argument(
+        "-b",
+        "--bulk-read",
+        action="store_true",
+        help="Read the input of simple sequential READ loops in bulk",
+    )
     args = parser.parse_args(sys.argv[1:])
     with open(args.files[0], "rb") as f:
         outputDict = pickle.load(f)
-    pySrc = create_python_string(outputDict)
+    pySrc = create_python_string(outputDict, args.bulk_read)
     with open(args.gen[0], "w") as f:
         f.write(pySrc)
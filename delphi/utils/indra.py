@@ -1,10 +1,170 @@
 """ Helper functions for working with INDRA statements. """
 
 import json
-from typing import Dict, List, Set, Tuple
+import pickle
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from indra.statements import Influence, Concept, Evidence
 from delphi.utils.fp import flatMap
 from functools import singledispatch
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+class ConceptRecord(object):
+    """ A lightweight stand-in for an INDRA Concept, with only the attributes
+    that model assembly reads. """
+
+    __slots__ = ("name", "db_refs")
+
+    def __init__(self, name: str, db_refs: Optional[Dict] = None):
+        self.name = name
+        self.db_refs = db_refs if db_refs is not None else {}
+
+    def to_json(self) -> Dict:
+        return {"name": self.name, "db_refs": self.db_refs}
+
+    def to_indra(self) -> Concept:
+        return Concept(self.name, db_refs=self.db_refs)
+
+
+class EvidenceRecord(object):
+    """ A lightweight stand-in for an INDRA Evidence object. """
+
+    __slots__ = ("source_api", "text", "annotations", "epistemics")
+
+    def __init__(
+        self,
+        source_api: Optional[str] = None,
+        text: Optional[str] = None,
+        annotations: Optional[Dict] = None,
+        epistemics: Optional[Dict] = None,
+    ):
+        self.source_api = source_api
+        self.text = text
+        self.annotations = annotations if annotations is not None else {}
+        self.epistemics = epistemics if epistemics is not None else {}
+
+    def to_json(self) -> Dict:
+        d = {"annotations": self.annotations}
+        for key in ("source_api", "text", "epistemics"):
+            if getattr(self, key):
+                d[key] = getattr(self, key)
+        return d
+
+    def to_indra(self) -> Evidence:
+        return Evidence(
+            source_api=self.source_api,
+            text=self.text,
+            annotations=self.annotations,
+            epistemics=self.epistemics,
+        )
+
+
+class InfluenceRecord(object):
+    """ A lightweight stand-in for an INDRA Influence statement, holding only
+    the groundings, deltas (polarities and adjectives), belief and evidence
+    that model assembly and export read, so that it can be used wherever
+    Influence statements are in the assembly code (make_edges,
+    constructConditionalPDF, is_grounded, is_well_grounded, export_edge,
+    ...). It is much cheaper to construct and to pickle than an Influence
+    statement, which to_indra builds when provenance is needed. """
+
+    __slots__ = (
+        "subj", "obj", "subj_delta", "obj_delta", "evidence", "belief"
+    )
+
+    def __init__(
+        self,
+        subj: ConceptRecord,
+        obj: ConceptRecord,
+        subj_delta: Optional[Dict] = None,
+        obj_delta: Optional[Dict] = None,
+        evidence: Optional[List[EvidenceRecord]] = None,
+        belief: float = 1,
+    ):
+        self.subj = subj
+        self.obj = obj
+        self.subj_delta = (
+            subj_delta
+            if subj_delta is not None
+            else {"polarity": None, "adjectives": []}
+        )
+        self.obj_delta = (
+            obj_delta
+            if obj_delta is not None
+            else {"polarity": None, "adjectives": []}
+        )
+        self.evidence = evidence if evidence is not None else []
+        self.belief = belief
+
+    def agent_list(self) -> List[ConceptRecord]:
+        return [self.subj, self.obj]
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "InfluenceRecord":
+        """ Construct a record from a JSON-serialized INDRA statement. """
+        return cls(
+            ConceptRecord(d["subj"]["name"], d["subj"]["db_refs"]),
+            ConceptRecord(d["obj"]["name"], d["obj"]["db_refs"]),
+            d.get("subj_delta"),
+            d.get("obj_delta"),
+            [
+                EvidenceRecord(
+                    e.get("source_api"),
+                    e.get("text"),
+                    e.get("annotations"),
+                    e.get("epistemics"),
+                )
+                for e in d["evidence"]
+            ],
+            d.get("belief", 1),
+        )
+
+    def to_json(self) -> Dict:
+        """ Serialize the record like an INDRA statement, in a form that
+        influence_stmt_from_dict and from_dict read back. """
+        return {
+            "type": "Influence",
+            "subj": self.subj.to_json(),
+            "subj_delta": self.subj_delta,
+            "obj": self.obj.to_json(),
+            "obj_delta": self.obj_delta,
+            "belief": self.belief,
+            "evidence": [e.to_json() for e in self.evidence],
+        }
+
+    def to_indra(self) -> Influence:
+        st = Influence(
+            self.subj.to_indra(),
+            self.obj.to_indra(),
+            self.subj_delta,
+            self.obj_delta,
+            [e.to_indra() for e in self.evidence],
+        )
+        st.belief = self.belief
+        return st
+
+
+def to_indra_statement(s: Union[Influence, InfluenceRecord]) -> Influence:
+    """ Get the INDRA statement for a statement or a statement record, e.g.
+    to access its full provenance. """
+    return s.to_indra() if isinstance(s, InfluenceRecord) else s
 
 
 def get_concepts(sts: List[Influence]) -> Set[str]:
@@ -16,13 +176,7 @@ def get_valid_statements_for_modeling(sts: List[Influence]) -> List[Influence]:
     """ Select INDRA statements that can be used to construct a Delphi model
     from a given list of statements. """
 
-    return [
-        s
-        for s in sts
-        if is_grounded_statement(s)
-        and (s.subj_delta["polarity"] is not None)
-        and (s.obj_delta["polarity"] is not None)
-    ]
+    return select_statements(sts)
 
 
 def influence_stmt_from_dict(d: Dict) -> Influence:
@@ -33,12 +187,14 @@ def influence_stmt_from_dict(d: Dict) -> Influence:
         d.get("obj_delta"),
         [
             Evidence(
-                e["source_api"], text=e["text"], annotations=e["annotations"]
+                e.get("source_api"),
+                text=e.get("text"),
+                annotations=e.get("annotations"),
             )
             for e in d["evidence"]
         ],
     )
-    st.belief = d["belief"]
+    st.belief = d.get("belief", 1)
     return st
 
 
@@ -51,10 +207,128 @@ def get_statements_from_json_dict(_dict: Dict) -> List[Influence]:
         and d["obj"]["name"] is not None
     ]
 
+
+def get_statements_from_json(json_serialized_list: str) -> List[Influence]:
+    return get_statements_from_json_dict(json.loads(json_serialized_list))
+
+
+def is_ndjson_file(json_file: str) -> bool:
+    """ Check if a file is newline-delimited JSON, by its extension. """
+    return str(json_file).endswith((".ndjson", ".jsonl"))
+
+
+def _items_at(obj: Any, keys: List[str]) -> Iterator[Any]:
+    if not keys:
+        yield obj
+    elif keys[0] == "item":
+        for x in obj:
+            yield from _items_at(x, keys[1:])
+    elif keys[0] in obj:
+        yield from _items_at(obj[keys[0]], keys[1:])
+
+
+def iter_json_records(json_file: str, prefix: str = "item") -> Iterator[Any]:
+    """ Iterate over the records of a JSON file one at a time, without loading
+    the whole file.
+
+    Args:
+        json_file: The file, either JSON or newline-delimited JSON (with a
+            .ndjson or .jsonl extension, one record per line).
+        prefix: The path of the records in a JSON file, in the notation of
+            ijson, e.g. "item" for the elements of a top-level array, or
+            "statements.item" for those of the array under the "statements"
+            key of a top-level object.
+
+    If ijson is not installed, JSON files are loaded whole with json.load.
+    """
+    if is_ndjson_file(json_file):
+        with open(json_file, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif ijson is not None:
+        with open(json_file, "rb") as f:
+            yield from ijson.items(f, prefix, use_float=True)
+    else:
+        with open(json_file, "r") as f:
+            yield from _items_at(json.load(f), prefix.split("."))
+
+
+def iter_json_key_values(
+    json_file: str, prefix: str
+) -> Iterator[Tuple[str, Any]]:
+    """ Iterate over the (key, value) pairs of the object at prefix in a JSON
+    file (see iter_json_records). """
+    if ijson is not None:
+        with open(json_file, "rb") as f:
+            yield from ijson.kvitems(f, prefix, use_float=True)
+    else:
+        with open(json_file, "r") as f:
+            for obj in _items_at(json.load(f), prefix.split(".")):
+                yield from obj.items()
+
+
+def is_influence_dict(d: Dict) -> bool:
+    """ Check if a JSON-serialized INDRA statement is an Influence statement
+    with a named subject and object. """
+    return (
+        d.get("type") == "Influence"
+        and d["subj"]["name"] is not None
+        and d["obj"]["name"] is not None
+    )
+
+
+def is_grounded_concept_dict(c: Dict) -> bool:
+    """ Check if a JSON-serialized concept is grounded, as in
+    is_grounded_concept. """
+    groundings = (c.get("db_refs") or {}).get("UN")
+    return bool(groundings) and groundings[0][0].split("/")[1] != "properties"
+
+
+def is_valid_statement_dict_for_modeling(
+    d: Dict, minimum_evidence_pieces_required: int = 1
+) -> bool:
+    """ Check if a JSON-serialized INDRA statement would be selected by
+    get_valid_statements_for_modeling, and has at least
+    minimum_evidence_pieces_required pieces of evidence, so that statements
+    can be filtered before they are deserialized. """
+    return (
+        is_influence_dict(d)
+        and len(d.get("evidence") or ()) >= minimum_evidence_pieces_required
+        and is_grounded_concept_dict(d["subj"])
+        and is_grounded_concept_dict(d["obj"])
+        and (d.get("subj_delta") or {}).get("polarity") is not None
+        and (d.get("obj_delta") or {}).get("polarity") is not None
+    )
+
+
+def iter_statements_from_json_file(
+    json_file: str,
+    predicate: Optional[Callable[[Dict], bool]] = None,
+    records: bool = False,
+) -> Iterator[Union[Influence, InfluenceRecord]]:
+    """ Iterate over the Influence statements of a JSON or newline-delimited
+    JSON file of INDRA statements, reading the file incrementally.
+
+    Args:
+        json_file: The file (see iter_json_records).
+        predicate: An optional function of the JSON-serialized statements,
+            which are only deserialized if it returns True. Since it is
+            called first, only the statements that pass it are held in
+            memory.
+        records: Whether to deserialize the statements as InfluenceRecords
+            rather than INDRA Influence statements.
+    """
+    deserialize = (
+        InfluenceRecord.from_dict if records else influence_stmt_from_dict
+    )
+    for d in iter_json_records(json_file):
+        if is_influence_dict(d) and (predicate is None or predicate(d)):
+            yield deserialize(d)
+
+
 def get_statements_from_json_file(json_file: str) -> List[Influence]:
-    with open(json_file, "r") as f:
-        _dict = json.load(f)
-    return get_statements_from_json_dict(_dict)
+    return list(iter_statements_from_json_file(json_file))
 
 
 @singledispatch
@@ -71,7 +345,14 @@ def _(c: Concept) -> bool:
     )
 
 
+@is_grounded.register(ConceptRecord)
+def _(c: ConceptRecord) -> bool:
+    """ Check if a concept record is grounded """
+    return is_grounded_concept(c)
+
+
 @is_grounded.register(Influence)
+@is_grounded.register(InfluenceRecord)
 def _(s: Influence) -> bool:
     """ Check if an Influence statement is grounded """
     return is_grounded(s.subj) and is_grounded(s.obj)
@@ -96,6 +377,7 @@ def is_well_grounded():
 
 
 @is_well_grounded.register(Concept)
+@is_well_grounded.register(ConceptRecord)
 def _(c: Concept, cutoff: float = 0.7) -> bool:
     """Check if a concept has a high grounding score. """
 
@@ -103,6 +385,7 @@ def _(c: Concept, cutoff: float = 0.7) -> bool:
 
 
 @is_well_grounded.register(Influence)
+@is_well_grounded.register(InfluenceRecord)
 def _(s: Influence, cutoff: float = 0.7) -> bool:
     """ Returns true if both subj and obj are grounded to the UN ontology. """
 
@@ -159,3 +442,260 @@ def nameTuple(s: Influence) -> Tuple[str, str]:
     """ Returns a 2-tuple consisting of the top groundings of the subj and obj
     of an Influence statement. """
     return top_grounding(s.subj), top_grounding(s.obj)
+
+
+# ============================================================================
+# Vectorized statement selection
+# ============================================================================
+
+# The statements that the worker processes of a pool select from, and the
+# arguments of grounding_mask, set by _init_worker. With the fork start
+# method, the statements are inherited by the workers instead of being
+# pickled.
+_worker_statements = None
+_worker_kwargs = None
+
+
+def _init_worker(sts, kwargs):
+    global _worker_statements, _worker_kwargs
+    _worker_statements, _worker_kwargs = sts, kwargs
+
+
+def _mask_worker(bounds: Tuple[int, int]) -> np.ndarray:
+    return grounding_mask(
+        grounding_table(_worker_statements[bounds[0] : bounds[1]]),
+        **_worker_kwargs,
+    )
+
+
+def _grounding_columns(c) -> Tuple[Optional[str], float]:
+    groundings = c.db_refs.get("UN")
+    if not groundings:
+        return None, np.nan
+    return groundings[0][0], groundings[0][1]
+
+
+def grounding_table(sts: List[Influence]) -> pd.DataFrame:
+    """ Collect the top groundings and their scores and the polarities of a
+    list of Influence statements (or InfluenceRecords) into a table, with
+    one row per statement, in a single pass over the statements. """
+    rows = [
+        (
+            *_grounding_columns(s.subj),
+            *_grounding_columns(s.obj),
+            s.subj_delta.get("polarity"),
+            s.obj_delta.get("polarity"),
+        )
+        for s in sts
+    ]
+    return pd.DataFrame(
+        rows,
+        columns=[
+            "subj_grounding",
+            "subj_score",
+            "obj_grounding",
+            "obj_score",
+            "subj_polarity",
+            "obj_polarity",
+        ],
+    )
+
+
+def _concept_columns(
+    table: pd.DataFrame,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ The top groundings of the subjects and then of the objects of the
+    statements of a grounding table, as codes into an array of the distinct
+    groundings (with -1 for a missing grounding), along with whether each
+    concept is grounded (as in is_grounded_concept) and its score. """
+    codes, groundings = pd.factorize(
+        pd.concat([table["subj_grounding"], table["obj_grounding"]])
+    )
+    # The missing groundings have code -1, and so index the extra False at the
+    # end of the array of per-grounding values.
+    paths = [g.split("/") for g in groundings]
+    grounded = np.array(
+        [len(path) > 1 and path[1] != "properties" for path in paths] + [False]
+    )[codes]
+    scores = np.concatenate(
+        [table["subj_score"].values, table["obj_score"].values]
+    ).astype(float)
+    return codes, np.asarray(groundings, dtype=object), grounded, scores
+
+
+def grounding_mask(
+    table: pd.DataFrame,
+    cutoff: Optional[float] = None,
+    require_polarity: bool = True,
+    relevant_concepts: Optional[List[str]] = None,
+    relevance_cutoff: float = 0.7,
+) -> np.ndarray:
+    """ Select statements from their grounding table (see grounding_table)
+    with vectorized versions of is_grounded_statement,
+    is_well_grounded_statement, is_simulable and contains_relevant_concept.
+    The ontology paths of the groundings are split once per distinct
+    grounding rather than once per check.
+
+    Args:
+        table: The grounding table.
+        cutoff: If given, the minimum score of the top groundings of both
+            concepts (as in is_well_grounded). Otherwise both concepts only
+            need to be grounded (as in is_grounded).
+        require_polarity: Whether both polarities must be known.
+        relevant_concepts: If given, the statements must also contain one of
+            these concepts, as in contains_relevant_concept.
+        relevance_cutoff: The score cutoff of the relevant concepts.
+
+    Returns:
+        A boolean array with one element per statement.
+    """
+    n = len(table)
+    codes, groundings, grounded, scores = _concept_columns(table)
+    well_grounded = grounded
+    if cutoff is not None:
+        well_grounded = grounded & (scores >= cutoff)
+    mask = well_grounded[:n] & well_grounded[n:]
+
+    if require_polarity:
+        mask &= (
+            table["subj_polarity"].notna().values
+            & table["obj_polarity"].notna().values
+        )
+
+    if relevant_concepts is not None:
+        relevant = np.append(
+            np.isin(groundings, list(relevant_concepts)), False
+        )
+        # As in is_grounded_to_name, a relevant concept must itself be
+        # grounded (and not to a property) with a high enough score.
+        is_relevant = (
+            grounded & relevant[codes] & (scores >= relevance_cutoff)
+        )
+        mask &= is_relevant[:n] | is_relevant[n:]
+    return mask
+
+
+def select_statements(
+    sts: List[Influence],
+    cutoff: Optional[float] = None,
+    require_polarity: bool = True,
+    relevant_concepts: Optional[List[str]] = None,
+    relevance_cutoff: float = 0.7,
+    n_processes: Optional[int] = None,
+    chunk_size: int = 100000,
+) -> List[Influence]:
+    """ Select Influence statements (or InfluenceRecords) by grounding,
+    polarity and relevance in a single pass (see grounding_mask for the
+    arguments).
+
+    Args:
+        n_processes: If given, the number of worker processes across which
+            a large list of statements is sharded, in chunks of chunk_size
+            statements.
+    """
+    sts = list(sts)
+    kwargs = dict(
+        cutoff=cutoff,
+        require_polarity=require_polarity,
+        relevant_concepts=relevant_concepts,
+        relevance_cutoff=relevance_cutoff,
+    )
+    if n_processes is None or len(sts) <= chunk_size:
+        mask = grounding_mask(grounding_table(sts), **kwargs)
+    else:
+        # The rows of the mask are independent, so that each worker selects
+        # from a chunk of the statements and only sends back its mask.
+        pool = Pool(n_processes, _init_worker, (sts, kwargs))
+        try:
+            mask = np.concatenate(
+                pool.map(
+                    _mask_worker,
+                    [
+                        (i, i + chunk_size)
+                        for i in range(0, len(sts), chunk_size)
+                    ],
+                )
+            )
+        finally:
+            pool.terminate()
+    return [s for s, selected in zip(sts, mask) if selected]
+
+
+class StatementIndex(object):
+    """ An inverted index from the top groundings of the concepts of a corpus
+    of statements to the ids (positions in the corpus) of the statements that
+    contain them, for building many concept-focused CAGs from the same
+    corpus. The index is built once, with a single pass over the corpus, and
+    can be pickled along with the corpus.
+
+    The ids of the statements containing each grounding are stored in
+    decreasing order of the score of the grounding, so that selecting the
+    statements that contain a concept grounded with a score above a cutoff
+    takes a lookup and a binary search, instead of a call to
+    contains_relevant_concept per statement.
+
+    Args:
+        sts: The corpus, a list of Influence statements or InfluenceRecords.
+    """
+
+    def __init__(self, sts: List[Influence]):
+        self.statements = list(sts)
+        codes, groundings, grounded, scores = _concept_columns(
+            grounding_table(self.statements)
+        )
+        ids = np.tile(np.arange(len(self.statements)), 2)[grounded]
+        codes, scores = codes[grounded], scores[grounded]
+
+        order = np.lexsort((-scores, codes))
+        self.groundings: Dict[str, int] = {
+            g: k for k, g in enumerate(groundings)
+        }
+        self.indptr = np.r_[
+            0, np.cumsum(np.bincount(codes, minlength=len(groundings)))
+        ]
+        self.ids = ids[order]
+        self.scores = scores[order]
+
+    def statement_ids(
+        self, concepts: List[str], cutoff: float = 0.7
+    ) -> np.ndarray:
+        """ The sorted ids of the statements that contain one of the concepts
+        with a grounding score of at least cutoff (the statements for which
+        contains_relevant_concept(s, concepts, cutoff) is True). """
+        slices = []
+        for concept in concepts:
+            k = self.groundings.get(concept)
+            if k is None:
+                continue
+            start, end = self.indptr[k], self.indptr[k + 1]
+            n_above = np.searchsorted(
+                -self.scores[start:end], -cutoff, side="right"
+            )
+            slices.append(self.ids[start : start + n_above])
+        if not slices:
+            return np.array([], dtype=int)
+        return np.unique(np.concatenate(slices))
+
+    def get_statements(
+        self, concepts: List[str], cutoff: float = 0.7
+    ) -> List[Influence]:
+        """ The statements that contain one of the concepts with a grounding
+        score of at least cutoff, in corpus order. """
+        ids = self.statement_ids(concepts, cutoff)
+        return [self.statements[i] for i in ids]
+
+    def to_pickle(self, filename: str = "statement_index.pkl"):
+        with open(filename, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def from_pickle(cls, filename: str):
+        """ Load a StatementIndex object from a pickle file. """
+        with open(filename, "rb") as f:
+            index = pickle.load(f)
+        if not isinstance(index, cls):
+            raise TypeError(
+                f"The pickled object in {filename} is not an instance of "
+                "StatementIndex"
+            )
+        return index
@@ -0,0 +1,72 @@
+""" Compare the time taken to compute the Markov blankets of a batch of node
+sets of a large synthetic CAG by scanning the parents and children of each
+node with networkx and with CausalMarkovBlanket's sparse matrix products.
+
+Usage:
+
+    python scripts/benchmarks/markov_blankets.py --n-nodes 100000
+"""
+
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+
+from delphi.analysis.comparison.CausalMarkovBlanket import CausalMarkovBlanket
+
+
+def naive_blanket(G, nodes):
+    blanket = set()
+    for n in nodes:
+        blanket |= set(G.predecessors(n)) | set(G.successors(n))
+        for c in G.successors(n):
+            blanket |= set(G.predecessors(c))
+    return blanket - set(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--n-nodes", type=int, default=20000)
+    parser.add_argument("--edges-per-node", type=int, default=4)
+    parser.add_argument("--n-queries", type=int, default=10000)
+    parser.add_argument("--set-size", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    n = args.n_nodes
+    G = nx.DiGraph()
+    G.add_nodes_from(f"concept_{i}" for i in range(n))
+    G.add_edges_from(
+        (f"concept_{u}", f"concept_{v}")
+        for u, v in rng.randint(0, n, size=(args.edges_per_node * n, 2))
+        if u != v
+    )
+    node_sets = [
+        [f"concept_{i}" for i in rng.choice(n, args.set_size, replace=False)]
+        for _ in range(args.n_queries)
+    ]
+    print(
+        f"{len(G)} nodes, {G.number_of_edges()} edges, {args.n_queries} "
+        f"node sets of {args.set_size} nodes"
+    )
+
+    start = time.time()
+    expected = [naive_blanket(G, nodes) for nodes in node_sets]
+    print(f"networkx scans:                    {time.time() - start:.2f}s")
+
+    start = time.time()
+    cmb = CausalMarkovBlanket(G)
+    indexed = time.time()
+    cmb.blanket_ids(node_sets)
+    queried = time.time()
+    blankets = cmb.blankets(node_sets)
+    end = time.time()
+    print(f"CausalMarkovBlanket indexing:      {indexed - start:.2f}s")
+    print(f"CausalMarkovBlanket.blanket_ids:   {queried - indexed:.2f}s")
+    print(f"CausalMarkovBlanket.blankets:      {end - queried:.2f}s")
+    assert blankets == expected
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+""" Time the calibration of the betas and initial derivatives of a synthetic
+50-edge CAG against 10 years of monthly observations of some of its nodes,
+generated from known parameters with added noise.
+
+Usage:
+
+    python scripts/benchmarks/parameter_calibration.py --n-processes 4
+"""
+
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from delphi.AnalysisGraph import AnalysisGraph
+from delphi.analysis.optimization.param_optimization import (
+    CAGParameterOptimizer,
+)
+
+
+def make_graph(n_nodes, n_edges, rng):
+    """ A random DAG with n_nodes nodes and n_edges edges. """
+    pairs = [(u, v) for u in range(n_nodes) for v in range(u + 1, n_nodes)]
+    chosen = rng.choice(len(pairs), n_edges, replace=False)
+    return AnalysisGraph(
+        [(f"n{pairs[k][0]}", f"n{pairs[k][1]}") for k in chosen]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--n-nodes", type=int, default=30)
+    parser.add_argument("--n-edges", type=int, default=50)
+    parser.add_argument("--n-months", type=int, default=120)
+    parser.add_argument("--n-observed", type=int, default=15)
+    parser.add_argument("--n-starts", type=int, default=8)
+    parser.add_argument("--n-processes", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    G = make_graph(args.n_nodes, args.n_edges, rng)
+    s0 = G.construct_default_initial_state().values.copy()
+    s0[1::2] = rng.uniform(-0.01, 0.01, len(G))
+    betas = rng.uniform(-0.5, 0.5, len(G.edges))
+    states = G.project(betas, s0, args.n_months - 1)[0]
+
+    components = list(G.get_latent_state_components())
+    observed = list(G.nodes)[: args.n_observed]
+    observations = pd.DataFrame(
+        {n: 10 * states[:, components.index(n)] for n in observed}
+    )
+    observations += rng.normal(0, 0.01, observations.shape)
+
+    optimizer = CAGParameterOptimizer(G, observations)
+    start = time.time()
+    result = optimizer.fit(
+        n_starts=args.n_starts, n_processes=args.n_processes, seed=0
+    )
+    print(
+        f"Calibrated {len(optimizer.parameter_names)} parameters of a "
+        f"{len(G.edges)}-edge CAG against {args.n_months} months of "
+        f"{len(observed)} indicators in {time.time() - start:.1f}s "
+        f"({args.n_starts} starts, loss {result.fun:.2e})"
+    )
+
+
+if __name__ == "__main__":
+    main()
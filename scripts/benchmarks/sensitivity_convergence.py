@@ -0,0 +1,152 @@
+""" Compare the number of model evaluations needed by Sobol analysis and by
+STAR-VARS to converge to a stable ranking of the parameters of the PETPT and
+PETASCE evapotranspiration models.
+
+For each method, the sample size is doubled until the ranking of the
+influential parameters (those with a total order Sobol index of at least 1%
+in a large reference Sobol analysis) matches the reference ranking, and keeps
+matching it for all larger sample sizes.
+
+Usage:
+
+    python scripts/benchmarks/sensitivity_convergence.py
+"""
+
+import argparse
+import warnings
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+
+import numpy as np
+
+from delphi.analysis.sensitivity.variance_methods import SobolAnalyzer
+from delphi.analysis.sensitivity.variogram_methods import VARSAnalyzer
+
+data_dir = (
+    Path(__file__).parents[2] / "delphi" / "translators" / "for2py" / "data"
+)
+
+
+def load_model(name: str):
+    """ Load a translated model from the for2py data directory. """
+    spec = spec_from_file_location(name, str(data_dir / f"{name}.py"))
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+PETPT = load_model("PETPT")
+PETASCE = load_model("PETASCE")
+
+
+def PETPT_wrapper(MSALB, SRAD, TMAX, TMIN, XHLAI):
+    return PETPT(MSALB, SRAD, TMAX, TMIN, XHLAI, [0.0])
+
+
+def PETASCE_wrapper(CANHT, MSALB, SRAD, TDEW, TMAX, TMIN, WINDHT, WINDRUN,
+                    XHLAI, XLAT, XELEV):
+    return PETASCE(CANHT, [1], MSALB, ["A"], SRAD, TDEW, TMAX, TMIN, WINDHT,
+                   WINDRUN, XHLAI, XLAT, XELEV)
+
+
+def problem(bounds):
+    return {
+        "num_vars": len(bounds),
+        "names": list(bounds),
+        "bounds": list(bounds.values()),
+    }
+
+
+MODELS = {
+    "PETPT": (
+        PETPT_wrapper,
+        problem({
+            "MSALB": [0.0, 1.0],
+            "SRAD": [1.0, 30.0],
+            "TMAX": [-30.0, 60.0],
+            "TMIN": [-30.0, 60.0],
+            "XHLAI": [0.0, 20.0],
+        }),
+    ),
+    "PETASCE": (
+        PETASCE_wrapper,
+        problem({
+            "CANHT": [0.0, 3.0],
+            "MSALB": [0.0, 1.0],
+            "SRAD": [1.0, 30.0],
+            "TDEW": [-10.0, 20.0],
+            "TMAX": [20.0, 40.0],
+            "TMIN": [0.0, 20.0],
+            "WINDHT": [0.5, 10.0],
+            "WINDRUN": [0.0, 900.0],
+            "XHLAI": [0.0, 10.0],
+            "XLAT": [-60.0, 60.0],
+            "XELEV": [0.0, 3000.0],
+        }),
+    ),
+}
+
+
+def sobol_total_order(model, prob_def, num_samples):
+    analyzer = SobolAnalyzer(model, prob_def=prob_def)
+    analyzer.sample(num_samples=num_samples, second_order=False)
+    analyzer.evaluate()
+    Si = analyzer.analyze(calc_second_order=False, print_to_console=False)
+    return len(analyzer.outputs), Si["ST"]
+
+
+def vars_total_order(model, prob_def, num_stars, seed=0):
+    analyzer = VARSAnalyzer(model, prob_def=prob_def)
+    analyzer.sample(num_stars=num_stars, resolution=0.1, seed=seed)
+    analyzer.evaluate()
+    return len(analyzer.outputs), analyzer.analyze()["ST"]
+
+
+def evaluations_to_convergence(runs, reference):
+    """ Return the number of evaluations from which the ranking of the
+    influential parameters stays equal to their reference ranking. """
+    influential = np.flatnonzero(reference >= 0.01)
+    expected = influential[np.argsort(-reference[influential])].tolist()
+    converged = None
+    for n_evaluations, ST in runs:
+        ranking = influential[np.argsort(-ST[influential])].tolist()
+        if ranking != expected:
+            converged = None
+        elif converged is None:
+            converged = n_evaluations
+    return converged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reference-samples", type=int, default=2 ** 13)
+    parser.add_argument("--max-doublings", type=int, default=8)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    for name, (model, prob_def) in MODELS.items():
+        _, reference = sobol_total_order(model, prob_def,
+                                         args.reference_samples)
+        sobol_runs = [
+            sobol_total_order(model, prob_def, 2 ** (i + 3))
+            for i in range(args.max_doublings)
+        ]
+        vars_runs = [
+            vars_total_order(model, prob_def, 2 ** (i + 1))
+            for i in range(args.max_doublings)
+        ]
+
+        print(f"\n{name}")
+        print("Reference total order indices:")
+        for var, ST in zip(prob_def["names"], reference):
+            print(f"    {var:10s} {ST:8.4f}")
+        for method, runs in (("Sobol", sobol_runs), ("STAR-VARS", vars_runs)):
+            n = evaluations_to_convergence(runs, reference)
+            if n is None:
+                print(f"{method:10s} ranking did not converge")
+            else:
+                print(f"{method:10s} ranking converged after {n} evaluations")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,14 +17,13 @@ setup(
         "Intended Audience :: Science/Research",
         "Topic :: Scientific/Engineering :: Artificial Intelligence",
         "License :: OSI Approved :: Apache Software License",
-        "Programming Language :: Python :: 3.6",
     ],
     keywords="assembling models from text",
     packages=find_packages(exclude=["contrib", "docs", "tests*"]),
     install_requires=[
         "tqdm",
         "numpy",
-        "scipy",
+        "scipy>=1.7",
         "matplotlib",
         "seaborn>=0.9.0",
         "pandas",
@@ -45,7 +44,6 @@ setup(
         "salib",
         "tangent",
     ],
-    python_requires=">=3.6",
     extras_require={
         "dev": [
             "check-manifest", "rise", "shapely", "pyshp", "xlrd",
@@ -60,6 +58,7 @@ setup(
             "coveralls",
             "mypy",
         ],
+        "streaming": ["ijson"],
         "docs": [
             "sphinx",
             "sphinx-rtd-theme",
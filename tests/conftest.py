@@ -1,7 +1,9 @@
 import pickle
+import numpy as np
 import pytest
 from datetime import date
 from indra.statements import Concept, Influence, Evidence
+from scipy.stats import gaussian_kde
 from delphi.AnalysisGraph import AnalysisGraph
 from delphi.utils.indra import *
 from delphi.utils.shell import cd
@@ -50,6 +52,18 @@ s3 = Influence(
 STS = [s1, s2, s3]
 
 
+def make_graph(edges, seed=0):
+    """ An AnalysisGraph with the given edges, each with a random
+    conditional probability density function of its betas. """
+    rng = np.random.RandomState(seed)
+    G = AnalysisGraph(edges)
+    for e in G.edges:
+        G.edges[e]["ConditionalProbability"] = gaussian_kde(
+            rng.normal(0.5, 0.3, 50)
+        )
+    return G
+
+
 @pytest.fixture(scope="session")
 def G():
     G = AnalysisGraph.from_statements(get_valid_statements_for_modeling(STS))
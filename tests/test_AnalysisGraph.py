@@ -1,8 +1,24 @@
+import json
 import os
+from itertools import permutations
+import networkx as nx
+import numpy as np
+import pandas as pd
 from conftest import *
 from indra.statements import Influence, Concept
 from delphi.random_variables import Indicator
 from delphi.AnalysisGraph import AnalysisGraph
+from delphi.random_variables import LatentVar
+import delphi.utils.indra
+from delphi.assembly import (
+    constructConditionalPDF,
+    get_respdevs_by_adjective,
+)
+from delphi.utils.indra import (
+    ConceptRecord,
+    InfluenceRecord,
+    EvidenceRecord,
+)
 import pickle
 import pytest
 
@@ -63,3 +79,395 @@ def test_map_concepts_to_indicators(G):
         G.nodes[food_security_string]["indicators"][indicator.name].name
         == indicator.name
     )
+
+
+def path_nodes(G, pairs, cutoff=None):
+    return {
+        n
+        for source, target in pairs
+        for path in nx.all_simple_paths(G, source, target, cutoff=cutoff)
+        for n in path
+    }
+
+
+@pytest.mark.parametrize("cutoff", [None, 2, 4])
+def test_get_subgraph_for_concept_pairs(cutoff):
+    dag = nx.gnp_random_graph(40, 0.1, seed=0, directed=True)
+    G = AnalysisGraph([(u, v) for u, v in dag.edges if u < v])
+    concepts = [0, 3, 12, 25, 39]
+    pairs = list(permutations(concepts, 2))
+
+    sg = G.get_subgraph_for_concept_pair(0, 25, cutoff=cutoff)
+    assert set(sg.nodes) == path_nodes(G, [(0, 25)], cutoff)
+
+    sg, paths = G.get_subgraph_for_concept_pairs(
+        concepts, cutoff=cutoff, return_paths=True
+    )
+    assert isinstance(sg, AnalysisGraph)
+    assert set(sg.nodes) == path_nodes(G, pairs, cutoff)
+    assert sorted(paths) == sorted(
+        path
+        for source, target in pairs
+        for path in nx.all_simple_paths(G, source, target, cutoff=cutoff)
+    )
+
+
+def test_get_subgraph_for_concept_pairs_dense():
+    dense = nx.gnm_random_graph(1000, 20000, seed=0, directed=True)
+    G = AnalysisGraph(dense.edges)
+    concepts = [0, 1, 2, 3, 4]
+    sg = G.get_subgraph_for_concept_pairs(concepts, cutoff=3)
+    assert 0 < len(sg) < len(G)
+    assert set(sg.nodes) == path_nodes(G, permutations(concepts, 2), 3)
+
+
+@pytest.mark.parametrize("cutoff", [None, 3, 5])
+def test_get_subgraph_for_concept_pairs_cyclic(cutoff):
+    # x lies on the walk s -> x -> s -> t, but on no simple path.
+    G = AnalysisGraph([("s", "x"), ("x", "s"), ("s", "t")])
+    assert set(G.get_subgraph_for_concept_pair("s", "t", cutoff)) == {
+        "s",
+        "t",
+    }
+
+    G = AnalysisGraph(
+        nx.gnp_random_graph(30, 0.08, seed=1, directed=True).edges
+    )
+    concepts = [0, 5, 17, 29]
+    sg = G.get_subgraph_for_concept_pairs(concepts, cutoff=cutoff)
+    assert set(sg.nodes) == path_nodes(G, permutations(concepts, 2), cutoff)
+
+
+def test_core_stays_in_sync():
+    G = make_graph([("a", "b"), ("b", "c"), ("a", "c"), ("c", "d")])
+    G.sample_from_prior()
+    core = G.core
+    assert core.edges == list(G.edges)
+    assert core.betas.shape == (4, G.res)
+    assert np.shares_memory(G.edges["a", "c"]["betas"], core.betas)
+    assert core.is_dag
+
+    G.add_edge("d", "a", betas=np.zeros(G.res))
+    G.remove_node("b")
+    assert G.core is not core
+    core = G.core
+    assert not core.is_dag
+    assert core.nodes == list(G.nodes) and core.edges == list(G.edges)
+    for n, i in core.node_index.items():
+        assert [core.nodes[j] for j in core.successors(i)] == list(
+            G.successors(n)
+        )
+        assert [core.nodes[j] for j in core.predecessors(i)] == list(
+            G.predecessors(n)
+        )
+    assert not core.betas[core.edge_index["d", "a"]].any()
+    assert G.core is core
+
+
+def initialize(G, seed=0):
+    components = list(G.get_latent_state_components())
+    rng = np.random.RandomState(seed)
+    G.s0 = [pd.Series(rng.normal(size=len(components)), components)
+            for _ in range(G.res)]
+    for n in G.nodes:
+        G.nodes[n]["rv"] = LatentVar(n)
+        G.nodes[n]["update_function"] = G.default_update_function
+
+
+def test_update_on_core():
+    edges = [("a", "b"), ("b", "c"), ("a", "c"), ("c", "d")]
+    G, H = make_graph(edges), make_graph(edges)
+    G.sample_from_prior()
+    H.transition_matrix_collection = G.transition_matrix_collection
+    initialize(G)
+    initialize(H)
+    # A non-default update function makes H take the per-node path.
+    for n in H.nodes:
+        H.nodes[n]["update_function"] = lambda n: H.default_update_function(n)
+
+    for _ in range(3):
+        G.update()
+        H.update()
+        for n in G.nodes:
+            assert np.allclose(
+                G.nodes[n]["rv"].dataset, H.nodes[n]["rv"].dataset
+            )
+        for s, t in zip(G.s0, H.s0):
+            assert np.allclose(s.values, t.values)
+    assert np.allclose(G.core.state, np.array([s.values for s in H.s0]))
+    assert G.t == H.t == 3.0
+
+
+def test_update_mixes_paths():
+    edges = [("a", "b"), ("b", "c"), ("a", "c"), ("c", "d")]
+    G, H = make_graph(edges), make_graph(edges)
+    G.sample_from_prior()
+    H.transition_matrix_collection = G.transition_matrix_collection
+    initialize(G)
+    initialize(H)
+    for n in H.nodes:
+        H.nodes[n]["update_function"] = lambda n: H.default_update_function(n)
+
+    # G alternates between the core and the per-node path, and s0 is edited
+    # between steps; H always takes the per-node path.
+    for step in range(4):
+        for n in G.nodes:
+            G.nodes[n]["update_function"] = (
+                G.default_update_function
+                if step % 2 == 0
+                else lambda n: G.default_update_function(n)
+            )
+        for K in (G, H):
+            for s in K.s0:
+                s["∂(a)/∂t"] = 0.1 * step
+        G.update()
+        H.update()
+        for s, t in zip(G.s0, H.s0):
+            assert np.allclose(s.values, t.values)
+
+
+def statement_counts(G):
+    return {
+        e: len(G.edges[e]["InfluenceStatements"]) for e in G.edges
+    }
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+@pytest.mark.parametrize("use_ijson", [False, True])
+def test_from_json_serialized_statements_file(
+    tmp_path, monkeypatch, ndjson, use_ijson
+):
+    if not use_ijson:
+        monkeypatch.setattr(delphi.utils.indra, "ijson", None)
+    unsupported = s1.to_json()
+    unsupported["evidence"] = []
+    records = [s.to_json() for s in STS] * 2 + [unsupported]
+    file = tmp_path / ("statements.jsonl" if ndjson else "statements.json")
+    with open(file, "w") as f:
+        if ndjson:
+            f.writelines(json.dumps(r) + "\n" for r in records)
+        else:
+            json.dump(records, f)
+
+    G = AnalysisGraph.from_json_serialized_statements_file(str(file))
+    assert statement_counts(G) == {
+        (conflict_string, food_security_string): 2
+    }
+    G = AnalysisGraph.from_json_serialized_statements_file(
+        str(file), minimum_evidence_pieces_required=0
+    )
+    assert statement_counts(G) == {
+        (conflict_string, food_security_string): 3
+    }
+    assert all("id" in G.nodes[n] for n in G)
+
+
+@pytest.mark.parametrize("use_ijson", [False, True])
+def test_from_uncharted_json_file(tmp_path, monkeypatch, use_ijson):
+    if not use_ijson:
+        monkeypatch.setattr(delphi.utils.indra, "ijson", None)
+
+    def statement(subj, obj, n_evidence):
+        return {
+            "subj": {"db_refs": {"concept": subj}},
+            "obj": {"db_refs": {"concept": obj}},
+            "subj_delta": {"polarity": 1},
+            "obj_delta": {"polarity": None},
+            "evidence": [
+                {"source_api": "eidos", "annotations": {}, "text": "t"}
+            ] * n_evidence,
+        }
+
+    _dict = {
+        "statements": [
+            statement("UN/a", "UN/b", 1),
+            statement("UN/a", "UN/b", 2),
+            statement("UN/b", "UN/c", 0),
+            statement("UN/c", None, 1),
+        ],
+        "concept_to_indicator_mapping": {
+            "UN/a": "WB/indicator",
+            "UN/c": "WB/other_indicator",
+            "UN/b": None,
+        },
+    }
+    file = tmp_path / "uncharted.json"
+    with open(file, "w") as f:
+        json.dump(_dict, f)
+
+    G = AnalysisGraph.from_uncharted_json_file(str(file))
+    assert statement_counts(G) == {("UN/a", "UN/b"): 2}
+    assert list(G.nodes["UN/a"]["indicators"]) == ["WB/indicator"]
+    assert G.nodes["UN/b"].get("indicators") is None
+    st = G.edges["UN/a", "UN/b"]["InfluenceStatements"][0]
+    assert st.obj_delta["polarity"] == 1
+
+    H = AnalysisGraph.from_uncharted_json_serialized_dict(_dict)
+    assert statement_counts(H) == statement_counts(G)
+
+
+def test_from_statement_index():
+    index = delphi.utils.indra.StatementIndex(STS)
+    G = AnalysisGraph.from_statement_index(index, [food_security_string])
+    assert statement_counts(G) == {
+        (conflict_string, food_security_string): 1
+    }
+    G = AnalysisGraph.from_statement_index(index, [food_security_string], 0.9)
+    assert len(G) == 0
+
+
+def influence(subj, obj, polarity=1, adjectives=("large", "small")):
+    def concept(name):
+        return ConceptRecord(name, {"UN": [(f"UN/events/{name}", 0.9)]})
+
+    return InfluenceRecord(
+        concept(subj),
+        concept(obj),
+        {"polarity": 1, "adjectives": []},
+        {"polarity": polarity, "adjectives": []},
+        [
+            EvidenceRecord(
+                annotations={
+                    "subj_adjectives": [adjectives[0]],
+                    "obj_adjectives": [adjectives[1]],
+                }
+            )
+        ],
+    )
+
+
+def test_add_statements():
+    G = AnalysisGraph.from_statements_iter(
+        [influence("a", "b"), influence("b", "c"), influence("a", "c", -1)]
+    )
+    df = pd.DataFrame(
+        {
+            "adjective": ["large", "large", "small", "small"],
+            "respdev": [1.0, 1.5, 0.2, 0.4],
+        }
+    )
+    G.gradable_adjective_data = (
+        get_respdevs_by_adjective(df.groupby("adjective")),
+        np.random.RandomState(0).normal(size=G.res),
+    )
+    gb, rs = G.gradable_adjective_data
+    for e in G.edges(data=True):
+        e[2]["ConditionalProbability"] = constructConditionalPDF(gb, rs, e)
+    G.sample_from_prior()
+
+    ids = {n: G.nodes[n]["id"] for n in G}
+    ids.update({e: G.edges[e]["id"] for e in G.edges})
+    pdfs = {e: G.edges[e]["ConditionalProbability"] for e in G.edges}
+    betas = {e: G.edges[e]["betas"].copy() for e in G.edges}
+
+    touched = G.add_statements(
+        [
+            influence("b", "c", -1),
+            influence("c", "d"),
+            influence("d", "d"),
+            influence("e", "a", None),
+        ]
+    )
+    a, b, c, d = (f"UN/events/{n}" for n in "abcd")
+    assert touched == [(b, c), (c, d)]
+    assert "UN/events/e" not in G
+    assert len(G.edges[b, c]["InfluenceStatements"]) == 2
+    assert all(G.nodes[n]["id"] == i for n, i in ids.items() if n in G)
+    assert all(G.edges[e]["id"] == ids[e] for e in pdfs)
+    assert "id" in G.nodes[d] and "id" in G.edges[c, d]
+
+    for e in pdfs:
+        if e in touched:
+            assert G.edges[e]["ConditionalProbability"] is not pdfs[e]
+        else:
+            assert G.edges[e]["ConditionalProbability"] is pdfs[e]
+            assert np.array_equal(G.edges[e]["betas"], betas[e])
+
+    core = G.core
+    assert core.betas.shape == (4, G.res)
+    for e in G.edges:
+        assert np.shares_memory(G.edges[e]["betas"], core.betas)
+    assert np.allclose(
+        np.stack([A.values for A in G.transition_matrix_collection]),
+        G.transition_tensor(core.betas.T),
+    )
+
+
+def merge_test_graph():
+    edges = [("a", "c"), ("b", "c"), ("a", "d"), ("e", "a"), ("f", "b"),
+             ("c", "g"), ("d", "g")]
+    return AnalysisGraph.from_statements_iter(
+        [influence(u, v) for u, v in edges] + [influence("a", "c", -1)]
+    )
+
+
+def statement_summary(G):
+    return {
+        e: sorted(
+            (s.subj.db_refs["UN"][0][0], s.obj.db_refs["UN"][0][0],
+             s.subj_delta["polarity"], s.obj_delta["polarity"])
+            for s in G.edges[e]["InfluenceStatements"]
+        )
+        for e in G.edges
+    }
+
+
+def test_merge_nodes_bulk_matches_merge_nodes():
+    a, b, c, d = (f"UN/events/{n}" for n in "abcd")
+    G, H = merge_test_graph(), merge_test_graph()
+    ids = {n: H.nodes[n]["id"] for n in H}
+    G.merge_nodes(a, b, same_polarity=False)
+    G.merge_nodes(d, c)
+    H.merge_nodes_bulk({a: b, d: c}, same_polarity={a: False})
+    assert set(H.edges) == set(G.edges)
+    assert statement_summary(H) == statement_summary(G)
+    assert all(H.nodes[n]["id"] == ids[n] for n in H)
+
+
+def test_merge_nodes_bulk():
+    a, b, c, d, e, x, y, z = (f"UN/events/{n}" for n in "abcdexyz")
+    G = AnalysisGraph.from_statements_iter(
+        [influence(u, v) for u, v in ["ac", "bc", "cd", "xy", "ab"]]
+    )
+    shared = G.edges[a, c]["InfluenceStatements"][0]
+    G.edges[b, c]["InfluenceStatements"].append(shared)
+
+    df = pd.DataFrame(
+        {
+            "adjective": ["large", "large", "small", "small"],
+            "respdev": [1.0, 1.5, 0.2, 0.4],
+        }
+    )
+    G.gradable_adjective_data = (
+        get_respdevs_by_adjective(df.groupby("adjective")),
+        np.random.RandomState(0).normal(size=G.res),
+    )
+    gb, rs = G.gradable_adjective_data
+    for edge in G.edges(data=True):
+        edge[2]["ConditionalProbability"] = constructConditionalPDF(
+            gb, rs, edge
+        )
+    G.sample_from_prior()
+    kept = {edge: G.edges[edge]["ConditionalProbability"]
+            for edge in [(c, d), (x, y)]}
+    betas = G.edges[x, y]["betas"].copy()
+    xy_id = G.edges[x, y]["id"]
+
+    G.merge_nodes_bulk({a: b, b: e, x: z})
+    assert set(G.nodes) == {c, d, e, y, z}
+    assert set(G.edges) == {(e, c), (c, d), (z, y)}
+    assert len(G.edges[e, c]["InfluenceStatements"]) == 2
+    assert shared.subj.db_refs["UN"][0][0] == f"UN/events/{e}"
+
+    assert G.edges[c, d]["ConditionalProbability"] is kept[c, d]
+    assert G.edges[z, y]["ConditionalProbability"] is kept[x, y]
+    assert np.array_equal(G.edges[z, y]["betas"], betas)
+    assert G.edges[z, y]["id"] == xy_id
+    assert "ConditionalProbability" not in G.edges[e, c]
+
+    G.sample_from_prior()
+    assert "ConditionalProbability" in G.edges[e, c]
+    assert G.core.betas.shape == (3, G.res)
+
+    with pytest.raises(ValueError):
+        G.merge_nodes_bulk({c: d, d: c})
@@ -1,3 +1,4 @@
+import pickle
 import numpy as np
 import pandas as pd
 from conftest import *
@@ -80,6 +81,142 @@ def test_contains_relevant_concept():
     assert not contains_relevant_concept(s3, relevant_concepts)
 
 
+RECORDS = [InfluenceRecord.from_dict(s.to_json()) for s in STS]
+
+
+def test_influence_records():
+    r1, r2, r3 = RECORDS
+    assert make_edge(RECORDS, (conflict_string, food_security_string))[2][
+        "InfluenceStatements"
+    ] == [r1]
+    assert nameTuple(r1) == nameTuple(s1)
+    assert is_grounded(r1) and not is_grounded(r2)
+    assert is_well_grounded(r1, cutoff=0.5)
+    assert not is_well_grounded(r1, cutoff=0.9)
+    assert is_simulable(r1) and not is_simulable(r2)
+    assert get_valid_statements_for_modeling(RECORDS) == [r1]
+
+    st = to_indra_statement(r1)
+    assert isinstance(st, Influence)
+    assert st.subj.db_refs == s1.subj.db_refs
+    assert st.evidence[0].annotations == s1.evidence[0].annotations
+    assert to_indra_statement(s1) is s1
+    assert influence_stmt_from_dict(r1.to_json()).obj_delta == s1.obj_delta
+    assert InfluenceRecord.from_dict(r1.to_json()).to_json() == r1.to_json()
+    assert len(pickle.dumps(RECORDS)) < len(pickle.dumps(STS))
+
+
+def test_constructConditionalPDF_from_records():
+    df = pd.DataFrame(
+        {
+            "adjective": ["large", "large", "small", "small"],
+            "respdev": [1.0, 1.5, 0.2, 0.4],
+        }
+    )
+    gb = df.groupby("adjective")
+    rs = np.random.RandomState(0).normal(size=10)
+    e = (conflict_string, food_security_string)
+    pdfs = [
+        constructConditionalPDF(gb, rs, (*e, {"InfluenceStatements": [s]}))
+        for s in (s1, RECORDS[0])
+    ]
+    assert np.allclose(pdfs[0].dataset, pdfs[1].dataset)
+
+    # The gradable adjective data can also be given as plain arrays.
+    pdf = constructConditionalPDF(
+        get_respdevs_by_adjective(gb), rs, (*e, {"InfluenceStatements": [s1]})
+    )
+    assert np.allclose(pdf.dataset, pdfs[0].dataset)
+
+
+def random_records(n, seed=0):
+    rng = np.random.RandomState(seed)
+    groundings = [
+        conflict_string,
+        food_security_string,
+        "UN/properties/price",
+        "UN/events/weather/precipitation",
+    ]
+
+    def concept():
+        if rng.rand() < 0.1:
+            return ConceptRecord("flooding", {"TEXT": "flooding"})
+        g = groundings[rng.randint(len(groundings))]
+        return ConceptRecord(g, {"UN": [(g, rng.rand())]})
+
+    def delta():
+        return {"polarity": [1, -1, None][rng.randint(3)], "adjectives": []}
+
+    return [
+        InfluenceRecord(concept(), concept(), delta(), delta())
+        for _ in range(n)
+    ]
+
+
+@pytest.mark.parametrize("n_processes", [None, 2])
+def test_select_statements(n_processes):
+    sts = random_records(2000)
+    kwargs = dict(n_processes=n_processes, chunk_size=300)
+    assert select_statements(sts, **kwargs) == [
+        s
+        for s in sts
+        if is_grounded_statement(s)
+        and s.subj_delta["polarity"] is not None
+        and s.obj_delta["polarity"] is not None
+    ]
+    assert select_statements(sts, cutoff=0.7, **kwargs) == [
+        s for s in sts if is_well_grounded(s) and is_simulable(s)
+    ]
+    for relevant_concepts in (
+        [food_security_string],
+        ["UN/properties/price", conflict_string],
+    ):
+        assert select_statements(
+            sts,
+            require_polarity=False,
+            relevant_concepts=relevant_concepts,
+            **kwargs,
+        ) == [
+            s
+            for s in sts
+            if is_grounded(s)
+            and contains_relevant_concept(s, relevant_concepts)
+        ]
+    # A concept grounded to a property is never relevant.
+    table = grounding_table(sts)
+    assert not grounding_mask(
+        table,
+        cutoff=0.0,
+        require_polarity=False,
+        relevant_concepts=["UN/properties/price"],
+        relevance_cutoff=0.0,
+    ).any()
+    assert select_statements([]) == []
+
+
+@pytest.mark.parametrize("cutoff", [0.0, 0.5, 0.9])
+def test_StatementIndex(tmp_path, cutoff):
+    sts = random_records(2000)
+    index = StatementIndex(sts)
+    index.to_pickle(str(tmp_path / "index.pkl"))
+    index = StatementIndex.from_pickle(str(tmp_path / "index.pkl"))
+    for concepts in (
+        [food_security_string],
+        [conflict_string, "UN/events/weather/precipitation"],
+        ["UN/properties/price", "flooding", "unknown"],
+    ):
+        ids = index.statement_ids(concepts, cutoff)
+        assert list(ids) == [
+            i
+            for i, s in enumerate(sts)
+            if contains_relevant_concept(s, concepts, cutoff)
+        ]
+        selected = index.get_statements(concepts, cutoff)
+        assert [s.to_json() for s in selected] == [
+            sts[i].to_json() for i in ids
+        ]
+
+
 def test_get_indicator_data():
     indicator = Indicator(
         "Political stability and absence of violence/terrorism (index), Value",
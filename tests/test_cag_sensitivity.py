@@ -0,0 +1,74 @@
+import numpy as np
+import networkx as nx
+import pandas as pd
+import pytest
+from itertools import permutations
+from delphi.AnalysisGraph import AnalysisGraph
+from delphi.analysis.sensitivity.cag_methods import CAGSensitivityAnalyzer
+from delphi.utils.fp import pairwise
+from conftest import make_graph
+
+
+def reference_transition_matrix(G, betas):
+    """ The transition matrix as constructed by looping over simple paths. """
+    elements = G.get_latent_state_components()
+    beta = dict(zip(G.edges, betas))
+    A = pd.DataFrame(np.identity(2 * len(G)), index=elements, columns=elements)
+    for node in G.nodes:
+        A.loc[node, f"∂({node})/∂t"] = G.Δt
+    for u, v in permutations(G.nodes, 2):
+        A.loc[v, f"∂({u})/∂t"] = G.Δt * sum(
+            np.prod([beta[e] for e in pairwise(path)])
+            for path in nx.all_simple_paths(G, u, v)
+        )
+    return A.values
+
+
+@pytest.mark.parametrize(
+    "edges",
+    [
+        [("a", "b"), ("b", "c"), ("a", "c"), ("c", "d")],
+        [("a", "b"), ("b", "c"), ("c", "a"), ("c", "d")],
+    ],
+)
+def test_transition_tensor(edges):
+    G = make_graph(edges)
+    G.Δt = 0.5
+    betas = np.random.RandomState(1).normal(size=(3, len(edges)))
+    A = G.transition_tensor(betas)
+    for i in range(3):
+        assert np.allclose(A[i], reference_transition_matrix(G, betas[i]))
+
+    s0 = np.random.RandomState(2).normal(size=2 * len(G))
+    states = G.project(betas, s0, 4)
+    for i in range(3):
+        s = s0
+        for t in range(5):
+            assert np.allclose(states[i, t], s)
+            s = A[i] @ s
+
+    G.sample_from_prior()
+    assert len(G.transition_matrix_collection) == G.res
+
+
+def test_CAGSensitivityAnalyzer():
+    G = make_graph([("a", "b"), ("b", "c"), ("d", "e")])
+    analyzer = CAGSensitivityAnalyzer(G, "c", n_steps=3)
+    Si = analyzer.analyze(num_samples=512)
+    assert Si["ST"].shape == (3, 3 + 5)
+
+    ST = dict(zip(Si["names"], Si["ST"][-1]))
+    assert ST["β(a, b)"] > 0.01 and ST["∂(a)/∂t"] > 0.01
+    for irrelevant in ("β(d, e)", "∂(d)/∂t", "∂(e)/∂t"):
+        assert abs(ST[irrelevant]) < 1e-12
+    assert np.allclose(
+        analyzer.model(*[[column] for column in analyzer_inputs(analyzer)]),
+        analyzer.trajectories(analyzer_inputs(analyzer).T)[:, -1],
+    )
+
+
+def analyzer_inputs(analyzer):
+    bounds = np.array(analyzer.problem_definition["bounds"])
+    return np.random.RandomState(0).uniform(
+        bounds[:, 0], bounds[:, 1], (10, len(bounds))
+    ).T
@@ -0,0 +1,130 @@
+import time
+
+import networkx as nx
+import numpy as np
+from delphi.AnalysisGraph import AnalysisGraph
+from delphi.analysis.comparison.CongruentSubNetwork import CongruentSubNetwork
+from delphi.analysis.comparison.CausalMarkovBlanket import CausalMarkovBlanket
+
+
+def make_graphs():
+    cag = AnalysisGraph(
+        [
+            ("UN/entities/natural/rainfall", "UN/events/crop_production"),
+            ("UN/events/crop_production", "UN/entities/food_security"),
+            ("UN/events/conflict", "UN/entities/food_security"),
+            ("UN/entities/food_security", "UN/entities/human/migration"),
+            ("UN/events/crop_production", "UN/entities/temperature"),
+        ]
+    )
+    program = nx.DiGraph(
+        [
+            ("RAINFALL", "SOIL_WATER"),
+            ("SOIL_WATER", "CROP_PRODUCTION"),
+            ("TEMPERATURE", "CROP_PRODUCTION"),
+            ("CROP_PRODUCTION", "FOOD_SECURITY"),
+            ("FOOD_SECURITY", "PRICE"),
+            ("DAY", "DAY"),
+            ("DAY", "CONFLICT"),
+            ("MIGRATION", "DAY"),
+        ]
+    )
+    return cag, program
+
+
+def test_CongruentSubNetwork():
+    cag, program = make_graphs()
+    csn = CongruentSubNetwork(cag, program)
+
+    # Conflict and migration are matched, but are not connected to the other
+    # matches in the same way in both graphs, and neither is temperature,
+    # which is downstream of crop production in the CAG but upstream of it in
+    # the program.
+    assert csn.correspondence == {
+        "UN/entities/natural/rainfall": "RAINFALL",
+        "UN/events/crop_production": "CROP_PRODUCTION",
+        "UN/entities/food_security": "FOOD_SECURITY",
+    }
+    assert set(csn.subnetwork1.edges) == {
+        ("UN/entities/natural/rainfall", "UN/events/crop_production"),
+        ("UN/events/crop_production", "UN/entities/food_security"),
+    }
+    assert set(csn.subnetwork2.edges) == {
+        ("RAINFALL", "SOIL_WATER"),
+        ("SOIL_WATER", "CROP_PRODUCTION"),
+        ("CROP_PRODUCTION", "FOOD_SECURITY"),
+    }
+    assert isinstance(csn.subnetwork1, AnalysisGraph)
+    assert csn.inputs == [("UN/entities/natural/rainfall", "RAINFALL")]
+    assert csn.outputs == [("UN/entities/food_security", "FOOD_SECURITY")]
+
+    csn = CongruentSubNetwork(
+        cag, program, mapping={"UN/events/conflict": "DAY",
+                               "UN/entities/human/migration": "PRICE"}
+    )
+    assert csn.correspondence == {}
+    assert len(csn.subnetwork1) == len(csn.subnetwork2) == 0
+
+
+def test_CongruentSubNetwork_large_graphs():
+    rng = np.random.RandomState(0)
+    G1 = nx.gnm_random_graph(5000, 15000, seed=0, directed=True)
+    G2 = nx.relabel_nodes(
+        nx.gnm_random_graph(5000, 15000, seed=1, directed=True),
+        lambda n: f"v{n}",
+    )
+    mapping = {
+        n: f"v{m}" for n, m in zip(rng.choice(5000, 500, replace=False),
+                                   rng.choice(5000, 500, replace=False))
+    }
+
+    start = time.time()
+    csn = CongruentSubNetwork(G1, G2, mapping=mapping)
+    assert time.time() - start < 10
+
+    # Check the result against the definition on a sample of nodes.
+    kept = list(csn.correspondence.items())
+    assert kept
+    for n in list(csn.subnetwork1)[:20]:
+        assert any(
+            (n == a or nx.has_path(G1, a, n))
+            and (n == b or nx.has_path(G1, n, b))
+            and nx.has_path(G1, a, b)
+            and nx.has_path(G2, a2, b2)
+            for a, a2 in kept
+            for b, b2 in kept
+            if a != b
+        )
+
+
+def naive_blanket(G, nodes):
+    blanket = set()
+    for n in nodes:
+        blanket |= set(G.predecessors(n)) | set(G.successors(n))
+        for c in G.successors(n):
+            blanket |= set(G.predecessors(c))
+    return blanket - set(nodes)
+
+
+def test_CausalMarkovBlanket():
+    G = nx.gnm_random_graph(300, 900, seed=0, directed=True)
+    rng = np.random.RandomState(0)
+    node_sets = [rng.choice(300, rng.randint(1, 5)).tolist() for _ in range(50)]
+    node_sets.append([])
+
+    cmb = CausalMarkovBlanket(G)
+    assert cmb.blankets(node_sets) == [
+        naive_blanket(G, nodes) for nodes in node_sets
+    ]
+    assert cmb.blanket([0]) == naive_blanket(G, [0])
+
+    cag, program = make_graphs()
+    program.add_edge("SOIL_WATER", "PRICE")
+    program.add_edge("IRRIGATION", "SOIL_WATER")
+    blankets1, blankets2 = CausalMarkovBlanket.non_shared_blankets(
+        CongruentSubNetwork(cag, program)
+    )
+    assert blankets1 == []
+    assert blankets2 == [
+        (frozenset({"SOIL_WATER"}), {"RAINFALL", "CROP_PRODUCTION"})
+    ]
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.optimize import linprog
+from delphi.AnalysisGraph import AnalysisGraph
+from delphi.analysis.optimization.input_optimization import CAGInputOptimizer
+from delphi.analysis.optimization.struct_optimization import (
+    CAGStructureOptimizer,
+)
+from delphi.analysis.optimization.param_optimization import (
+    CAGParameterOptimizer,
+    GrFNParameterOptimizer,
+)
+from test_program_analysis import make_toy_program_analysis_graph, toy_program
+
+
+def make_observations(G, betas, derivatives, n_steps, nodes):
+    s0 = G.construct_default_initial_state().values.copy()
+    s0[1::2] = derivatives
+    states = G.project(betas, s0, n_steps)[0]
+    components = list(G.get_latent_state_components())
+    return pd.DataFrame(
+        {n: 10 * states[:, components.index(n)] for n in nodes}
+    )
+
+
+@pytest.mark.parametrize("n_processes", [None, 2])
+def test_CAGParameterOptimizer(n_processes):
+    G = AnalysisGraph([("a", "b"), ("b", "c"), ("a", "c"), ("c", "d")])
+    assert list(G.edges) == [("a", "b"), ("a", "c"), ("b", "c"), ("c", "d")]
+    betas = np.array([0.5, 0.2, -0.3, 0.8])
+    derivatives = np.array([0.05, 0.0, 0.01, -0.02])
+    observations = make_observations(G, betas, derivatives, 24, G.nodes)
+    observations.iloc[3:6, 1] = np.nan
+
+    optimizer = CAGParameterOptimizer(G, observations)
+    assert optimizer.parameter_names[:4] == [
+        "β(a, b)", "β(a, c)", "β(b, c)", "β(c, d)"
+    ]
+
+    x = np.r_[betas, derivatives]
+    loss, gradient = optimizer.loss_and_gradient(x)
+    assert loss < 1e-20 and np.allclose(gradient, 0, atol=1e-8)
+
+    # The finite difference gradient agrees with the change in the loss.
+    x = x + 0.01
+    loss, gradient = optimizer.loss_and_gradient(x)
+    dx = 1e-4 * np.random.RandomState(0).normal(size=len(x))
+    assert np.isclose(
+        optimizer.loss(x + dx)[0] - loss, gradient @ dx, rtol=1e-2
+    )
+
+    result = optimizer.fit(n_starts=4, n_processes=n_processes, seed=0)
+    assert len(optimizer.results) == 4
+    assert result.fun < 1e-6
+
+    # Only the increments (I + M) d are identifiable, since the trajectories
+    # are linear in time.
+    observed = observations.notna().values
+    assert np.allclose(
+        optimizer.simulate(result.x)[0][observed],
+        observations.values[observed],
+        atol=1e-3,
+    )
+    assert optimizer.best_params["∂(a)/∂t"] == result.x[4]
+
+    # The graph is set up to run with the fitted parameters.
+    assert len(G.edges["c", "d"]["betas"]) == G.res
+    assert np.all(G.edges["c", "d"]["betas"] == result.x[3])
+    assert np.allclose(
+        G.core.transition_matrices, G.transition_tensor(result.x[:4])
+    )
+    assert len(G.transition_matrix_collection) == G.res
+    assert len(G.s0) == G.res
+    assert G.s0[0]["∂(a)/∂t"] == result.x[4]
+    assert G.s0[0]["a"] == 1.0
+
+
+def test_GrFNParameterOptimizer():
+    G = make_toy_program_analysis_graph(vectorized=True)
+    rng = np.random.RandomState(0)
+    inputs = {
+        "TMAX": rng.uniform(25, 35, 12),
+        "TMIN": rng.uniform(5, 15, 12),
+        "XHLAI": rng.uniform(0, 3, 12),
+    }
+    observations = pd.DataFrame(
+        {
+            "EO": [
+                toy_program(*row, MSALB=0.3)
+                for row in zip(*inputs.values())
+            ]
+        }
+    )
+    optimizer = GrFNParameterOptimizer(
+        G, {"MSALB": (0.0, 1.0)}, observations, inputs
+    )
+    predictions = optimizer.simulate([[0.3], [0.5]])
+    assert predictions.shape == (2, 12, 1)
+    assert np.allclose(predictions[0, :, 0], observations["EO"])
+
+    result = optimizer.fit(n_starts=3, seed=0)
+    assert np.allclose(result.x, [0.3], atol=1e-4)
+
+
+def test_CAGInputOptimizer():
+    G = AnalysisGraph([("a", "b"), ("b", "c"), ("a", "c"), ("c", "d")])
+    betas = np.random.RandomState(0).normal(
+        [0.5, 0.2, -0.3, 0.8], 0.1, size=(50, 4)
+    )
+    components = list(G.get_latent_state_components())
+    G.transition_matrix_collection = [
+        pd.DataFrame(A, index=components, columns=components)
+        for A in G.transition_tensor(betas)
+    ]
+
+    optimizer = CAGInputOptimizer(
+        G, "d", 12, {"a": (-1, 1), "b": (-1, 1)}, budget=1.0
+    )
+
+    # The projected means agree with stepping each transition matrix.
+    inputs = np.array([[0.3, -0.2], [1.0, 0.5]])
+    s0 = optimizer.initial_states(inputs)
+    expected = np.mean(
+        [
+            np.linalg.matrix_power(df.values, 12) @ s0.T
+            for df in G.transition_matrix_collection
+        ],
+        axis=0,
+    ).T
+    assert np.allclose(optimizer.projected_means(inputs), expected)
+
+    # The projected mean of d is linear in the intervention, so under the
+    # budget it is maximized by spending all of it on the node with the
+    # largest weight.
+    base = optimizer.projected_means(np.zeros(2))[0, components.index("d")]
+    weights = optimizer.evaluate(np.identity(2))[0] - base
+    result = optimizer.optimize(seed=0)
+    assert result.success
+    assert np.isclose(result.fun, base + np.abs(weights).max(), atol=1e-3)
+
+    result = optimizer.optimize(maximize=False, seed=0)
+    assert np.isclose(result.fun, base - np.abs(weights).max(), atol=1e-3)
+
+    # Keeping the projected mean of b from decreasing forces a trade-off,
+    # whose optimum is that of the equivalent linear program.
+    constrained = CAGInputOptimizer(
+        G, "d", 12, {"a": (-1, 1), "b": (-1, 1)}, {"b": (1.0, None)}
+    )
+    result = constrained.optimize(seed=0)
+    assert result.success
+    b = components.index("b")
+    b_weights = constrained.projected_means(np.identity(2))[:, b] - 1.0
+    expected = linprog(
+        -weights, A_ub=[-b_weights], b_ub=[0.0], bounds=[(-1, 1)] * 2
+    )
+    assert np.isclose(result.fun, base - expected.fun, rtol=1e-3)
+
+
+def make_structure_observations(n_steps=300, seed=0):
+    """ Observations whose changes follow the DAG a -> b -> c, a -> d. """
+    rng = np.random.RandomState(seed)
+    da = rng.normal(size=n_steps)
+    db = 0.8 * da + 0.5 * rng.normal(size=n_steps)
+    dc = -0.7 * db + 0.5 * rng.normal(size=n_steps)
+    dd = 0.6 * da + 0.5 * rng.normal(size=n_steps)
+    return pd.DataFrame(
+        np.cumsum(np.column_stack([da, db, dc, dd]), axis=0),
+        columns=list("abcd"),
+    )
+
+
+@pytest.mark.parametrize("n_processes", [None, 2])
+def test_CAGStructureOptimizer(n_processes):
+    observations = make_structure_observations()
+    # A machine-read graph with a spurious edge, a missing edge, and an
+    # unobserved node.
+    G = AnalysisGraph([("a", "b"), ("d", "c"), ("a", "d"), ("e", "a")])
+    G.edges["a", "b"]["InfluenceStatements"] = ["statement"]
+
+    optimizer = CAGStructureOptimizer(observations)
+    n_calls = []
+    local_score = optimizer.local_score
+    optimizer.local_score = lambda *args: n_calls.append(args) or local_score(
+        *args
+    )
+
+    H = optimizer.search(G, n_processes=n_processes)
+    assert set(G.edges) == {("a", "b"), ("d", "c"), ("a", "d"), ("e", "a")}
+    skeleton = {frozenset(e) for e in H.edges}
+    assert skeleton == {
+        frozenset(e) for e in [("a", "b"), ("b", "c"), ("a", "d"), ("e", "a")]
+    }
+    assert optimizer.best_score == pytest.approx(optimizer.score(H))
+    assert optimizer.best_score > optimizer.history[0]
+    if ("a", "b") in H.edges:
+        assert H.edges["a", "b"]["InfluenceStatements"] == ["statement"]
+
+    # Every family is scored once, and mostly in the worker processes if
+    # there are any.
+    if n_processes is None:
+        assert len(n_calls) == len(set(n_calls)) == len(optimizer.cache)
+    else:
+        assert len(n_calls) < len(optimizer.cache) / 2
+
+    hill_climber = CAGStructureOptimizer(observations, max_parents=1)
+    H = hill_climber.search(G, tabu_length=0)
+    assert all(H.in_degree(n) <= 1 for n in "abcd")
+    assert np.all(np.diff(hill_climber.history) > 0)
@@ -14,11 +14,14 @@ from delphi.GrFN.ProgramAnalysisGraph import ProgramAnalysisGraph
 import xml.etree.ElementTree as ET
 import subprocess as sp
 import ast
+import numpy as np
 import pytest
 from delphi.visualization import visualize
 from pathlib import Path
 from importlib import import_module
+from types import ModuleType
 from typing import Dict
+from pygraphviz import AGraph
 
 
 def make_grfn_dict(original_fortran_file) -> Dict:
@@ -72,6 +75,112 @@ def io_grfn_dict():
     yield make_grfn_dict(Path("tests/data/io-tests/iotest_05.for"))
     os.remove("iotest_05_lambdas.py")
 
+def make_toy_program_analysis_graph(vectorized: bool) -> ProgramAnalysisGraph:
+    """ Construct, without going through the Fortran frontend, the
+    ProgramAnalysisGraph for the following PETPT-like program:
+
+        TD = 0.6 * TMAX + 0.4 * TMIN
+        if XHLAI <= 0.0:
+            ALBEDO = MSALB
+        else:
+            ALBEDO = 0.23 - (0.23 - MSALB) * exp(-0.75 * XHLAI)
+        EO = TD * ALBEDO
+    """
+    exp = "np.exp" if vectorized else "math.exp"
+    lambdas = ModuleType("TOY_lambdas")
+    exec(
+        "\n".join(
+            [
+                "import math",
+                "import numpy as np",
+                f"VECTORIZED = {vectorized}",
+                "def TOY__lambda__TD_0(TMAX, TMIN):",
+                "    return ((0.6 * TMAX) + (0.4 * TMIN))",
+                "def TOY__lambda__IF_1_0(XHLAI):",
+                "    return (XHLAI <= 0.0)",
+                "def TOY__lambda__ALBEDO_0(MSALB):",
+                "    return MSALB",
+                "def TOY__lambda__ALBEDO_1(MSALB, XHLAI):",
+                f"    return (0.23 - ((0.23 - MSALB) * {exp}(-(0.75 * XHLAI))))",
+                "def TOY__lambda__EO_0(TD, ALBEDO):",
+                "    return (TD * ALBEDO)",
+            ]
+        ),
+        lambdas.__dict__,
+    )
+
+    A = AGraph(directed=True)
+    for name, idx in [
+        ("TMAX", 0),
+        ("TMIN", 0),
+        ("XHLAI", 0),
+        ("MSALB", 0),
+        ("TD", 0),
+        ("IF_1", 0),
+        ("ALBEDO", 0),
+        ("ALBEDO", 1),
+        ("ALBEDO", 2),
+        ("EO", 0),
+    ]:
+        A.add_node(
+            f"{name}_{idx}__TOY",
+            node_type="FuncVariableNode",
+            cag_label=name,
+            index=idx,
+            start="",
+            end="",
+            index_var="",
+            is_index="None",
+        )
+
+    for action, (label, inputs, output, lambda_fn) in {
+        "TOY__assign__TD_0": (
+            "__assign__", ["TMAX_0", "TMIN_0"], "TD_0", "TOY__lambda__TD_0"
+        ),
+        "TOY__condition__IF_1_0": (
+            "__condition__", ["XHLAI_0"], "IF_1_0", "TOY__lambda__IF_1_0"
+        ),
+        "TOY__assign__ALBEDO_0": (
+            "__assign__", ["MSALB_0"], "ALBEDO_0", "TOY__lambda__ALBEDO_0"
+        ),
+        "TOY__assign__ALBEDO_1": (
+            "__assign__",
+            ["MSALB_0", "XHLAI_0"],
+            "ALBEDO_1",
+            "TOY__lambda__ALBEDO_1",
+        ),
+        "TOY__decision__ALBEDO_0": (
+            "__decision__",
+            ["IF_1_0", "ALBEDO_1", "ALBEDO_0"],
+            "ALBEDO_2",
+            "TOY__decision__ALBEDO_0",
+        ),
+        "TOY__assign__EO_0": (
+            "__assign__", ["TD_0", "ALBEDO_2"], "EO_0", "TOY__lambda__EO_0"
+        ),
+    }.items():
+        A.add_node(
+            f"{action}__TOY",
+            node_type="ActionNode",
+            label=label,
+            lambda_fn=lambda_fn,
+        )
+        for i in inputs:
+            A.add_edge(f"{i}__TOY", f"{action}__TOY")
+        A.add_edge(f"{action}__TOY", f"{output}__TOY")
+
+    return ProgramAnalysisGraph.from_agraph(A, lambdas)
+
+
+def toy_program(TMAX, TMIN, XHLAI, MSALB):
+    TD = 0.6 * TMAX + 0.4 * TMIN
+    if XHLAI <= 0.0:
+        ALBEDO = MSALB
+    else:
+        ALBEDO = 0.23 - (0.23 - MSALB) * np.exp(-0.75 * XHLAI)
+    return TD * ALBEDO
+
+
 def test_crop_yield_grfn_generation(crop_yield_grfn_dict):
     with open("tests/data/crop_yield_grfn.json", "r") as f:
         json_dict = json.load(f)
@@ -100,3 +209,139 @@ def test_ProgramAnalysisGraph_crop_yield(crop_yield_grfn_dict):
     G.initialize()
     visualize(G)
     os.remove("crop_yield_lambdas.py")
+
+
+def test_vectorized_lambda_generation():
+    import io
+
+    lambdas = io.StringIO()
+    lambdas.write("import numpy as np\n\n")
+    genPGM.genFn(
+        lambdas,
+        ast.parse("EO = max((EEQ * math.exp(TMAX)), 0.0001)").body[0],
+        "PETPT__lambda__EO_0",
+        "EO",
+        ["EEQ", "TMAX"],
+        vectorized=True,
+    )
+    namespace = {}
+    exec(lambdas.getvalue(), namespace)
+
+    EEQ = np.array([-1.0, 0.5, 2.0])
+    TMAX = np.zeros(3)
+    assert np.allclose(
+        namespace["PETPT__lambda__EO_0"](EEQ, TMAX), [0.0001, 0.5, 2.0]
+    )
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_ProgramAnalysisGraph_compiled_update(vectorized):
+    G = make_toy_program_analysis_graph(vectorized)
+    assert G.schedule() == ["TD", "ALBEDO", "EO"]
+    for XHLAI in (-1.0, 2.0):
+        inputs = {"TMAX": 30.0, "TMIN": 10.0, "XHLAI": XHLAI, "MSALB": 0.2}
+        for n, value in inputs.items():
+            G.nodes[n]["value"] = value
+        G.update()
+        assert np.isclose(G.nodes["EO"]["value"], toy_program(**inputs))
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_ProgramAnalysisGraph_call(vectorized):
+    G = make_toy_program_analysis_graph(vectorized)
+    assert G.output_variables == ["EO"]
+
+    samples = np.random.RandomState(0).uniform(-1, 1, size=(50, 4))
+    expected = [toy_program(*row) for row in samples]
+    assert np.allclose(G.call(samples)["EO"], expected)
+
+    inputs = dict(zip(G.input_variables, samples.T))
+    assert np.allclose(G.call(inputs, n_processes=2)["EO"], expected)
+
+
+def test_fortran_format_bulk_io():
+    fmt = fortran_format.Format(["I5", "2X", "F6.2", "I4"])
+    lines = ["   12  3.1415  -7\n", "  -44  -27180  35\n", "    0  100.0    0"]
+    columns = fmt.read_lines(lines)
+    assert list(zip(*[column.tolist() for column in columns])) == [
+        fmt.read_line(line) for line in lines
+    ]
+    assert np.allclose(columns[1], [3.1415, -271.8, 100.0])
+
+    rows = [fmt.read_line(line) for line in lines]
+    assert fmt.write_lines(rows) == [fmt.write_line(row) for row in rows]
+    assert fmt.write_line(rows[0]) == "   12    3.14  -7\n"
+
+    bad_line = "   12  3.1x15  -7\n"
+    with pytest.raises(ValueError):
+        fmt.read_line(bad_line)
+    for read in (fmt.read_lines, fmt.read_rows):
+        with pytest.raises(ValueError):
+            read([bad_line])
+
+
+def make_read_loop_ast(infile, outfile):
+    def literal(value, type="int"):
+        return {"tag": "literal", "type": type, "value": value}
+
+    def io(tag, unit, *names):
+        args = [literal(unit), literal("10")]
+        return {"tag": tag, "args": args + [{"tag": "ref", "name": n} for n in names]}
+
+    def open_file(unit, name, status):
+        return {
+            "tag": "open",
+            "args": [
+                literal(unit),
+                {"tag": "literal", "arg_name": "FILE"},
+                literal(f'"{name}"', "char"),
+                {"tag": "literal", "arg_name": "STATUS"},
+                literal(f'"{status}"', "char"),
+            ],
+        }
+
+    body = [
+        {"tag": "variable", "name": "I", "type": "INTEGER"},
+        open_file("10", infile, "UNKNOWN"),
+        open_file("20", outfile, "REPLACE"),
+        {
+            "tag": "do",
+            "header": [
+                {
+                    "tag": "index",
+                    "name": "I",
+                    "low": [literal("1")],
+                    "high": [literal("3")],
+                }
+            ],
+            "body": [io("read", "10", "J", "X"), io("write", "20", "J", "X")],
+        },
+        io("read", "10", "J", "X"),
+        io("write", "20", "J", "X"),
+        {"tag": "close", "args": [literal("10")]},
+        {"tag": "close", "args": [literal("20")]},
+        {
+            "tag": "format",
+            "label": "10",
+            "args": [literal(v, "char") for v in ("I3", "X", "F5.2", "1")],
+        },
+    ]
+    return {"ast": [{"tag": "program", "name": "MAIN", "args": [], "body": body}]}
+
+
+@pytest.mark.parametrize("bulk_read", [False, True])
+def test_bulk_read_loop(tmp_path, bulk_read):
+    infile, outfile = tmp_path / "infile", tmp_path / "outfile"
+    infile.write_text(" 12  3.14\n -4  -271\n  0 100.0\n  7 12.50\n  8  1.00\n")
+    pySrc = pyTranslate.create_python_string(
+        make_read_loop_ast(infile, outfile), bulk_read
+    )
+    assert ("read_records" in pySrc) == bulk_read
+    exec(
+        pySrc.replace(
+            "from fortran_format import *",
+            "from delphi.translators.for2py.scripts.fortran_format import *",
+        ),
+        {},
+    )
+    assert outfile.read_text() == " 12  3.14\n -4 -2.71\n  0 *****\n  7 12.50\n"
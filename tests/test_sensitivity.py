@@ -0,0 +1,264 @@
+import numpy as np
+import pytest
+from SALib.analyze import sobol
+from delphi.analysis.sensitivity.variance_methods import SobolAnalyzer
+from delphi.analysis.sensitivity.streaming import saltelli_chunks
+from delphi.analysis.sensitivity.emulators import GPAnalyzer, PCEAnalyzer
+from delphi.analysis.sensitivity.variogram_methods import VARSAnalyzer
+from delphi.analysis.sensitivity.evaluation import evaluate_grid
+
+
+def toy_model(x, y, z):
+    return (
+        np.sin(x[0]) + 7 * np.sin(y[0]) ** 2 + 0.1 * z[0] ** 4 * np.sin(x[0])
+    )
+
+
+problem = {
+    "num_vars": 3,
+    "names": ["x", "y", "z"],
+    "bounds": [[-np.pi, np.pi]] * 3,
+}
+
+
+@pytest.fixture(scope="module")
+def scalar_outputs():
+    analyzer = SobolAnalyzer(toy_model, prob_def=problem)
+    analyzer.sample(num_samples=64)
+    analyzer.evaluate()
+    return analyzer.samples, analyzer.outputs
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"vectorized": True},
+        {"vectorized": True, "chunk_size": 100},
+        {"n_processes": 2},
+    ],
+)
+def test_evaluate(scalar_outputs, kwargs):
+    samples, outputs = scalar_outputs
+    analyzer = SobolAnalyzer(toy_model, prob_def=problem)
+    analyzer.sample(num_samples=64)
+    progress = []
+    analyzer.evaluate(
+        progress=lambda n, total: progress.append((n, total)), **kwargs
+    )
+    assert np.allclose(analyzer.samples, samples)
+    assert np.allclose(analyzer.outputs, outputs)
+    assert progress[-1] == (len(samples), len(samples))
+
+
+def test_evaluate_again(scalar_outputs):
+    samples, outputs = scalar_outputs
+    analyzer = SobolAnalyzer(toy_model, prob_def=problem)
+    analyzer.sample(num_samples=64)
+    analyzer.evaluate(vectorized=True)
+
+    # Evaluating again starts over, e.g. with another model.
+    analyzer.model = lambda x, y, z: 2 * toy_model(x, y, z)
+    analyzer.evaluate(vectorized=True)
+    assert analyzer.n_evaluated == len(samples)
+    assert np.allclose(analyzer.outputs, 2 * outputs)
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"vectorized": True}, {"n_processes": 2, "chunk_size": 7}]
+)
+def test_evaluate_grid(tmp_path, kwargs):
+    x, z = np.linspace(-1, 1, 5), np.linspace(0, 2, 4)
+    X, Z = np.meshgrid(x, z)
+    n_calls = []
+
+    def model(x, y, z):
+        n_calls.append(1)
+        return toy_model(x, y, z)
+
+    outputs = evaluate_grid(
+        model, {2: z, 0: x}, [0.0, [0.5], 0.0], cache_dir=tmp_path, **kwargs
+    )
+    assert outputs.shape == X.shape
+    assert np.allclose(outputs, toy_model([X], [0.5], [Z]))
+
+    # Evaluating the slice again reads it from the cache, in memory and then
+    # on disk.
+    n_calls.clear()
+    assert np.allclose(
+        evaluate_grid(model, {2: z, 0: x}, [0.0, 0.5, 0.0], cache_dir=tmp_path),
+        outputs,
+    )
+    assert not n_calls
+    from delphi.analysis.sensitivity import evaluation
+    evaluation._grid_cache.clear()
+    assert np.allclose(
+        evaluate_grid(model, {2: z, 0: x}, [1.0, 0.5, 1.0], cache_dir=tmp_path),
+        outputs,
+    )
+    assert not n_calls
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+    # The in-memory cache keeps a bounded number of grids per model, and
+    # drops them along with the model.
+    for offset in range(evaluation._GRID_CACHE_SIZE + 1):
+        evaluate_grid(model, {0: x + offset}, [0.0, 0.5, 0.0], **kwargs)
+    assert len(evaluation._grid_cache[model]) == evaluation._GRID_CACHE_SIZE
+    del model
+    assert len(evaluation._grid_cache) == 0
+
+
+def test_streaming_sobol(tmp_path, scalar_outputs):
+    samples, outputs = scalar_outputs
+    chunks = list(saltelli_chunks(problem, 64, chunk_size=10))
+    assert len(chunks) == 7
+    assert np.allclose(np.concatenate(chunks), samples)
+
+    analyzer = SobolAnalyzer(toy_model, prob_def=problem)
+    analyzer.stream(
+        num_samples=64,
+        chunk_size=10,
+        outputs_file=tmp_path / "outputs.npy",
+        vectorized=True,
+    )
+    assert np.allclose(np.load(tmp_path / "outputs.npy"), outputs)
+
+    Si = analyzer.analyze()
+    expected = sobol.analyze(problem, outputs, print_to_console=False)
+    for key in ("S1", "ST", "S2"):
+        assert np.allclose(Si[key], expected[key], equal_nan=True)
+    assert np.all(Si["S1_conf"] > 0)
+
+    # The normal-approximation intervals are those of the terms of the
+    # estimators, centered on the mean output as in SALib.
+    Y = (outputs - outputs.mean()).reshape(-1, 8)
+    A, B, AB = Y[:, 0], Y[:, -1], Y[:, 1:4]
+    var = np.concatenate([A, B]).var()
+    S1_terms = B[:, None] * (AB - A[:, None])
+    assert np.allclose(
+        Si["S1_conf"],
+        1.96 * S1_terms.std(axis=0, ddof=1) / np.sqrt(len(Y)) / var,
+        rtol=1e-3,
+    )
+
+    # Without an outputs_file, the temporary file is removed when the run
+    # ends.
+    analyzer.stream(num_samples=64, chunk_size=10, vectorized=True)
+    assert analyzer.outputs_file is None
+    assert not isinstance(analyzer.outputs, np.memmap)
+    assert np.allclose(analyzer.outputs, outputs)
+    with pytest.raises(ValueError):
+        analyzer.save_checkpoint(tmp_path / "c.npz")
+    with pytest.raises(ValueError):
+        analyzer.stream(num_samples=64, checkpoint_file=tmp_path / "c.npz")
+
+
+class Preempted(Exception):
+    pass
+
+
+def noisy_model(x, y, z):
+    return toy_model(x, y, z) + np.random.normal()
+
+
+def preempted_model(n_calls):
+    """ Return noisy_model, raising Preempted on its n_calls-th call. """
+    calls = []
+
+    def model(x, y, z):
+        calls.append(None)
+        if len(calls) == n_calls:
+            raise Preempted()
+        return noisy_model(x, y, z)
+
+    return model
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_checkpoint_resume(tmp_path, streaming):
+    checkpoint_file = tmp_path / "checkpoint.npz"
+
+    def run(model, **kwargs):
+        np.random.seed(0)
+        analyzer = SobolAnalyzer(model, prob_def=problem)
+        if streaming:
+            if "checkpoint_file" in kwargs:
+                kwargs["outputs_file"] = tmp_path / "outputs.npy"
+            analyzer.stream(num_samples=64, chunk_size=8, **kwargs)
+        else:
+            analyzer.sample(num_samples=64)
+            analyzer.evaluate(chunk_size=50, **kwargs)
+        return analyzer
+
+    expected = run(noisy_model)
+    with pytest.raises(Preempted):
+        run(preempted_model(300), checkpoint_file=checkpoint_file)
+    # Checkpoints only record how far the run got; the samples and outputs
+    # are kept in files of their own.
+    with np.load(checkpoint_file) as data:
+        assert "samples" not in data and "outputs" not in data
+
+    np.random.seed(1)
+    analyzer = SobolAnalyzer(noisy_model)
+    analyzer.resume(checkpoint_file)
+    assert np.allclose(analyzer.outputs, expected.outputs)
+    Si, expected_Si = analyzer.analyze(), expected.analyze()
+    assert np.allclose(Si["S1"], expected_Si["S1"])
+
+
+def polynomial_model(x, y, z):
+    return x[0] + 2 * y[0] ** 2 + x[0] * z[0]
+
+
+def test_PCEAnalyzer():
+    # Exact indices of polynomial_model for uniform inputs on [-1, 1]: the
+    # variances of its terms are 1/3, 16/45 and 1/9.
+    V = np.array([1 / 3, 16 / 45, 1 / 9])
+    analyzer = PCEAnalyzer(
+        polynomial_model,
+        prob_def={"num_vars": 3, "names": list("xyz"), "bounds": [[-1, 1]] * 3},
+        degree=3,
+    )
+    analyzer.sample(num_samples=60, seed=0)
+    analyzer.evaluate(vectorized=True)
+    Si = analyzer.analyze()
+    assert np.allclose(Si["S1"], [V[0], V[1], 0] / V.sum())
+    # The sampling arguments of EmulationAnalyzer.analyze are ignored.
+    assert np.allclose(
+        analyzer.analyze(num_samples=2 ** 10, conf_level=0.9)["ST"],
+        Si["ST"],
+    )
+    assert np.allclose(Si["ST"], [V[0] + V[2], V[1], V[2]] / V.sum())
+    assert np.isclose(Si["S2"][0, 2], V[2] / V.sum())
+    assert Si["surrogate_error"] < 1e-12
+
+
+def test_GPAnalyzer(scalar_outputs):
+    samples, outputs = scalar_outputs
+    analyzer = GPAnalyzer(toy_model, prob_def=problem)
+    analyzer.sample(num_samples=150, seed=0)
+    analyzer.evaluate(vectorized=True)
+    Si = analyzer.analyze(num_samples=2 ** 12)
+    expected = sobol.analyze(problem, outputs, print_to_console=False)
+    assert np.allclose(Si["S1"], expected["S1"], atol=0.1)
+    assert np.allclose(Si["ST"], expected["ST"], atol=0.1)
+    assert Si["surrogate_error"] < 0.05
+
+
+def test_VARSAnalyzer():
+    analyzer = VARSAnalyzer(toy_model, prob_def=problem)
+    analyzer.sample(num_stars=100, resolution=0.1, seed=0)
+    assert analyzer.samples.shape == (100 * (1 + 3 * 9), 3)
+    analyzer.evaluate(vectorized=True)
+
+    # Each cross section of a star passes through its center.
+    sections = analyzer.cross_sections()
+    center_outputs = analyzer.outputs[:: 1 + 3 * 9]
+    for d in range(3):
+        assert np.allclose(
+            sections[np.arange(100), d, analyzer.center_positions[:, d]],
+            center_outputs,
+        )
+    Si = analyzer.analyze(seed=0)
+    assert Si["variogram"].shape == (3, 9)
+    assert np.allclose(Si["ST"], [0.556, 0.442, 0.245], atol=0.1)
+    assert np.argsort(Si["IVARS50"]).tolist() == [2, 1, 0]